@@ -2,7 +2,8 @@
 服务器API客户端
 """
 import requests
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, List
 from .config import settings
 
 
@@ -12,27 +13,45 @@ class APIClient:
     def __init__(self, base_url: str = None):
         self.base_url = base_url or settings.server_url
         self.token: Optional[str] = None
+        self.user_id: Optional[int] = None  # 当前Token所属用户（结果上报按用户匹配Token）
+        self.timeout = (settings.api_connect_timeout, settings.api_read_timeout)
+        
+        # 复用长连接：每秒多次拉单/心跳不再重复建立TCP连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.api_pool_size,
+            max_retries=0  # 拉单本身就在循环重试，不在连接层重试
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
     
-    def set_token(self, token: str):
-        """设置认证Token"""
+    def set_token(self, token: Optional[str], user_id: Optional[int] = None):
+        """设置认证Token及其所属用户"""
         self.token = token
+        self.user_id = user_id if token else None
     
-    def _get_headers(self) -> Dict[str, str]:
-        """获取请求头"""
+    def _get_headers(self, token: Optional[str] = None) -> Dict[str, str]:
+        """获取请求头（多账号运行时共用一个客户端，可指定账号Token）"""
         headers = {"Content-Type": "application/json"}
-        if self.token:
-            headers["Authorization"] = f"Bearer {self.token}"
+        token = token or self.token
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
         return headers
     
     def login(self, username: str, password: str) -> Dict[str, Any]:
         """用户登录"""
         url = f"{self.base_url}/api/auth/login"
         try:
-            response = requests.post(
+            response = self.session.post(
                 url,
                 json={"username": username, "password": password},
                 headers={"Content-Type": "application/json"},
-                timeout=10  # 添加超时设置
+                timeout=(settings.api_connect_timeout, 10)  # 登录校验密码较慢
             )
             
             # 如果状态码不是200，尝试解析错误信息
@@ -48,7 +67,7 @@ class APIClient:
             data = response.json()
             
             if data.get("code") == 200 and data.get("data"):
-                self.set_token(data["data"]["token"])
+                self.set_token(data["data"]["token"], data["data"].get("user_id"))
             
             return data
         except requests.exceptions.RequestException as e:
@@ -65,7 +84,7 @@ class APIClient:
     def verify_token(self) -> Dict[str, Any]:
         """验证Token"""
         url = f"{self.base_url}/api/auth/verify"
-        response = requests.get(url, headers=self._get_headers())
+        response = self.session.get(url, headers=self._get_headers(), timeout=self.timeout)
         response.raise_for_status()
         return response.json()
     
@@ -73,7 +92,7 @@ class APIClient:
         """发送心跳"""
         url = f"{self.base_url}/api/auth/heartbeat"
         try:
-            response = requests.post(url, headers=self._get_headers())
+            response = self.session.post(url, headers=self._get_headers(), timeout=self.timeout)
             if response.status_code == 401:
                 raise Exception("Token已失效，请重新登录")
             response.raise_for_status()
@@ -90,7 +109,7 @@ class APIClient:
         """拉取订单"""
         url = f"{self.base_url}/api/orders/pull"
         try:
-            response = requests.get(url, headers=self._get_headers())
+            response = self.session.get(url, headers=self._get_headers(), timeout=self.timeout)
             # 检查HTTP状态码
             if response.status_code == 401:
                 # 尝试获取详细的错误信息
@@ -144,25 +163,108 @@ class APIClient:
             # 其他异常包装一下
             raise Exception(f"拉取订单失败: {str(e)}")
     
+    def pull_orders(self) -> List[Dict[str, Any]]:
+        """批量拉取订单（一次返回所有可执行的订单）"""
+        url = f"{self.base_url}/api/orders/pull-batch"
+        try:
+            response = self.session.get(url, headers=self._get_headers(), timeout=self.timeout)
+            if response.status_code == 401:
+                try:
+                    detail = response.json().get("detail", "")
+                except:
+                    detail = ""
+                if "账号已过期" in detail or "已禁用" in detail:
+                    raise Exception("账号已过期或已禁用，请重新登录")
+                raise Exception("Token已失效，请重新登录")
+            response.raise_for_status()
+            
+            try:
+                data = response.json()
+            except:
+                raise Exception("服务器响应格式错误")
+            
+            if not data or data.get("code") != 200:
+                return []
+            data_obj = data.get("data") or {}
+            orders = data_obj.get("orders") or []
+            return [order for order in orders if isinstance(order, dict)]
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 401:
+                raise Exception("Token已失效，请重新登录")
+            raise
+        except Exception as e:
+            if "Token已失效" in str(e) or "账号已过期" in str(e) or "响应格式错误" in str(e):
+                raise
+            raise Exception(f"拉取订单失败: {str(e)}")
+    
+    def pull_orders_multi(self, tokens: List[str]) -> List[Dict[str, Any]]:
+        """多账号批量拉取订单，返回与tokens顺序一致的账号结果列表"""
+        url = f"{self.base_url}/api/orders/pull-multi"
+        try:
+            response = self.session.post(
+                url,
+                json={"tokens": tokens},
+                headers=self._get_headers(),
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+        except ValueError:
+            raise Exception("服务器响应格式错误")
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"拉取订单失败: {str(e)}")
+        
+        if not data or data.get("code") != 200:
+            raise Exception(f"拉取订单失败: {data.get('message') if data else '空响应'}")
+        return (data.get("data") or {}).get("accounts") or []
+    
     def mark_order_assigned(self, order_id: int) -> bool:
         """标记订单已拉取"""
         url = f"{self.base_url}/api/orders/mark-assigned"
-        response = requests.post(
+        response = self.session.post(
             url,
             json={"order_id": order_id},
-            headers=self._get_headers()
+            headers=self._get_headers(),
+            timeout=self.timeout
         )
         response.raise_for_status()
         return True
     
-    def record_order_result(self, order_id: int, result: Dict[str, Any]) -> bool:
-        """记录订单执行结果"""
+    def record_order_result(
+        self,
+        order_id: int,
+        result: Dict[str, Any],
+        latency_ms: Optional[int] = None,
+        amount: Optional[float] = None,
+        payout_ratio: Optional[float] = None,
+        token: Optional[str] = None
+    ) -> bool:
+        """记录订单执行结果（附带下单耗时、金额和赔率），token为空时使用当前登录账号"""
         url = f"{self.base_url}/api/orders/record-result"
-        response = requests.post(
+        response = self.session.post(
             url,
-            json={"order_id": order_id, "result": result},
-            headers=self._get_headers()
+            json={
+                "order_id": order_id,
+                "result": result,
+                "latency_ms": latency_ms,
+                "amount": amount,
+                "payout_ratio": payout_ratio,
+            },
+            headers=self._get_headers(token),
+            timeout=self.timeout
         )
         response.raise_for_status()
         return True
+    
+    def record_order_results(self, results: List[Dict[str, Any]], token: Optional[str] = None) -> int:
+        """批量记录订单执行结果，返回服务器接受的条数（失败时抛出requests异常，由调用方重试）"""
+        url = f"{self.base_url}/api/orders/record-results"
+        response = self.session.post(
+            url,
+            json={"results": results},
+            headers=self._get_headers(token),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return (response.json().get("data") or {}).get("accepted", 0)
 
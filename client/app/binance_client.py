@@ -5,12 +5,15 @@ import os
 import re
 import json
 import sys
-import qrcode
+import time
 import shutil
+import threading
 from http.cookies import SimpleCookie
 from email.utils import parsedate_to_datetime
-# 延迟导入playwright，只在get_token函数中导入
+from .config import settings
+# 延迟导入playwright和qrcode，只在登录时导入
 # from playwright.sync_api import sync_playwright
+# import qrcode
 
 # 安全的print函数，避免Unicode编码错误
 def safe_print(*args, **kwargs):
@@ -52,9 +55,38 @@ else:  # Windows和其他平台
     DEFAULT_SEC_CH_UA_PLATFORM = '"Windows"'
 
 
+# 已找到的浏览器路径（进程内缓存）
+_browser_path = None
+
+
 def find_browser_executable():
-    """查找浏览器可执行文件"""
-    import os
+    """查找浏览器可执行文件（结果缓存在内存和本地文件中，缓存的路径不存在时重新扫描）"""
+    global _browser_path
+    if _browser_path and os.path.exists(_browser_path):
+        return _browser_path
+    
+    try:
+        with open(settings.browser_cache_file, 'r', encoding='utf-8') as f:
+            cached = json.load(f).get("path")
+        if cached and os.path.exists(cached):
+            _browser_path = cached
+            return cached
+    except (OSError, ValueError):
+        pass
+    
+    found = _scan_browser_executable()
+    if found:
+        _browser_path = found
+        try:
+            with open(settings.browser_cache_file, 'w', encoding='utf-8') as f:
+                json.dump({"path": found}, f)
+        except OSError:
+            pass
+    return found
+
+
+def _scan_browser_executable():
+    """扫描可能的浏览器安装位置"""
     possible_paths = []
     
     # 0. 优先检查 google_web 目录（用户指定的目录）
@@ -115,42 +147,35 @@ def find_browser_executable():
     return possible_paths[0] if possible_paths else None
 
 
-def launch_persistent_ctx(pw, reset=False, headless=True, user_id=None, log_callback=None):
-    """启动持久化浏览器上下文
-    
-    Args:
-        pw: Playwright实例
-        reset: 是否重置浏览器缓存（每次登录都清理）
-        headless: 是否无头模式
-        user_id: 用户ID，用于多账号支持（不同账号使用不同目录）
-    """
-    # 获取程序运行目录（client目录）
-    current_file = os.path.abspath(__file__)
-    # app/binance_client.py -> app -> client
-    app_dir = os.path.dirname(current_file)
-    client_dir = os.path.dirname(app_dir)
-    
-    # 根据user_id创建不同的目录，支持多开
-    if user_id:
-        user_data_dir = os.path.join(client_dir, f"playwright-binance-{user_id}")
-    else:
-        user_data_dir = os.path.join(client_dir, "playwright-binance")
-    
-    # 每次登录都清理缓存（reset=True）
-    if reset:
-        if os.path.exists(user_data_dir):
-            shutil.rmtree(user_data_dir)
-            log_msg = log_callback if log_callback else print
-            log_msg(f"已清理浏览器缓存: {user_data_dir}")
-
+def browser_launch_args(headless=True):
+    """浏览器启动参数"""
     args = [
         "--no-first-run",
         "--no-default-browser-check",
         "--window-size=1280,960",
     ]
-
     if headless:
         args += ["--headless=new", "--disable-gpu"]
+    return args
+
+
+def context_options():
+    """浏览器上下文参数（窗口大小、语言、平台UA）"""
+    return dict(
+        viewport={"width": 1280, "height": 960},
+        locale="zh-CN",
+        user_agent=DEFAULT_UA,
+        extra_http_headers={
+            "sec-ch-ua-platform": DEFAULT_SEC_CH_UA_PLATFORM,
+            "sec-ch-ua-mobile": "?0",
+            "accept-language": "zh-CN,zh;q=0.9"
+        },
+    )
+
+
+def resolve_executable_path(pw, log_callback=None):
+    """确定启动浏览器使用的可执行文件（返回None表示使用Playwright默认的浏览器）"""
+    executable_path = None
 
     # 优先查找 google_web 目录中的浏览器（用户指定的目录）
     browser_executable = None
@@ -185,33 +210,19 @@ def launch_persistent_ctx(pw, reset=False, headless=True, user_id=None, log_call
                     log_callback(f"[DEBUG] 使用找到的浏览器路径: {browser_executable}")
                 safe_print(f"[DEBUG] 使用找到的浏览器路径: {browser_executable}")
 
-    common_kwargs = dict(
-        user_data_dir=user_data_dir,
-        headless=headless,
-        args=args,
-        viewport={"width": 1280, "height": 960},
-        locale="zh-CN",
-        user_agent=DEFAULT_UA,
-        extra_http_headers={
-            "sec-ch-ua-platform": DEFAULT_SEC_CH_UA_PLATFORM,
-            "sec-ch-ua-mobile": "?0",
-            "accept-language": "zh-CN,zh;q=0.9"
-        },
-    )
-    
     # 如果找到了浏览器可执行文件，则使用executable_path参数
     if browser_executable and os.path.exists(browser_executable):
         try:
             pw_executable = pw.chromium.executable_path
             # 如果找到的路径与Playwright报告的路径不同，或者Playwright报告的路径不存在，使用找到的路径
             if browser_executable != pw_executable or not os.path.exists(pw_executable):
-                common_kwargs['executable_path'] = browser_executable
+                executable_path = browser_executable
                 if log_callback:
                     log_callback(f"[DEBUG] 使用自定义浏览器路径: {browser_executable}")
                 safe_print(f"[DEBUG] 使用自定义浏览器路径: {browser_executable}")
         except:
             # 如果无法获取Playwright的executable_path，直接使用找到的路径
-            common_kwargs['executable_path'] = browser_executable
+            executable_path = browser_executable
             if log_callback:
                 log_callback(f"[DEBUG] 使用自定义浏览器路径: {browser_executable}")
             safe_print(f"[DEBUG] 使用自定义浏览器路径: {browser_executable}")
@@ -221,6 +232,47 @@ def launch_persistent_ctx(pw, reset=False, headless=True, user_id=None, log_call
             log_callback(f"[WARN] 浏览器路径不存在: {browser_executable}")
         safe_print(f"[WARN] 浏览器路径不存在: {browser_executable}")
 
+    return executable_path
+
+
+def launch_persistent_ctx(pw, reset=False, headless=True, user_id=None, log_callback=None):
+    """启动持久化浏览器上下文
+    
+    Args:
+        pw: Playwright实例
+        reset: 是否重置浏览器缓存（每次登录都清理）
+        headless: 是否无头模式
+        user_id: 用户ID，用于多账号支持（不同账号使用不同目录）
+    """
+    # 获取程序运行目录（client目录）
+    current_file = os.path.abspath(__file__)
+    # app/binance_client.py -> app -> client
+    app_dir = os.path.dirname(current_file)
+    client_dir = os.path.dirname(app_dir)
+    
+    # 根据user_id创建不同的目录，支持多开
+    if user_id:
+        user_data_dir = os.path.join(client_dir, f"playwright-binance-{user_id}")
+    else:
+        user_data_dir = os.path.join(client_dir, "playwright-binance")
+    
+    # 每次登录都清理缓存（reset=True）
+    if reset:
+        if os.path.exists(user_data_dir):
+            shutil.rmtree(user_data_dir)
+            log_msg = log_callback if log_callback else print
+            log_msg(f"已清理浏览器缓存: {user_data_dir}")
+
+    common_kwargs = dict(
+        user_data_dir=user_data_dir,
+        headless=headless,
+        args=browser_launch_args(headless),
+        **context_options()
+    )
+    executable_path = resolve_executable_path(pw, log_callback=log_callback)
+    if executable_path:
+        common_kwargs['executable_path'] = executable_path
+
     if log_callback:
         log_callback(f"[DEBUG] launch_persistent_ctx - 准备启动浏览器, user_data_dir={user_data_dir}, headless={headless}")
     safe_print(f"[DEBUG] launch_persistent_ctx - 准备调用pw.chromium.launch_persistent_context()")
@@ -273,8 +325,19 @@ def apply_platform_ua(ctx, page):
     })
 
 
+# 多个账号同时登录时，二维码逐个完整输出，避免各行交错
+_qr_print_lock = threading.Lock()
+
+
 def print_qr(data, log_callback=None):
     """打印二维码到终端"""
+    with _qr_print_lock:
+        _print_qr(data, log_callback=log_callback)
+
+
+def _print_qr(data, log_callback=None):
+    """逐行输出二维码"""
+    import qrcode
     qr = qrcode.QRCode(border=0)
     qr.add_data(data)
     qr.make(fit=True)
@@ -571,221 +634,14 @@ def get_token(reset=False, headless=True, qr_callback=None, user_id=None, log_ca
             apply_platform_ua(ctx, page)
             log_msg("✓ User-Agent设置完成")
 
-            qr_results = []
-
-            def update_p20t_from_context():
-                try:
-                    cookies = ctx.cookies("https://www.binance.com")
-                    c = next((c for c in cookies if c.get("name") == "p20t"), None)
-                    token = c.get("value", "")
-                    if not token:
-                        return
-                    nonlocal p20t
-                    p20t = token
-                except:
-                    pass
-
-            def on_request(req):
-                try:
-                    url = req.url
-                    if "https://www.binance.com/fapi/v1/ticker/24hr" in url:
-                        token = req.headers.get("csrftoken", "")
-                        if not token:
-                            return
-                        nonlocal csrftoken
-                        csrftoken = token
-                except:
-                    pass
-
-            def on_request_finished(req):
-                try:
-                    url = req.url
-                    if "https://accounts.binance.com/bapi/accounts/v2/public/qrcode/login/get" in url:
-                        resp = req.response()
-                        if not resp:
-                            return
-                        data = resp.json()
-                        if not data.get("success"):
-                            return
-                        code = data["data"]["qrCode"]
-                        if code not in qr_results:
-                            qr_results.append(code)
-                            log_msg = log_callback if log_callback else print
-                            log_msg("请使用 Binance App 扫描以下二维码登录")
-                            print_qr(code, log_callback=log_callback)
-                            img = qrcode.make(code).convert("RGB")
-                            img.save("qrcode.jpg", format="JPEG", quality=100)
-                            # 调用回调函数
-                            if qr_callback:
-                                qr_callback(code)
-                    elif "https://accounts.binance.com/bapi/accounts/v2/private/authcenter/setTrustDevice" in url:
-                        resp = req.response()
-                        if not resp:
-                            return
-                        hdrs_arr = resp.headers_array()
-                        date_hdr = resp.headers.get("date") or resp.header_value("date")
-                        if not hdrs_arr or not date_hdr:
-                            return
-                        sc_values = [h.get("value", "") for h in hdrs_arr if h.get("name", "").lower() == "set-cookie"]
-                        m = next((m for sc in sc_values for m in SimpleCookie(sc).values() if m.key == "p20t"), None)
-                        if not m:
-                            return
-                        nonlocal p20t, expirationTimestamp
-                        p20t = m.value
-                        expirationTimestamp = int(m["max-age"]) + int(parsedate_to_datetime(date_hdr).timestamp())
-                except:
-                    pass
-
-            page.on("request", on_request)
-            page.on("requestfinished", on_request_finished)
-            ctx.on("request", on_request)
-            ctx.on("requestfinished", on_request_finished)
-
-            log_msg("正在导航到币安登录页面...")
-            try:
-                page.goto("https://accounts.binance.com/zh-CN/login?loginChannel=&return_to=", wait_until="domcontentloaded", timeout=30000)
-                log_msg(f"✓ 页面加载完成，当前URL: {page.url}")
-                if not headless:
-                    log_msg("✓ 浏览器窗口应该已显示，请查看是否弹出")
-                    log_msg("  如果看不到窗口，请检查任务栏或Alt+Tab切换窗口")
-                    # 尝试将浏览器窗口置于最前
-                    try:
-                        # 获取浏览器进程并尝试激活窗口
-                        import time
-                        time.sleep(1)  # 等待窗口完全加载
-                        log_msg("  提示: 如果浏览器窗口没有自动显示，请手动切换到浏览器窗口")
-                    except:
-                        pass
-            except Exception as e:
-                error_msg = f"✗ 页面导航失败: {e}"
-                log_msg(error_msg)
-                import traceback
-                try:
-                    log_msg(traceback.format_exc())
-                except:
-                    log_msg("无法输出详细错误信息")
-                return None
-
             try:
-                while True:
-                    try:
-                        page.wait_for_timeout(1500)
-                    except Exception as e:
-                        # 如果页面已经关闭，退出循环
-                        if "Target closed" in str(e) or "Target page, context or browser has been closed" in str(e):
-                            log_msg("浏览器已关闭，退出登录循环")
-                            break
-                        # 其他错误继续
-                        safe_print(f"[DEBUG] wait_for_timeout错误（可忽略）: {e}")
-
-                    if csrftoken and p20t:
-                        token_dict = {"csrftoken": csrftoken, "p20t": p20t, "expirationTimestamp": expirationTimestamp}
-                        log_msg = log_callback if log_callback else print
-                        log_msg("✓ 币安登录成功，获取到Token:")
-                        log_msg(f"  csrftoken: {csrftoken[:20]}...")
-                        log_msg(f"  p20t: {p20t[:20]}...")
-                        log_msg(f"  expirationTimestamp: {expirationTimestamp}")
-                        
-                        # 安全地关闭浏览器上下文
-                        try:
-                            # 先移除事件监听器，避免关闭时触发事件处理
-                            try:
-                                page.remove_listener("request", on_request)
-                                page.remove_listener("requestfinished", on_request_finished)
-                            except:
-                                pass
-                            try:
-                                ctx.remove_listener("request", on_request)
-                                ctx.remove_listener("requestfinished", on_request_finished)
-                            except:
-                                pass
-                            
-                            # 关闭浏览器上下文
-                            ctx.close()
-                            log_msg("✓ 浏览器已关闭")
-                        except Exception as close_error:
-                            safe_print(f"[DEBUG] 关闭浏览器时出错（可忽略）: {close_error}")
-                            log_msg("✓ 浏览器关闭完成")
-                        
-                        return token_dict
-
-                    try:
-                        # 检查页面是否仍然有效
-                        try:
-                            current_url = page.url
-                        except Exception as url_error:
-                            if "Target closed" in str(url_error) or "Target page, context or browser has been closed" in str(url_error):
-                                log_msg("浏览器已关闭，退出登录循环")
-                                break
-                            raise
-                        
-                        if "accounts.binance.com" in current_url:
-                            try:
-                                if page.get_by_text(re.compile("Understand")).count() > 0:
-                                    page.get_by_role("button", name=re.compile("Understand")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-
-                            try:
-                                if page.get_by_text(re.compile("知道了")).count() > 0:
-                                    page.get_by_role("button", name=re.compile("知道了")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-
-                            try:
-                                if page.get_by_text(re.compile("好的")).count() > 0:
-                                    page.get_by_role("button", name=re.compile("好的")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-
-                            try:
-                                if page.get_by_text(re.compile("登录")).count() > 0 and page.get_by_text(re.compile("邮箱/手机号码")).count() > 0 and page.get_by_text(re.compile("用手机相机扫描")).count() == 0:
-                                    page.get_by_role("button", name=re.compile("登录")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-
-                            try:
-                                if page.get_by_text(re.compile("刷新二维码")).count() > 0:
-                                    page.get_by_role("button", name=re.compile("刷新二维码")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-
-                            try:
-                                if page.get_by_text(re.compile("保持登录状态")).count() > 0:
-                                    page.get_by_role("button", name=re.compile("是")).first.click(timeout=1200, force=True)
-                            except:
-                                pass
-                        else:
-                            try:
-                                update_p20t_from_context()
-                            except:
-                                pass
-                    except Exception as loop_error:
-                        # 如果页面已关闭，退出循环
-                        if "Target closed" in str(loop_error) or "Target page, context or browser has been closed" in str(loop_error):
-                            log_msg("浏览器已关闭，退出登录循环")
-                            break
-                        # 其他错误继续循环
-                        safe_print(f"[DEBUG] 登录循环错误（可忽略）: {loop_error}")
+                return wait_for_token(ctx, page, headless=headless, qr_callback=qr_callback, log_callback=log_msg)
             finally:
                 # 确保浏览器上下文被关闭
                 try:
-                    if ctx and not ctx._connection._closed:
-                        try:
-                            # 移除事件监听器
-                            try:
-                                page.remove_listener("request", on_request)
-                                page.remove_listener("requestfinished", on_request_finished)
-                            except:
-                                pass
-                            try:
-                                ctx.remove_listener("request", on_request)
-                                ctx.remove_listener("requestfinished", on_request_finished)
-                            except:
-                                pass
-                        except:
-                            pass
+                    if not ctx._connection._closed:
                         ctx.close()
+                        log_msg("✓ 浏览器已关闭")
                 except Exception as final_close_error:
                     safe_print(f"[DEBUG] 最终关闭浏览器时出错（可忽略）: {final_close_error}")
     except KeyboardInterrupt:
@@ -810,25 +666,216 @@ def get_token(reset=False, headless=True, qr_callback=None, user_id=None, log_ca
         return None
 
 
-def place_order_web(csrftoken, p20t, orderAmount, timeIncrements, symbolName, payoutRatio, direction):
+def wait_for_token(ctx, page, headless=True, qr_callback=None, log_callback=None, timeout=None, qr_file="qrcode.jpg"):
     """
-    下单函数（复用原项目代码）
+    在已创建的浏览器上下文中打开币安登录页，等待扫码登录并截获Token
+    （不关闭上下文，由调用方负责；get_token和登录池共用）
+    
+    Args:
+        ctx: 浏览器上下文
+        page: 已应用UA设置的页面
+        headless: 是否无头模式
+        qr_callback: 二维码回调函数，接收二维码数据作为参数
+        log_callback: 日志回调函数
+        timeout: 等待扫码的最长时间（秒），None表示一直等待
+        qr_file: 二维码图片保存路径，None表示不保存
+    
+    Returns:
+        dict: 包含csrftoken, p20t, expirationTimestamp的字典；失败或超时返回None
     """
-    import requests
-    url = "https://www.binance.com/bapi/futures/v1/private/future/event-contract/place-order"
-    headers = {
-        "content-type": "application/json",
-        "clienttype": "web",
-        "csrftoken": csrftoken,
-        "cookie": f"p20t={p20t}"
-    }
-    data = {
-        "orderAmount": orderAmount,
-        "timeIncrements": timeIncrements,
-        "symbolName": symbolName,
-        "payoutRatio": payoutRatio,
-        "direction": direction
-    }
-    response = requests.post(url, headers=headers, json=data)
-    return response.json()
+    log_msg = log_callback if log_callback else safe_print
+    csrftoken = ""
+    p20t = ""
+    expirationTimestamp = -1
+    deadline = time.monotonic() + timeout if timeout else None
+
+    qr_results = []
+
+    def update_p20t_from_context():
+        try:
+            cookies = ctx.cookies("https://www.binance.com")
+            c = next((c for c in cookies if c.get("name") == "p20t"), None)
+            token = c.get("value", "")
+            if not token:
+                return
+            nonlocal p20t, expirationTimestamp
+            p20t = token
+            # 复用已登录的会话时不会经过setTrustDevice，过期时间取cookie的expires（会话cookie为-1）
+            expires = int(c.get("expires") or -1)
+            if expirationTimestamp <= 0 and expires > 0:
+                expirationTimestamp = expires
+        except:
+            pass
 
+    def on_request(req):
+        try:
+            url = req.url
+            if "https://www.binance.com/fapi/v1/ticker/24hr" in url:
+                token = req.headers.get("csrftoken", "")
+                if not token:
+                    return
+                nonlocal csrftoken
+                csrftoken = token
+        except:
+            pass
+
+    def on_request_finished(req):
+        try:
+            url = req.url
+            if "https://accounts.binance.com/bapi/accounts/v2/public/qrcode/login/get" in url:
+                resp = req.response()
+                if not resp:
+                    return
+                data = resp.json()
+                if not data.get("success"):
+                    return
+                code = data["data"]["qrCode"]
+                if code not in qr_results:
+                    qr_results.append(code)
+                    log_msg("请使用 Binance App 扫描以下二维码登录")
+                    print_qr(code, log_callback=log_callback)
+                    if qr_file:
+                        import qrcode
+                        img = qrcode.make(code).convert("RGB")
+                        img.save(qr_file, format="JPEG", quality=100)
+                    # 调用回调函数
+                    if qr_callback:
+                        qr_callback(code)
+            elif "https://accounts.binance.com/bapi/accounts/v2/private/authcenter/setTrustDevice" in url:
+                resp = req.response()
+                if not resp:
+                    return
+                hdrs_arr = resp.headers_array()
+                date_hdr = resp.headers.get("date") or resp.header_value("date")
+                if not hdrs_arr or not date_hdr:
+                    return
+                sc_values = [h.get("value", "") for h in hdrs_arr if h.get("name", "").lower() == "set-cookie"]
+                m = next((m for sc in sc_values for m in SimpleCookie(sc).values() if m.key == "p20t"), None)
+                if not m:
+                    return
+                nonlocal p20t, expirationTimestamp
+                p20t = m.value
+                expirationTimestamp = int(m["max-age"]) + int(parsedate_to_datetime(date_hdr).timestamp())
+        except:
+            pass
+
+    page.on("request", on_request)
+    page.on("requestfinished", on_request_finished)
+    ctx.on("request", on_request)
+    ctx.on("requestfinished", on_request_finished)
+
+    log_msg("正在导航到币安登录页面...")
+    try:
+        page.goto("https://accounts.binance.com/zh-CN/login?loginChannel=&return_to=", wait_until="domcontentloaded", timeout=30000)
+        log_msg(f"✓ 页面加载完成，当前URL: {page.url}")
+        if not headless:
+            log_msg("✓ 浏览器窗口应该已显示，请查看是否弹出")
+            log_msg("  如果看不到窗口，请检查任务栏或Alt+Tab切换窗口")
+            # 尝试将浏览器窗口置于最前
+            try:
+                # 获取浏览器进程并尝试激活窗口
+                time.sleep(1)  # 等待窗口完全加载
+                log_msg("  提示: 如果浏览器窗口没有自动显示，请手动切换到浏览器窗口")
+            except:
+                pass
+    except Exception as e:
+        error_msg = f"✗ 页面导航失败: {e}"
+        log_msg(error_msg)
+        import traceback
+        try:
+            log_msg(traceback.format_exc())
+        except:
+            log_msg("无法输出详细错误信息")
+        return None
+
+    try:
+        while True:
+            try:
+                page.wait_for_timeout(1500)
+            except Exception as e:
+                # 如果页面已经关闭，退出循环
+                if "Target closed" in str(e) or "Target page, context or browser has been closed" in str(e):
+                    log_msg("浏览器已关闭，退出登录循环")
+                    break
+                # 其他错误继续
+                safe_print(f"[DEBUG] wait_for_timeout错误（可忽略）: {e}")
+
+            if deadline and time.monotonic() > deadline:
+                log_msg(f"✗ 等待扫码超时（{int(timeout)}秒）")
+                return None
+
+            if csrftoken and p20t:
+                token_dict = {"csrftoken": csrftoken, "p20t": p20t, "expirationTimestamp": expirationTimestamp}
+                log_msg("✓ 币安登录成功，获取到Token:")
+                log_msg(f"  csrftoken: {csrftoken[:20]}...")
+                log_msg(f"  p20t: {p20t[:20]}...")
+                log_msg(f"  expirationTimestamp: {expirationTimestamp}")
+                return token_dict
+
+            try:
+                # 检查页面是否仍然有效
+                try:
+                    current_url = page.url
+                except Exception as url_error:
+                    if "Target closed" in str(url_error) or "Target page, context or browser has been closed" in str(url_error):
+                        log_msg("浏览器已关闭，退出登录循环")
+                        break
+                    raise
+                
+                if "accounts.binance.com" in current_url:
+                    try:
+                        if page.get_by_text(re.compile("Understand")).count() > 0:
+                            page.get_by_role("button", name=re.compile("Understand")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+
+                    try:
+                        if page.get_by_text(re.compile("知道了")).count() > 0:
+                            page.get_by_role("button", name=re.compile("知道了")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+
+                    try:
+                        if page.get_by_text(re.compile("好的")).count() > 0:
+                            page.get_by_role("button", name=re.compile("好的")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+
+                    try:
+                        if page.get_by_text(re.compile("登录")).count() > 0 and page.get_by_text(re.compile("邮箱/手机号码")).count() > 0 and page.get_by_text(re.compile("用手机相机扫描")).count() == 0:
+                            page.get_by_role("button", name=re.compile("登录")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+
+                    try:
+                        if page.get_by_text(re.compile("刷新二维码")).count() > 0:
+                            page.get_by_role("button", name=re.compile("刷新二维码")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+
+                    try:
+                        if page.get_by_text(re.compile("保持登录状态")).count() > 0:
+                            page.get_by_role("button", name=re.compile("是")).first.click(timeout=1200, force=True)
+                    except:
+                        pass
+                else:
+                    try:
+                        update_p20t_from_context()
+                    except:
+                        pass
+            except Exception as loop_error:
+                # 如果页面已关闭，退出循环
+                if "Target closed" in str(loop_error) or "Target page, context or browser has been closed" in str(loop_error):
+                    log_msg("浏览器已关闭，退出登录循环")
+                    break
+                # 其他错误继续循环
+                safe_print(f"[DEBUG] 登录循环错误（可忽略）: {loop_error}")
+    finally:
+        # 移除事件监听器，避免关闭上下文时触发事件处理
+        for target in (page, ctx):
+            try:
+                target.remove_listener("request", on_request)
+                target.remove_listener("requestfinished", on_request_finished)
+            except:
+                pass
+    return None
@@ -18,6 +18,37 @@ class Settings(BaseSettings):
     
     # 订单拉取间隔（秒）
     order_pull_interval: float = float(os.getenv("ORDER_PULL_INTERVAL", "0.1"))
+    # 并行下单线程数（同一触发的10分钟和30分钟订单同时下单）
+    order_workers: int = int(os.getenv("ORDER_WORKERS", "2"))
+    # 多账号运行时的I/O线程数（下单、上报、预热共用）
+    runtime_workers: int = int(os.getenv("RUNTIME_WORKERS", "64"))
+    # 批量拉单单次请求的Token数（不能超过服务端 PULL_MULTI_MAX_TOKENS，默认同为500）
+    pull_multi_max_tokens: int = int(os.getenv("PULL_MULTI_MAX_TOKENS", "500"))
+    
+    # 订单结果本地日志（上报成功前保存在本地，崩溃重启后继续上报）
+    result_journal_file: str = os.getenv("RESULT_JOURNAL_FILE", "results.db")
+    result_flush_interval: float = float(os.getenv("RESULT_FLUSH_INTERVAL", "0.5"))
+    result_batch_size: int = int(os.getenv("RESULT_BATCH_SIZE", "100"))
+    
+    # 界面日志：保留行数、刷新间隔（毫秒）
+    log_view_max_lines: int = int(os.getenv("LOG_VIEW_MAX_LINES", "2000"))
+    log_view_refresh_ms: int = int(os.getenv("LOG_VIEW_REFRESH_MS", "250"))
+    
+    # 服务器API超时（秒）：连接超时、读取超时
+    api_connect_timeout: float = float(os.getenv("API_CONNECT_TIMEOUT", "3"))
+    api_read_timeout: float = float(os.getenv("API_READ_TIMEOUT", "5"))
+    # 连接池大小（心跳线程和接单线程并发请求）
+    api_pool_size: int = int(os.getenv("API_POOL_SIZE", "4"))
+    
+    # 币安下单连接池：连接数（10分钟和30分钟订单同时下单）、空闲保温间隔（秒）、超时（秒）
+    binance_pool_size: int = int(os.getenv("BINANCE_POOL_SIZE", "2"))
+    binance_keepalive_seconds: float = float(os.getenv("BINANCE_KEEPALIVE_SECONDS", "15"))
+    binance_connect_timeout: float = float(os.getenv("BINANCE_CONNECT_TIMEOUT", "2"))
+    binance_read_timeout: float = float(os.getenv("BINANCE_READ_TIMEOUT", "4"))
+    
+    # 币安登录池：常驻浏览器数量（内存占用上限）、单个账号等待扫码的最长时间（秒）
+    login_pool_size: int = int(os.getenv("LOGIN_POOL_SIZE", "3"))
+    login_timeout_seconds: float = float(os.getenv("LOGIN_TIMEOUT_SECONDS", "300"))
     
     # 会话有效期（小时）
     session_expire_hours: int = int(os.getenv("SESSION_EXPIRE_HOURS", "24"))
@@ -25,6 +56,11 @@ class Settings(BaseSettings):
     # Token存储文件
     token_file: str = os.getenv("TOKEN_FILE", "token.json")
     binance_token_file: str = os.getenv("BINANCE_TOKEN_FILE", "binance_token.json")
+    binance_key_file: str = os.getenv("BINANCE_KEY_FILE", "binance_token.key")
+    # 登录池保存的浏览器会话（加密，按用户追加后缀）
+    binance_state_file: str = os.getenv("BINANCE_STATE_FILE", "binance_state.json")
+    # 浏览器路径缓存（启动时不再扫描各个安装目录）
+    browser_cache_file: str = os.getenv("BROWSER_CACHE_FILE", "browser_path.json")
     
     class Config:
         env_file = ".env"
@@ -3,6 +3,7 @@
 """
 import sys
 import os
+from .utils import startup_profiler
 
 # 在导入PyQt5之前设置Qt插件路径（Windows和macOS平台）
 # 这必须在导入PyQt5之前执行，否则可能导致插件初始化失败
@@ -111,6 +112,8 @@ if sys.platform in ('win32', 'darwin') and not os.environ.get('QT_PLUGIN_PATH'):
         import traceback
         traceback.print_exc()
 
+startup_profiler.mark("Qt插件路径")
+
 import threading
 from datetime import datetime
 from PyQt5.QtWidgets import QApplication
@@ -121,11 +124,14 @@ from .services.auth_service import AuthService
 from .services.order_service import OrderService
 from .api_client import APIClient
 from .ui.login_window_qt import LoginWindow
-from .ui.main_window_qt import MainWindow
-from .ui.qr_window_qt import QRWindow
+# 主窗口和二维码窗口（依赖qrcode/PIL）在登录后才需要，延迟导入以加快启动
+# from .ui.main_window_qt import MainWindow
+# from .ui.qr_window_qt import QRWindow
 from .config import settings
 from .utils.token_manager import TokenManager
 
+startup_profiler.mark("导入模块")
+
 
 class BinanceLoginSignals(QObject):
     """币安登录信号类，用于跨线程通信"""
@@ -146,9 +152,11 @@ class ClientApp:
         self.order_service: OrderService = None
         # TokenManager只用于用户登录token，币安token保存在内存中
         self.token_manager = TokenManager()
+        startup_profiler.mark("初始化服务")
         
         # PyQt5应用实例
         self.qt_app = QApplication(sys.argv) if not QApplication.instance() else QApplication.instance()
+        startup_profiler.mark("创建QApplication")
         self.login_window = None
         self.main_window = None
         self.qr_window = None
@@ -323,6 +331,9 @@ class ClientApp:
             
             # 显示登录窗口（强制登录）
             self._show_login_window()
+            startup_profiler.mark("创建登录窗口")
+            # 事件循环处理完首次绘制后输出启动耗时
+            QTimer.singleShot(0, self._report_startup)
             
             print("[DEBUG] 准备启动Qt事件循环...")
             # 运行Qt事件循环
@@ -343,6 +354,11 @@ class ClientApp:
                 pass
             sys.exit(1)
     
+    def _report_startup(self):
+        """登录窗口首次绘制完成，记录启动耗时"""
+        startup_profiler.mark("首次绘制")
+        startup_profiler.report()
+    
     def _show_login_window(self):
         """显示登录窗口"""
         try:
@@ -377,7 +393,7 @@ class ClientApp:
             if result.get("code") == 200:
                 # 登录成功，同步token到api_client
                 if result.get("data", {}).get("token"):
-                    self.api_client.set_token(result["data"]["token"])
+                    self.api_client.set_token(result["data"]["token"], result["data"].get("user_id"))
                 
                 # 标记登录成功，避免关闭登录窗口时退出程序
                 if self.login_window:
@@ -431,6 +447,7 @@ class ClientApp:
             
             # 创建主窗口
             try:
+                from .ui.main_window_qt import MainWindow
                 self.main_window = MainWindow(
                     username=username,
                     on_binance_login=self._handle_binance_login,
@@ -455,9 +472,11 @@ class ClientApp:
                     self.login_window.show_error(f"启动主窗口失败: {str(e)}")
                 return
             
-            # 检查币安登录状态（内存中的token，程序重启后需要重新登录）
+            # 检查币安登录状态（内存中没有时尝试从加密的磁盘缓存恢复）
             try:
                 binance_service = self._get_binance_service()
+                if not binance_service.is_logged_in():
+                    binance_service.restore_session(user_data.get("user_id") if user_data else None)
                 
                 # 设置登录成功回调，在token保存后立即更新GUI状态
                 def update_gui_on_login_success():
@@ -468,15 +487,15 @@ class ClientApp:
                 
                 binance_service.set_login_success_callback(update_gui_on_login_success)
                 
-                # Token只保存在内存中，程序重启后需要重新登录
+                # Token未过期时程序重启后直接恢复，无需重新扫码
                 if binance_service.is_logged_in():
                     token = binance_service.load_token()
                     self.main_window.set_binance_logged_in(True)
-                    self.main_window.log("币安账号已登录（内存中）")
+                    self.main_window.log("币安账号已登录")
                     if token and token.get('expirationTimestamp') and token.get('expirationTimestamp') > 0:
                         self.main_window.log(f"Token有效期至: {datetime.fromtimestamp(token.get('expirationTimestamp', 0)).strftime('%Y-%m-%d %H:%M:%S')}")
                 else:
-                    self.main_window.log("请先登录币安账号（Token仅保存在内存中，程序重启后需要重新登录）")
+                    self.main_window.log("请先登录币安账号")
                 
                 # 创建订单服务
                 self.order_service = OrderService(self.api_client, binance_service)
@@ -484,9 +503,9 @@ class ClientApp:
                 
                 # 设置订单服务的日志回调
                 def order_log_callback(msg):
+                    # main_window.log只写入缓冲区，可以直接在下单线程中调用
                     if self.main_window:
-                        from PyQt5.QtCore import QTimer
-                        QTimer.singleShot(0, lambda: self.main_window.log(msg))
+                        self.main_window.log(msg)
                 self.order_service.set_log_callback(order_log_callback)
                 
                 # 设置订单金额
@@ -544,6 +563,7 @@ class ClientApp:
             # 在Qt主线程中显示二维码窗口
             from PyQt5.QtCore import QTimer
             def show_qr():
+                from .ui.qr_window_qt import QRWindow
                 if self.qr_window:
                     self.qr_window.close_window()
                 self.qr_window = QRWindow(qr_data)
@@ -600,40 +620,45 @@ class ClientApp:
                 
                 log_msg("正在启动浏览器，请稍候...")
                 
-                # 检查Playwright浏览器是否已安装（快速检查）
-                try:
-                    from playwright.sync_api import sync_playwright
-                    with sync_playwright() as pw:
-                        # 尝试获取chromium浏览器路径，检查是否已安装
-                        try:
-                            browser_path = pw.chromium.executable_path
-                            log_msg(f"✓ Playwright浏览器已安装: {browser_path}")
-                        except Exception as e:
-                            log_msg(f"✗ Playwright浏览器未安装或路径错误: {e}")
-                            log_msg("正在安装Playwright浏览器...")
-                            import subprocess
-                            import sys
-                            result = subprocess.run(
-                                [sys.executable, "-m", "playwright", "install", "chromium"],
-                                capture_output=True,
-                                text=True,
-                                timeout=300
-                            )
-                            if result.returncode == 0:
-                                log_msg("✓ Playwright浏览器安装成功")
-                            else:
-                                log_msg(f"✗ Playwright浏览器安装失败: {result.stderr}")
-                                QTimer.singleShot(0, lambda: self.main_window.log("请手动运行: python -m playwright install chromium") if self.main_window else None)
-                                return
-                except ImportError:
-                    log_msg("✗ Playwright未安装，请运行: pip install playwright")
-                    QTimer.singleShot(0, lambda: self.main_window.log("请先安装Playwright: pip install playwright") if self.main_window else None)
-                    return
-                except Exception as e:
-                    log_msg(f"✗ 检查Playwright时出错: {e}")
-                    import traceback
-                    log_msg(traceback.format_exc())
-                    return
+                # 检查Playwright浏览器是否已安装（已缓存浏览器路径时跳过，不再启动Playwright驱动检查）
+                from .binance_client import find_browser_executable
+                cached_browser = find_browser_executable()
+                if cached_browser:
+                    log_msg(f"✓ 使用已找到的浏览器: {cached_browser}")
+                else:
+                    try:
+                        from playwright.sync_api import sync_playwright
+                        with sync_playwright() as pw:
+                            # 尝试获取chromium浏览器路径，检查是否已安装
+                            try:
+                                browser_path = pw.chromium.executable_path
+                                log_msg(f"✓ Playwright浏览器已安装: {browser_path}")
+                            except Exception as e:
+                                log_msg(f"✗ Playwright浏览器未安装或路径错误: {e}")
+                                log_msg("正在安装Playwright浏览器...")
+                                import subprocess
+                                import sys
+                                result = subprocess.run(
+                                    [sys.executable, "-m", "playwright", "install", "chromium"],
+                                    capture_output=True,
+                                    text=True,
+                                    timeout=300
+                                )
+                                if result.returncode == 0:
+                                    log_msg("✓ Playwright浏览器安装成功")
+                                else:
+                                    log_msg(f"✗ Playwright浏览器安装失败: {result.stderr}")
+                                    QTimer.singleShot(0, lambda: self.main_window.log("请手动运行: python -m playwright install chromium") if self.main_window else None)
+                                    return
+                    except ImportError:
+                        log_msg("✗ Playwright未安装，请运行: pip install playwright")
+                        QTimer.singleShot(0, lambda: self.main_window.log("请先安装Playwright: pip install playwright") if self.main_window else None)
+                        return
+                    except Exception as e:
+                        log_msg(f"✗ 检查Playwright时出错: {e}")
+                        import traceback
+                        log_msg(traceback.format_exc())
+                        return
                 
                 log_msg("正在清理浏览器缓存...")
                 
@@ -661,14 +686,17 @@ class ClientApp:
                 binance_service.set_login_success_callback(update_gui_on_login_success)
                 log_to_gui("✓ 回调函数已设置")
                 
-                # reset=True: 每次登录都清理缓存
+                # 已登录时点击为"重新登录币安"：清理浏览器目录和Token缓存；否则复用浏览器目录（仍在登录状态时无需扫码）
+                reset_profile = binance_service.is_logged_in()
+                if reset_profile:
+                    binance_service.clear_token(forget=True)
                 log_to_gui("开始调用binance_service.login()...")
                 log_to_gui("注意: 浏览器窗口应该会弹出，如果没有弹出，请查看错误日志")
                 
                 # 调用登录函数（这会启动浏览器）
                 try:
                     log_msg("准备调用binance_service.login()...")
-                    log_msg(f"参数: reset=True, headless=False, user_id={user_id}")
+                    log_msg(f"参数: reset={reset_profile}, headless=False, user_id={user_id}")
                     log_msg(f"日志回调已设置: {binance_service.log_callback is not None}")
                     
                     # 确保日志回调正确传递
@@ -691,7 +719,7 @@ class ClientApp:
                     # 直接调用并捕获所有异常
                     try:
                         safe_print("[DEBUG] 开始执行binance_service.login()...")
-                        token_info = binance_service.login(reset=True, headless=False, qr_callback=qr_callback, user_id=user_id)
+                        token_info = binance_service.login(reset=reset_profile, headless=False, qr_callback=qr_callback, user_id=user_id)
                         safe_print(f"[DEBUG] binance_service.login()返回: {token_info is not None}")
                         if token_info is None:
                             log_msg("登录失败: binance_service.login()返回None")
@@ -795,7 +823,7 @@ class ClientApp:
                     self.main_window.log("[OK] Token已保存到内存，正在更新GUI状态...")
                     self.main_window.set_binance_logged_in(True)
                     self.main_window.log("[OK] 币安登录成功，GUI状态已更新")
-                    self.main_window.log("[WARN] 注意: Token仅保存在内存中，程序关闭后需要重新登录")
+                    self.main_window.log("[INFO] Token已加密缓存到本地，有效期内重启程序无需重新扫码")
                     self.main_window.log(f"[INFO] 详细日志已保存到: {get_log_file()}")
                 except Exception as log_error:
                     error(f"输出日志到GUI时出错: {log_error}")
@@ -953,8 +981,9 @@ class ClientApp:
         if self.binance_service:
             self.binance_service.clear_token()
         
-        # 清除登录信息
+        # 清除登录信息（下单使用的客户端也清除，未上报的结果不会记到下一个登录的账号）
         self.auth_service.logout()
+        self.api_client.set_token(None)
         
         # 关闭主窗口和二维码窗口
         if self.main_window:
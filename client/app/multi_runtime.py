@@ -0,0 +1,320 @@
+"""
+多账号运行时（无界面）
+一个asyncio进程托管多个账号：共用一个服务器连接批量拉单，订单并发分发到各账号的币安下单连接
+
+用法: python -m app.multi_runtime accounts.json
+accounts.json: [{"username": "user1", "password": "***", "order_amount": 10}, ...]
+"""
+import sys
+import json
+import time
+import signal
+import asyncio
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Set
+from .api_client import APIClient
+from .config import settings
+from .services.login_pool import BrowserLoginPool
+from .services.order_transport import OrderTransport
+from .services.result_reporter import ResultReporter
+from .utils.token_manager import TokenManager
+from .services.order_service import get_payout_ratio, is_order_valid
+
+
+class Account:
+    """托管账号"""
+    
+    def __init__(self, username: str, password: str, order_amount: float):
+        self.username = username
+        self.password = password
+        self.order_amount = min(max(order_amount, settings.min_order_amount), settings.max_order_amount)
+        self.user_id: Optional[int] = None
+        self.token: Optional[str] = None  # 服务器Token
+        self.binance_expire_at = -1
+        self.transport: Optional[OrderTransport] = None
+        self.in_flight: Set[int] = set()  # 正在下单的订单ID
+        self.active = False
+    
+    def binance_expired(self) -> bool:
+        """币安Token是否已过期"""
+        return 0 < self.binance_expire_at < time.time()
+
+
+class MultiAccountRuntime:
+    """多账号运行时"""
+    
+    def __init__(self, accounts: List[Account]):
+        self.accounts = accounts
+        # 所有账号共用一个连接池，请求时按账号指定Token
+        self.api_client = APIClient()
+        self.token_manager = TokenManager()
+        # 所有账号的结果写入同一个本地日志，按账号分组、使用账号当前的Token批量上报
+        self.reporter = ResultReporter(self.api_client, token_provider=self._account_token)
+        self.running = False
+        self.tasks: Set[asyncio.Task] = set()
+        # requests是阻塞库，下单/预热放到线程池，由事件循环统一调度
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.runtime_workers, thread_name_prefix="runtime"
+        )
+    
+    def _account_token(self, user_id: int) -> Optional[str]:
+        """账号当前的服务器Token（未在本次运行中登录的账号返回None，其结果保留在本地日志中）"""
+        for account in self.accounts:
+            if account.user_id == user_id:
+                return account.token
+        return None
+    
+    def _log(self, message: str, account: Optional[Account] = None):
+        """输出日志（带账号前缀）"""
+        prefix = f"[{account.username}] " if account else ""
+        print(f"{prefix}{message}")
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """在线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+    
+    def _login_server(self, account: Account):
+        """登录服务器"""
+        try:
+            result = self.api_client.login(account.username, account.password)
+        except Exception as e:
+            self._log(f"✗ 服务器登录失败: {e}", account)
+            return
+        if result.get("code") != 200 or not result.get("data"):
+            self._log(f"✗ 服务器登录失败: {result.get('message')}", account)
+            return
+        account.user_id = result["data"]["user_id"]
+        account.token = result["data"]["token"]
+        self._log(f"✓ 服务器登录成功: user_id={account.user_id}", account)
+    
+    def _restore_binance(self, account: Account) -> bool:
+        """从加密的本地缓存恢复币安Token"""
+        token_info = self.token_manager.load_binance_token(account.user_id)
+        if not token_info:
+            return False
+        self._log("✓ 已从本地缓存恢复币安Token", account)
+        self._activate(account, token_info)
+        return True
+    
+    async def _login_binance(self, pool: BrowserLoginPool, account: Account):
+        """缓存失效的账号交给登录池扫码登录（未登录时在终端打印二维码）"""
+        future = pool.submit(account.user_id, log_callback=partial(self._log, account=account))
+        token_info = await asyncio.wrap_future(future)
+        if not token_info:
+            self._log("✗ 币安登录失败，跳过该账号", account)
+            return
+        try:
+            self.token_manager.save_binance_token(
+                csrftoken=token_info["csrftoken"],
+                p20t=token_info["p20t"],
+                expirationTimestamp=token_info.get("expirationTimestamp", -1),
+                user_id=account.user_id
+            )
+        except Exception as e:
+            self._log(f"⚠️ 币安Token缓存失败: {e}", account)
+        self._activate(account, token_info)
+    
+    def _activate(self, account: Account, token_info: Dict):
+        """创建账号的下单通道"""
+        account.binance_expire_at = token_info.get("expirationTimestamp", -1)
+        # 保温由运行时统一调度，不为每个账号启动线程
+        account.transport = OrderTransport(
+            csrftoken=token_info["csrftoken"],
+            p20t=token_info["p20t"],
+            log_callback=partial(self._log, account=account)
+        )
+        account.active = True
+    
+    async def _prepare(self):
+        """登录所有账号并预热下单连接"""
+        await asyncio.gather(*(self._run_blocking(self._login_server, account) for account in self.accounts))
+        # 拉单和上报都显式传Token，不使用最后一个登录账号的Token
+        self.api_client.set_token(None)
+        
+        # 缓存失效的账号并发登录：登录池限定常驻浏览器数量，其余账号排队
+        pending = [
+            account for account in self.accounts
+            if account.token and not self._restore_binance(account)
+        ]
+        if pending:
+            pool = BrowserLoginPool(log_callback=self._log)
+            try:
+                await asyncio.gather(*(self._login_binance(pool, account) for account in pending))
+            finally:
+                await self._run_blocking(pool.stop)
+        
+        active = [account for account in self.accounts if account.active]
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_blocking(account.transport.warm) for account in active))
+        self._log(f"✓ {len(active)}/{len(self.accounts)}个账号已就绪，下单连接预热耗时{int((time.perf_counter() - started) * 1000)}ms")
+    
+    def _deactivate(self, account: Account, reason: str):
+        """停用账号（其他账号继续运行）"""
+        account.active = False
+        self._log(f"✗ 账号已停用: {reason}", account)
+    
+    async def _pull_loop(self):
+        """批量拉单循环：一次请求拉取所有账号的订单"""
+        while self.running:
+            active = [account for account in self.accounts if account.active]
+            if not active:
+                self._log("没有可用账号，停止运行")
+                break
+            
+            try:
+                entries = await self._pull_all(active)
+            except Exception as e:
+                self._log(f"✗ 拉取订单错误: {e}")
+                await asyncio.sleep(settings.order_pull_interval)
+                continue
+            
+            for account, entry in zip(active, entries):
+                if not entry or not entry.get("valid"):
+                    self._deactivate(account, (entry or {}).get("error", "Token已失效"))
+                    continue
+                for order in entry.get("orders") or []:
+                    self._dispatch(account, order)
+            
+            await asyncio.sleep(settings.order_pull_interval)
+    
+    async def _pull_all(self, active: List[Account]) -> List[Dict]:
+        """按服务端上限分批并发拉单，结果与账号顺序一致"""
+        size = settings.pull_multi_max_tokens
+        chunks = [active[i:i + size] for i in range(0, len(active), size)]
+        results = await asyncio.gather(*(
+            self._run_blocking(self.api_client.pull_orders_multi, [account.token for account in chunk])
+            for chunk in chunks
+        ))
+        return [entry for entries in results for entry in entries]
+    
+    def _dispatch(self, account: Account, order: Dict):
+        """为账号创建下单任务（不等待完成，拉单继续进行）"""
+        order_id = order.get("id")
+        if not is_order_valid(order):
+            self._log(f"✗ 订单{order_id}已过期，跳过", account)
+            return
+        if account.binance_expired():
+            self._deactivate(account, "币安Token已过期，请重新登录")
+            return
+        if order_id in account.in_flight:
+            return
+        account.in_flight.add(order_id)
+        task = asyncio.create_task(self._execute_order(account, order))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    async def _execute_order(self, account: Account, order: Dict):
+        """执行下单，完成后写入结果日志"""
+        time_increments = order.get("time_increments", "TEN_MINUTE")
+        payout_ratio = get_payout_ratio(time_increments)
+        report_kwargs = {}
+        try:
+            result, timing = await self._run_blocking(
+                account.transport.place_order,
+                orderAmount=str(int(account.order_amount)),
+                timeIncrements=time_increments,
+                symbolName=order["symbol_name"],
+                payoutRatio=payout_ratio,
+                direction=order["direction"]
+            )
+            report_kwargs = {
+                "latency_ms": timing["total_ms"],
+                "amount": account.order_amount,
+                "payout_ratio": float(payout_ratio),
+            }
+            if result.get("success") or result.get("code") == 200:
+                self._log(f"✓ 下单成功: 订单ID={order['id']}, 方向={order['direction']}, 时间周期={time_increments}, 耗时{timing['total_ms']}ms", account)
+            else:
+                error_msg = result.get("message") or result.get("error", "未知错误")
+                self._log(f"✗ 下单失败: 订单ID={order['id']}, 错误={error_msg}", account)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+            self._log(f"✗ 下单失败: 订单ID={order.get('id', 'N/A')}, 错误={e}", account)
+        finally:
+            account.in_flight.discard(order.get("id"))
+        
+        try:
+            self.reporter.enqueue(order["id"], result, user_id=account.user_id, **report_kwargs)
+        except Exception as e:
+            self._log(f"⚠️ 订单{order['id']}结果写入本地日志失败: {e}", account)
+    
+    async def _keepalive_loop(self):
+        """所有账号共用一个保温任务：空闲超过间隔的账号刷新下单连接"""
+        while self.running:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            stale = [
+                account for account in self.accounts
+                if account.active and now - account.transport.last_used >= settings.binance_keepalive_seconds
+            ]
+            if stale:
+                await asyncio.gather(
+                    *(self._run_blocking(account.transport.warm) for account in stale),
+                    return_exceptions=True
+                )
+    
+    async def run(self):
+        """运行直到所有账号停用或收到停止信号"""
+        await self._prepare()
+        self.reporter.start()
+        self.running = True
+        keepalive = asyncio.create_task(self._keepalive_loop())
+        try:
+            await self._pull_loop()
+        finally:
+            self.running = False
+            keepalive.cancel()
+            # 等待已发出的订单完成，上报器退出前再上报一次
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            for account in self.accounts:
+                if account.transport:
+                    account.transport.stop()
+            self.reporter.stop()
+            self.api_client.close()
+            self.executor.shutdown(wait=False)
+    
+    def stop(self):
+        """停止运行（当前拉单轮次结束后退出）"""
+        self.running = False
+
+
+def load_accounts(path: str) -> List[Account]:
+    """读取账号配置文件"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [
+        Account(
+            username=item["username"],
+            password=item["password"],
+            order_amount=float(item.get("order_amount", settings.default_order_amount))
+        )
+        for item in items
+    ]
+
+
+def main():
+    """命令行入口"""
+    if len(sys.argv) < 2:
+        print("用法: python -m app.multi_runtime accounts.json")
+        sys.exit(1)
+    
+    runtime = MultiAccountRuntime(load_accounts(sys.argv[1]))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, runtime.stop)
+        except NotImplementedError:
+            # Windows不支持add_signal_handler，Ctrl+C直接中断
+            pass
+    try:
+        loop.run_until_complete(runtime.run())
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,7 +25,7 @@ class AuthService:
                 username=data["username"],
                 expire_at=data["expire_at"]
             )
-            self.api_client.set_token(data["token"])
+            self.api_client.set_token(data["token"], data["user_id"])
         
         return result
     
@@ -43,7 +43,7 @@ class AuthService:
         
         # 验证Token是否有效（单点登录检查）
         try:
-            self.api_client.set_token(token_data["token"])
+            self.api_client.set_token(token_data["token"], token_data.get("user_id"))
             verify_result = self.api_client.verify_token()
             if verify_result.get("code") == 200:
                 # Token有效，恢复会话成功
@@ -1,18 +1,22 @@
 """
 币安服务
 """
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, Callable, Tuple
 # 延迟导入binance_client，避免Playwright的macOS版本检查
-# from ..binance_client import get_token, place_order_web
+# from ..binance_client import get_token
 from ..utils.token_manager import TokenManager
+from .order_transport import OrderTransport
 
 
 class BinanceService:
     """币安服务类"""
     
     def __init__(self):
-        # Token只保存在内存中，不保存到文件
+        # Token保存在内存中，同时加密缓存到磁盘（按用户区分），重启后免扫码
         self._token: Optional[Dict] = None
+        self._user_id: Optional[int] = None
+        self.token_manager = TokenManager()
+        self._transport: Optional[OrderTransport] = None  # 当前账号的下单连接池
         self.on_login_success: Optional[Callable] = None  # 登录成功回调
         self.log_callback: Optional[Callable] = None  # 日志回调函数
     
@@ -44,11 +48,11 @@ class BinanceService:
             except:
                 pass
     
-    def login(self, reset: bool = True, headless: bool = False, qr_callback: Optional[Callable] = None, user_id: Optional[int] = None) -> Optional[Dict]:
+    def login(self, reset: bool = False, headless: bool = False, qr_callback: Optional[Callable] = None, user_id: Optional[int] = None) -> Optional[Dict]:
         """币安登录
         
         Args:
-            reset: 是否重置浏览器缓存（默认True，每次登录都清理）
+            reset: 是否重置浏览器缓存（默认False，复用该用户的浏览器目录，仍在登录状态时无需扫码）
             headless: 是否无头模式
             qr_callback: 二维码回调函数
             user_id: 用户ID，用于多账号支持
@@ -81,7 +85,7 @@ class BinanceService:
         from ..binance_client import get_token
         safe_print("[DEBUG] BinanceService.login() - get_token导入成功")
         
-        # 每次登录都清理缓存，支持多账号
+        # 每个用户使用独立的浏览器目录，支持多账号
         try:
             self._log("正在调用get_token函数...")
             safe_print("[DEBUG] BinanceService.login() - 准备调用get_token()")
@@ -122,7 +126,7 @@ class BinanceService:
             return None
         if token_info:
             self._log("✓ 收到Token信息，保存到内存...")
-            # 只保存到内存，不保存到文件
+            self._user_id = user_id
             self._token = {
                 "csrftoken": token_info.get("csrftoken", ""),
                 "p20t": token_info.get("p20t", ""),
@@ -130,6 +134,15 @@ class BinanceService:
             }
             self._log(f"✓ Token已保存到内存: csrftoken={self._token['csrftoken'][:20]}..., p20t={self._token['p20t'][:20]}...")
             
+            # 加密缓存到磁盘，程序重启后直接恢复
+            try:
+                self.token_manager.save_binance_token(user_id=user_id, **self._token)
+            except Exception as e:
+                self._log(f"⚠ Token缓存到磁盘失败（不影响本次使用）: {e}")
+            
+            # 登录后立即建立下单连接，第一笔订单也不需要握手
+            self._reset_transport()
+            
             # Token保存成功后，立即调用回调函数更新GUI状态
             if self.on_login_success:
                 try:
@@ -151,6 +164,21 @@ class BinanceService:
         """加载币安Token（从内存）"""
         return self._token
     
+    def restore_session(self, user_id: Optional[int] = None) -> bool:
+        """从磁盘缓存恢复币安Token（未过期时无需启动浏览器）"""
+        token_info = self.token_manager.load_binance_token(user_id)
+        if not token_info or not token_info.get("csrftoken") or not token_info.get("p20t"):
+            return False
+        self._user_id = user_id
+        self._token = {
+            "csrftoken": token_info["csrftoken"],
+            "p20t": token_info["p20t"],
+            "expirationTimestamp": token_info.get("expirationTimestamp", -1)
+        }
+        self._log("✓ 已从本地缓存恢复币安登录状态")
+        self._reset_transport()
+        return True
+    
     def is_logged_in(self) -> bool:
         """检查是否已登录币安"""
         if self._token is None:
@@ -161,13 +189,32 @@ class BinanceService:
             from datetime import datetime
             expire_time = datetime.fromtimestamp(expirationTimestamp)
             if datetime.now() > expire_time:
-                self._token = None  # 清除过期的token
+                self.clear_token(forget=True)  # 清除过期的token（包括磁盘缓存）
                 return False
         return True
     
-    def clear_token(self):
-        """清除Token（退出登录时调用）"""
+    def clear_token(self, forget: bool = False):
+        """清除内存中的Token（退出登录时调用）；forget=True时同时删除磁盘缓存"""
+        if forget:
+            self.token_manager.clear_binance_token(self._user_id)
         self._token = None
+        self._close_transport()
+    
+    def _reset_transport(self):
+        """按当前Token重建下单连接池"""
+        self._close_transport()
+        self._transport = OrderTransport(
+            csrftoken=self._token["csrftoken"],
+            p20t=self._token["p20t"],
+            log_callback=self.log_callback
+        )
+        self._transport.start()
+    
+    def _close_transport(self):
+        """关闭下单连接池"""
+        if self._transport:
+            self._transport.stop()
+            self._transport = None
     
     def place_order(
         self,
@@ -176,20 +223,17 @@ class BinanceService:
         symbolName: str,
         payoutRatio: str,
         direction: str
-    ) -> Dict:
-        """下单"""
-        # 导入实际下单函数
-        from ..binance_client import place_order_web
-        
+    ) -> Tuple[Dict, Dict]:
+        """下单，返回(币安返回结果, 耗时信息)"""
         token_info = self.load_token()
         if not token_info:
             raise Exception("币安账号未登录")
+        if self._transport is None:
+            self._reset_transport()
         
         self._log(f"正在调用币安API下单: 金额={orderAmount}, 交易对={symbolName}, 方向={direction}, 时间周期={timeIncrements}")
         
-        result = place_order_web(
-            csrftoken=token_info["csrftoken"],
-            p20t=token_info["p20t"],
+        result, timing = self._transport.place_order(
             orderAmount=orderAmount,
             timeIncrements=timeIncrements,
             symbolName=symbolName,
@@ -198,5 +242,5 @@ class BinanceService:
         )
         
         self._log(f"币安API返回结果: {result}")
-        return result
-
+        self._log(f"下单耗时: 发出={timing['sent_at']}, 收到={timing['received_at']}, 响应头{timing['response_ms']}ms, 总计{timing['total_ms']}ms")
+        return result, timing
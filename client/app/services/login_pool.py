@@ -0,0 +1,218 @@
+"""
+币安登录池
+常驻限定数量的无头浏览器，账号排队登录：每个账号在独立的浏览器上下文中扫码（cookie互不影响），
+登录完成后只关闭上下文、浏览器留给下一个账号，内存占用只与浏览器数量有关，与账号数量无关
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, Callable
+from ..config import settings
+from ..utils.token_manager import TokenManager
+
+# 账号登录状态
+STATUS_QUEUED = "排队中"
+STATUS_LOGGING_IN = "登录中"
+STATUS_SUCCESS = "成功"
+STATUS_FAILED = "失败"
+
+
+class LoginTask:
+    """单个账号的登录任务"""
+    
+    def __init__(
+        self,
+        user_id: int,
+        reset: bool = False,
+        log_callback: Optional[Callable] = None,
+        qr_callback: Optional[Callable] = None
+    ):
+        self.user_id = user_id
+        self.reset = reset
+        self.log_callback = log_callback
+        self.qr_callback = qr_callback
+        # 结果为Token字典，失败时为None
+        self.future: Future = Future()
+
+
+class BrowserLoginPool:
+    """币安登录池（每个工作线程持有一个Playwright实例和一个常驻浏览器）"""
+    
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        headless: bool = True,
+        timeout: Optional[float] = None,
+        log_callback: Optional[Callable] = None
+    ):
+        self.size = size or settings.login_pool_size
+        self.headless = headless
+        self.timeout = timeout if timeout is not None else settings.login_timeout_seconds
+        self.log_callback = log_callback
+        self.token_manager = TokenManager()
+        
+        self.tasks: "queue.Queue[Optional[LoginTask]]" = queue.Queue()
+        self.status: Dict[int, str] = {}  # user_id -> 登录状态
+        self.lock = threading.Lock()
+        self.workers = []
+        self.running = False
+    
+    def _log(self, message: str):
+        """输出日志"""
+        if self.log_callback:
+            self.log_callback(message)
+        else:
+            print(message)
+    
+    def start(self):
+        """启动工作线程（浏览器在线程领到第一个任务时才启动）"""
+        if self.running:
+            return
+        self.running = True
+        for index in range(self.size):
+            worker = threading.Thread(target=self._worker_loop, name=f"login-worker-{index}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+    
+    def stop(self):
+        """停止工作线程并关闭浏览器（未开始的任务按失败处理）"""
+        if not self.running:
+            return
+        self.running = False
+        while True:
+            try:
+                task = self.tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task:
+                self._finish(task, None)
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join(timeout=10)
+        self.workers = []
+    
+    def submit(
+        self,
+        user_id: int,
+        reset: bool = False,
+        log_callback: Optional[Callable] = None,
+        qr_callback: Optional[Callable] = None
+    ) -> Future:
+        """
+        提交登录任务，立即返回Future（结果为Token字典，失败为None）
+        
+        Args:
+            user_id: 服务器用户ID（决定会话文件）
+            reset: 是否丢弃已保存的会话，强制重新扫码
+            log_callback: 该账号的日志回调
+            qr_callback: 二维码回调函数
+        """
+        self.start()
+        task = LoginTask(user_id, reset=reset, log_callback=log_callback, qr_callback=qr_callback)
+        self._set_status(task, STATUS_QUEUED)
+        self.tasks.put(task)
+        return task.future
+    
+    def progress(self) -> Dict[str, int]:
+        """各状态的账号数"""
+        with self.lock:
+            counts = {status: 0 for status in (STATUS_QUEUED, STATUS_LOGGING_IN, STATUS_SUCCESS, STATUS_FAILED)}
+            for status in self.status.values():
+                counts[status] += 1
+        return counts
+    
+    def _set_status(self, task: LoginTask, status: str):
+        """更新账号状态（排队以外的变化输出整体进度）"""
+        with self.lock:
+            self.status[task.user_id] = status
+        if status != STATUS_QUEUED:
+            counts = self.progress()
+            self._log(
+                f"币安登录进度: 成功{counts[STATUS_SUCCESS]}/{len(self.status)}, 失败{counts[STATUS_FAILED]}, "
+                f"登录中{counts[STATUS_LOGGING_IN]}, 排队{counts[STATUS_QUEUED]}"
+            )
+    
+    def _finish(self, task: LoginTask, token_info: Optional[Dict]):
+        """记录任务结果"""
+        self._set_status(task, STATUS_SUCCESS if token_info else STATUS_FAILED)
+        task.future.set_result(token_info)
+    
+    def _worker_loop(self):
+        """工作线程：Playwright同步接口只能在创建它的线程中使用，浏览器随线程常驻"""
+        pw = None
+        browser = None
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is None:
+                    break
+                self._set_status(task, STATUS_LOGGING_IN)
+                token_info = None
+                try:
+                    if pw is None:
+                        from playwright.sync_api import sync_playwright
+                        pw = sync_playwright().start()
+                    if browser is None or not browser.is_connected():
+                        browser = self._launch_browser(pw)
+                    token_info = self._login(browser, task)
+                except Exception as e:
+                    self._log(f"✗ 账号{task.user_id}币安登录出错: {e}")
+                self._finish(task, token_info)
+        finally:
+            try:
+                if browser:
+                    browser.close()
+            except Exception:
+                pass
+            try:
+                if pw:
+                    pw.stop()
+            except Exception:
+                pass
+    
+    def _launch_browser(self, pw):
+        """启动常驻浏览器（与单账号登录使用同一个浏览器和启动参数）"""
+        from ..binance_client import browser_launch_args, resolve_executable_path
+        launch_kwargs = dict(headless=self.headless, args=browser_launch_args(self.headless))
+        executable_path = resolve_executable_path(pw)
+        if executable_path:
+            launch_kwargs["executable_path"] = executable_path
+        browser = pw.chromium.launch(**launch_kwargs)
+        self._log(f"✓ 登录浏览器已启动（{threading.current_thread().name}）")
+        return browser
+    
+    def _login(self, browser, task: LoginTask) -> Optional[Dict]:
+        """在独立的浏览器上下文中登录，成功后加密保存会话供下次免扫码"""
+        from ..binance_client import context_options, apply_platform_ua, wait_for_token
+        if task.reset:
+            self.token_manager.clear_binance_state(task.user_id)
+        
+        # 会话在内存中解密后交给浏览器，不写明文文件
+        ctx = browser.new_context(
+            storage_state=self.token_manager.load_binance_state(task.user_id),
+            **context_options()
+        )
+        try:
+            page = ctx.new_page()
+            apply_platform_ua(ctx, page)
+            # 多个账号同时登录，不写共用的二维码图片
+            token_info = wait_for_token(
+                ctx, page,
+                headless=self.headless,
+                qr_callback=task.qr_callback,
+                log_callback=task.log_callback,
+                timeout=self.timeout,
+                qr_file=None
+            )
+            if token_info:
+                try:
+                    self.token_manager.save_binance_state(ctx.storage_state(), task.user_id)
+                except Exception as e:
+                    self._log(f"⚠️ 账号{task.user_id}浏览器会话保存失败: {e}")
+            return token_info
+        finally:
+            try:
+                ctx.close()
+            except Exception:
+                pass
@@ -3,16 +3,50 @@
 """
 import time
 import threading
-from typing import Optional, Dict, Callable, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Callable, Set, TYPE_CHECKING
 from datetime import datetime
 from ..api_client import APIClient
+from .result_reporter import ResultReporter
 # 延迟导入BinanceService，避免Playwright的macOS版本检查
 # from ..services.binance_service import BinanceService
 from ..config import settings
+from ..utils import logger as file_logger
 
 if TYPE_CHECKING:
     from ..services.binance_service import BinanceService
 
+# 不同时间周期的赔率（10分钟0.80，30分钟0.85）
+PAYOUT_RATIOS = {
+    "TEN_MINUTE": "0.80",
+    "THIRTY_MINUTE": "0.85",
+}
+
+
+def get_payout_ratio(time_increments: str) -> str:
+    """根据订单时间周期获取payoutRatio（未知周期按10分钟）"""
+    return PAYOUT_RATIOS.get(time_increments, PAYOUT_RATIOS["TEN_MINUTE"])
+
+
+def is_order_valid(order: Dict) -> bool:
+    """检查订单是否在有效期内"""
+    if not order or not isinstance(order, dict):
+        return False
+    
+    created_at_str = order.get("created_at")
+    if not created_at_str:
+        return False
+    
+    try:
+        created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
+        current_time = datetime.now(created_at.tzinfo) if created_at.tzinfo else datetime.now()
+        elapsed = (current_time - created_at).total_seconds()
+        valid_duration = order.get("valid_duration", 0)
+        
+        return elapsed < valid_duration
+    except:
+        return False
+
 
 class OrderService:
     """订单服务类"""
@@ -25,6 +59,11 @@ class OrderService:
         self.order_amount = settings.default_order_amount
         self.on_order_callback: Optional[Callable] = None
         self.log_callback: Optional[Callable] = None  # 日志回调函数
+        # 下单线程池（同一触发的订单并行下单）和结果上报器（先写本地日志，后台批量上报）
+        self.order_executor: Optional[ThreadPoolExecutor] = None
+        self.reporter: Optional[ResultReporter] = None
+        self.in_flight: Set[int] = set()  # 正在下单的订单ID，避免重复执行
+        self.in_flight_lock = threading.Lock()
     
     def set_order_amount(self, amount: float):
         """设置下单金额"""
@@ -43,14 +82,13 @@ class OrderService:
         self.log_callback = callback
     
     def _log(self, message: str):
-        """输出日志"""
+        """输出日志（异步写入日志文件并输出到控制台，不阻塞下单线程）"""
+        file_logger.info(message)
         if self.log_callback:
             try:
                 self.log_callback(message)
             except:
-                print(message)
-        else:
-            print(message)
+                pass
     
     def start(self):
         """启动订单拉取循环"""
@@ -62,6 +100,11 @@ class OrderService:
             raise Exception("币安账号未登录，无法开始自动下单")
         
         self.running = True
+        self.order_executor = ThreadPoolExecutor(
+            max_workers=settings.order_workers, thread_name_prefix="order"
+        )
+        self.reporter = ResultReporter(self.api_client)
+        self.reporter.start()
         self._log("✓ 自动下单已启动")
         self.thread = threading.Thread(target=self._order_loop, daemon=True)
         self.thread.start()
@@ -73,7 +116,16 @@ class OrderService:
         self.running = False
         self._log("自动下单已停止")
         if self.thread:
-            self.thread.join(timeout=5)
+            # 等待拉单循环退出（最长为一次拉单请求的超时时间）；
+            # 超时仍未退出时循环会在下方线程池关闭后放弃提交新订单
+            self.thread.join(timeout=settings.api_connect_timeout + settings.api_read_timeout + 1)
+        # 等待已发出的订单和结果上报完成
+        if self.order_executor:
+            self.order_executor.shutdown(wait=True)
+            self.order_executor = None
+        if self.reporter:
+            self.reporter.stop()
+            self.reporter = None
     
     def _order_loop(self):
         """订单拉取循环"""
@@ -85,26 +137,21 @@ class OrderService:
                     self.running = False
                     break
                 
-                # 拉取订单（不打印日志，避免日志过多）
-                try:
-                    order = self.api_client.pull_order()
-                    
-                    if order and isinstance(order, dict):
-                        order_id = order.get('id', 'N/A')
-                        symbol_name = order.get('symbol_name', 'N/A')
-                        direction = order.get('direction', 'N/A')
-                        self._log(f"✓ 收到订单: ID={order_id}, 交易对={symbol_name}, 方向={direction}")
-                        # 检查订单有效期
-                        if self._is_order_valid(order):
-                            self._log("✓ 订单在有效期内，开始执行下单...")
-                            # 执行下单
-                            self._execute_order(order)
-                        else:
-                            self._log("✗ 订单已过期，跳过")
-                    # 没有订单时不打印日志，减少日志噪音
-                except Exception as e:
-                    # 这个异常会在外层catch中处理
-                    raise
+                # 批量拉取订单（同一触发的10分钟和30分钟订单一次拿到，不打印空结果日志）
+                orders = self.api_client.pull_orders()
+                for order in orders:
+                    order_id = order.get('id', 'N/A')
+                    symbol_name = order.get('symbol_name', 'N/A')
+                    direction = order.get('direction', 'N/A')
+                    self._log(f"✓ 收到订单: ID={order_id}, 交易对={symbol_name}, 方向={direction}")
+                
+                # 本轮拉到的订单提交到下单线程池并行执行，拉取循环不等待下单完成
+                for order in orders:
+                    # 检查订单有效期
+                    if self._is_order_valid(order):
+                        self._submit_order(order)
+                    else:
+                        self._log(f"✗ 订单{order.get('id', 'N/A')}已过期，跳过")
                 
                 # 等待指定间隔（0.1秒）
                 time.sleep(settings.order_pull_interval)
@@ -129,35 +176,49 @@ class OrderService:
     
     def _is_order_valid(self, order: Dict) -> bool:
         """检查订单是否在有效期内"""
-        if not order or not isinstance(order, dict):
-            return False
-        
-        created_at_str = order.get("created_at")
-        if not created_at_str:
-            return False
-        
+        return is_order_valid(order)
+    
+    def _submit_order(self, order: Dict):
+        """提交订单到下单线程池"""
+        order_id = order.get("id")
+        with self.in_flight_lock:
+            if order_id in self.in_flight:
+                return
+            self.in_flight.add(order_id)
+        # 自动下单已停止时线程池可能已关闭或置空，取本地引用后再提交
+        executor = self.order_executor
+        if executor is None or not self.running:
+            with self.in_flight_lock:
+                self.in_flight.discard(order_id)
+            return
+        self._log(f"✓ 订单{order_id}在有效期内，开始执行下单...")
         try:
-            created_at = datetime.fromisoformat(created_at_str.replace('Z', '+00:00'))
-            current_time = datetime.now(created_at.tzinfo) if created_at.tzinfo else datetime.now()
-            elapsed = (current_time - created_at).total_seconds()
-            valid_duration = order.get("valid_duration", 0)
-            
-            return elapsed < valid_duration
-        except:
-            return False
+            executor.submit(self._execute_order, order)
+        except RuntimeError:
+            # 线程池已关闭（自动下单已停止）
+            with self.in_flight_lock:
+                self.in_flight.discard(order_id)
+    
+    def _report_result(self, order_id: int, result: Dict, **kwargs):
+        """结果写入本地日志，由上报器后台批量发送（失败重试，不会丢失；按下单时登录的用户上报）"""
+        reporter = self.reporter
+        if reporter is None:
+            self._log(f"⚠️ 自动下单已停止，订单{order_id}结果未写入本地日志")
+            return
+        try:
+            reporter.enqueue(order_id, result, user_id=self.api_client.user_id, **kwargs)
+        except Exception as e:
+            self._log(f"⚠️ 订单{order_id}结果写入本地日志失败: {e}")
     
     def _execute_order(self, order: Dict):
-        """执行下单"""
+        """执行下单（在下单线程池中运行）"""
         try:
             # 根据订单时间周期设置不同的payoutRatio
             time_increments = order.get("time_increments", "TEN_MINUTE")
-            if time_increments == "THIRTY_MINUTE":
-                payout_ratio = "0.85"  # 30分钟使用0.85
-            else:
-                payout_ratio = "0.80"  # 10分钟使用0.80（默认）
+            payout_ratio = get_payout_ratio(time_increments)
             
-            # 调用币安下单
-            result = self.binance_service.place_order(
+            # 调用币安下单（通过预热的长连接，返回精确的收发时间）
+            result, timing = self.binance_service.place_order(
                 orderAmount=str(int(self.order_amount)),
                 timeIncrements=time_increments,
                 symbolName=order["symbol_name"],
@@ -165,8 +226,14 @@ class OrderService:
                 direction=order["direction"]
             )
             
-            # 记录结果
-            self.api_client.record_order_result(order["id"], result)
+            # 记录结果（写入本地日志即返回，不阻塞下单线程）
+            self._report_result(
+                order["id"],
+                result,
+                latency_ms=timing["total_ms"],
+                amount=self.order_amount,
+                payout_ratio=float(payout_ratio)
+            )
             
             # 下单成功时打印日志（包含时间周期）
             time_increments = order.get('time_increments', 'N/A')
@@ -184,14 +251,14 @@ class OrderService:
             # 记录错误
             error_msg = str(e)
             error_result = {"success": False, "error": error_msg}
-            try:
-                self.api_client.record_order_result(order["id"], error_result)
-            except:
-                pass
+            self._report_result(order["id"], error_result)
             
             # 下单失败时打印日志
             self._log(f"✗ 下单失败: 订单ID={order.get('id', 'N/A')}, 错误={error_msg}")
             
             if self.on_order_callback:
                 self.on_order_callback(order, error_result)
+        finally:
+            with self.in_flight_lock:
+                self.in_flight.discard(order.get("id"))
 
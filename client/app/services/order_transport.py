@@ -0,0 +1,145 @@
+"""
+币安下单连接池
+保持到币安主机的长连接，下单时不再经历DNS、TCP和TLS握手
+"""
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Tuple, Callable
+from ..config import settings
+
+BINANCE_HOST = "https://www.binance.com"
+PLACE_ORDER_URL = f"{BINANCE_HOST}/bapi/futures/v1/private/future/event-contract/place-order"
+# 保温请求只取响应头，不下载页面内容
+WARM_URL = f"{BINANCE_HOST}/"
+
+
+class OrderTransport:
+    """单个币安账号的下单通道（连接池 + 预构建请求头 + 空闲保温）"""
+    
+    def __init__(self, csrftoken: str, p20t: str, log_callback: Optional[Callable] = None):
+        self.log_callback = log_callback
+        self.pool_size = settings.binance_pool_size
+        self.timeout = (settings.binance_connect_timeout, settings.binance_read_timeout)
+        
+        # 账号固定的请求头只构建一次
+        self.headers = {
+            "content-type": "application/json",
+            "clienttype": "web",
+            "csrftoken": csrftoken,
+            "cookie": f"p20t={p20t}"
+        }
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            max_retries=0  # 下单请求不能自动重发，避免重复下单
+        )
+        self.session.mount("https://", adapter)
+        
+        self.last_used = 0.0
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def _log(self, message: str):
+        """输出日志"""
+        if self.log_callback:
+            try:
+                self.log_callback(message)
+            except:
+                print(message)
+        else:
+            print(message)
+    
+    def start(self):
+        """建立连接并启动保温线程"""
+        if self.running:
+            return
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止保温线程并关闭连接（由外部负责保温时未启动线程，只关闭连接）"""
+        if self.running:
+            self.running = False
+            self.stop_event.set()
+            if self.thread:
+                self.thread.join(timeout=5)
+        self.session.close()
+    
+    def warm(self):
+        """并发发出保温请求，让连接池中每条连接都处于已握手状态"""
+        def ping():
+            try:
+                self.session.head(WARM_URL, timeout=self.timeout, allow_redirects=False)
+            except requests.exceptions.RequestException:
+                pass
+        
+        started = time.perf_counter()
+        threads = [threading.Thread(target=ping, daemon=True) for _ in range(self.pool_size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=sum(self.timeout))
+        self.last_used = time.monotonic()
+        return int((time.perf_counter() - started) * 1000)
+    
+    def _keepalive_loop(self):
+        """保温循环：空闲超过间隔就刷新连接，防止被服务器或NAT回收"""
+        try:
+            elapsed_ms = self.warm()
+            self._log(f"✓ 币安下单连接已预热: {self.pool_size}条连接, 耗时{elapsed_ms}ms")
+        except Exception as e:
+            self._log(f"⚠️ 币安下单连接预热失败: {e}")
+        
+        interval = settings.binance_keepalive_seconds
+        while not self.stop_event.wait(1):
+            if time.monotonic() - self.last_used < interval:
+                continue
+            try:
+                self.warm()
+            except Exception as e:
+                self._log(f"⚠️ 币安下单连接保温失败: {e}")
+    
+    def place_order(
+        self,
+        orderAmount: str,
+        timeIncrements: str,
+        symbolName: str,
+        payoutRatio: str,
+        direction: str
+    ) -> Tuple[Dict, Dict]:
+        """
+        下单
+        
+        Returns:
+            (币安返回结果, 耗时信息)
+            耗时信息: sent_at/received_at为本机毫秒时间戳，
+            response_ms为发出请求到收到响应头，total_ms包含读取和解析响应体
+        """
+        data = {
+            "orderAmount": orderAmount,
+            "timeIncrements": timeIncrements,
+            "symbolName": symbolName,
+            "payoutRatio": payoutRatio,
+            "direction": direction
+        }
+        sent_at = int(time.time() * 1000)
+        started = time.perf_counter()
+        response = self.session.post(PLACE_ORDER_URL, headers=self.headers, json=data, timeout=self.timeout)
+        result = response.json()
+        total_ms = int((time.perf_counter() - started) * 1000)
+        self.last_used = time.monotonic()
+        
+        timing = {
+            "sent_at": sent_at,
+            "received_at": sent_at + total_ms,
+            "response_ms": int(response.elapsed.total_seconds() * 1000),
+            "total_ms": total_ms
+        }
+        return result, timing
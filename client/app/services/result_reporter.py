@@ -0,0 +1,204 @@
+"""
+订单结果上报器
+结果先写入本地日志（SQLite WAL），由后台线程批量上报，失败时退避重试，客户端崩溃后重启继续上报
+日志中记录结果所属的用户ID，上报时使用该用户当前的Token（重新登录后旧Token失效，结果仍能上报）
+"""
+import json
+import time
+import sqlite3
+import threading
+import requests
+from typing import Optional, Dict, List, Tuple, Any, Callable
+from ..api_client import APIClient
+from ..config import settings
+
+# 重试退避上限（秒）
+MAX_BACKOFF = 60
+
+
+class ResultReporter:
+    """订单结果上报器"""
+    
+    def __init__(
+        self,
+        api_client: APIClient,
+        journal_file: Optional[str] = None,
+        token_provider: Optional[Callable[[int], Optional[str]]] = None
+    ):
+        """
+        Args:
+            api_client: 服务器API客户端
+            journal_file: 本地日志文件
+            token_provider: 根据用户ID返回该用户当前的Token（未登录返回None），默认使用api_client的当前登录账号
+        """
+        self.api_client = api_client
+        self.batch_size = settings.result_batch_size
+        self.token_provider = token_provider or self._current_token
+        # 被服务器拒绝（401）的Token：同一Token不再重试，等该用户重新登录换了Token再上报
+        self.rejected_tokens: Dict[int, str] = {}
+        
+        # 多个下单线程共用一个连接，写入时加锁
+        self.conn = sqlite3.connect(
+            journal_file or settings.result_journal_file,
+            check_same_thread=False,
+            isolation_level=None  # 自动提交，每条结果写入即持久化
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_results ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER, "
+            "token TEXT, "  # 旧版本日志按Token记录，新结果只记录用户ID
+            "payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pending_results)")]
+        if "user_id" not in columns:
+            self.conn.execute("ALTER TABLE pending_results ADD COLUMN user_id INTEGER")
+        self.lock = threading.Lock()
+        
+        self.backoff = 0
+        self.running = False
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """启动上报线程（先上报上次未完成的结果）"""
+        if self.running:
+            return
+        self.running = True
+        self.wakeup.set()
+        self.thread = threading.Thread(target=self._report_loop, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止上报线程（退出前尝试上报剩余结果，失败的保留在本地日志中）"""
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        with self.lock:
+            self.conn.close()
+    
+    def enqueue(
+        self,
+        order_id: int,
+        result: Dict[str, Any],
+        latency_ms: Optional[int] = None,
+        amount: Optional[float] = None,
+        payout_ratio: Optional[float] = None,
+        user_id: Optional[int] = None
+    ):
+        """写入本地日志后立即返回，不等待上报（user_id为下单账号，必须在写入时确定）"""
+        if user_id is None:
+            raise ValueError("订单结果缺少所属用户ID")
+        payload = json.dumps({
+            "order_id": order_id,
+            "result": result,
+            "latency_ms": latency_ms,
+            "amount": amount,
+            "payout_ratio": payout_ratio,
+        }, ensure_ascii=False)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO pending_results (user_id, payload, created_at) VALUES (?, ?, ?)",
+                (user_id, payload, time.time())
+            )
+        self.wakeup.set()
+    
+    def pending_count(self) -> int:
+        """本地日志中未上报的结果数"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pending_results").fetchone()[0]
+    
+    def _report_loop(self):
+        """上报循环：有新结果时立即上报，失败后按指数退避重试"""
+        while self.running:
+            if self.backoff:
+                # 退避期间新结果只写日志，等退避结束再一起上报
+                deadline = time.monotonic() + self.backoff
+                while self.running and time.monotonic() < deadline:
+                    time.sleep(0.2)
+            else:
+                self.wakeup.wait(timeout=settings.result_flush_interval)
+            self.wakeup.clear()
+            self._flush_once()
+        # 退出前最后上报一次
+        self._flush_once()
+    
+    def _flush_once(self):
+        """上报一轮并更新退避时间"""
+        try:
+            self.flush()
+            self.backoff = 0
+        except Exception as e:
+            self.backoff = min(max(self.backoff * 2, 1), MAX_BACKOFF)
+            print(f"⚠️ 订单结果上报失败，{self.backoff}秒后重试: {e}")
+    
+    def flush(self):
+        """上报本地日志中的所有结果（按用户分组批量发送，成功后删除）"""
+        last_id = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT id, user_id, token, payload FROM pending_results WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            
+            groups: Dict[Tuple[Optional[int], Optional[str]], List[Tuple[int, Dict]]] = {}
+            for row_id, user_id, token, payload in rows:
+                key = (user_id, None) if user_id is not None else (None, token)
+                groups.setdefault(key, []).append((row_id, json.loads(payload)))
+            for (user_id, token), items in groups.items():
+                self._send(user_id, token, items)
+    
+    def _current_token(self, user_id: int) -> Optional[str]:
+        """默认Token来源：api_client当前登录的是该用户时使用其Token"""
+        if self.api_client.token and self.api_client.user_id == user_id:
+            return self.api_client.token
+        return None
+    
+    def _send(self, user_id: Optional[int], legacy_token: Optional[str], items: List[Tuple[int, Dict]]):
+        """发送一批结果"""
+        if user_id is None:
+            # 旧版本日志中的结果只记录了当时的Token
+            token = legacy_token
+            if not token:
+                print(f"[WARN] 丢弃{len(items)}条无法确定所属账号的订单结果")
+                self._delete(items)
+                return
+        else:
+            token = self.token_provider(user_id)
+            if not token or self.rejected_tokens.get(user_id) == token:
+                # 该用户当前未登录或Token已失效，保留到重新登录后上报
+                return
+        
+        try:
+            self.api_client.record_order_results([payload for _, payload in items], token=token)
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code if e.response is not None else None
+            if status_code == 401 and user_id is not None:
+                self.rejected_tokens[user_id] = token
+                print(f"[WARN] 用户{user_id}的Token已失效，{len(items)}条订单结果保留到重新登录后上报")
+                return
+            if status_code not in (401, 422):
+                raise
+            # 数据格式错误（或旧版本日志的Token已失效），服务器不会再接受这批结果
+            print(f"[WARN] 丢弃{len(items)}条无法上报的订单结果: {e}")
+        
+        self._delete(items)
+    
+    def _delete(self, items: List[Tuple[int, Dict]]):
+        """删除已上报（或已丢弃）的结果"""
+        ids = [row_id for row_id, _ in items]
+        with self.lock:
+            self.conn.execute(
+                f"DELETE FROM pending_results WHERE id IN ({','.join('?' * len(ids))})",
+                ids
+            )
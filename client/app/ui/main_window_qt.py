@@ -3,12 +3,14 @@
 """
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QPushButton, QLineEdit, QTextEdit, QMessageBox
+    QLabel, QPushButton, QLineEdit, QPlainTextEdit, QMessageBox
 )
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont, QCloseEvent
 from typing import Callable, Optional
+from collections import deque
 from datetime import datetime, timedelta
+from ..config import settings
 
 
 class MainWindow(QMainWindow):
@@ -47,7 +49,15 @@ class MainWindow(QMainWindow):
         self.timer.timeout.connect(self._update_timers)
         self.timer.start(1000)  # 每秒更新一次
         
+        # 待显示的日志（任意线程写入，deque追加是线程安全的；积压超过保留上限时丢弃最早的）
+        self.pending_logs = deque(maxlen=settings.log_view_max_lines)
+        
         self.init_ui()
+        
+        # 日志合并刷新：每个周期最多重绘一次日志区域
+        self.log_timer = QTimer()
+        self.log_timer.timeout.connect(self._flush_logs)
+        self.log_timer.start(settings.log_view_refresh_ms)
     
     def closeEvent(self, event: QCloseEvent):
         """窗口关闭事件"""
@@ -178,8 +188,10 @@ class MainWindow(QMainWindow):
         log_label = QLabel("日志:")
         layout.addWidget(log_label)
         
-        self.log_area = QTextEdit()
+        self.log_area = QPlainTextEdit()
         self.log_area.setReadOnly(True)
+        # 只保留最近的日志行，长时间运行内存不会持续增长
+        self.log_area.setMaximumBlockCount(settings.log_view_max_lines)
         self.log_area.setFont(QFont("Courier", 10))
         self.log_area.setStyleSheet("background-color: #1e1e1e; color: #d4d4d4;")
         layout.addWidget(self.log_area)
@@ -253,27 +265,20 @@ class MainWindow(QMainWindow):
             safe_print("GUI状态已更新为：未登录")
     
     def log(self, message: str):
-        """添加日志"""
+        """添加日志（只放入缓冲区，由定时器批量显示，可在任意线程调用）"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.pending_logs.append(f"[{timestamp}] {message}")
+    
+    def _flush_logs(self):
+        """把缓冲区中的日志一次性追加到日志区域（在主线程中执行）"""
+        if not self.pending_logs:
+            return
+        lines = []
+        while self.pending_logs:
+            lines.append(self.pending_logs.popleft())
         try:
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            # 安全地处理Unicode字符，避免编码错误
-            try:
-                log_text = f"[{timestamp}] {message}"
-                self.log_area.append(log_text)
-            except UnicodeEncodeError:
-                # 如果编码失败，尝试替换Unicode字符
-                safe_message = message.encode('ascii', 'replace').decode('ascii')
-                log_text = f"[{timestamp}] {safe_message}"
-                self.log_area.append(log_text)
-            except Exception as e:
-                # 如果还是失败，使用最基本的ASCII字符
-                try:
-                    safe_message = str(message).encode('utf-8', errors='replace').decode('utf-8', errors='replace')
-                    log_text = f"[{timestamp}] {safe_message}"
-                    self.log_area.append(log_text)
-                except:
-                    self.log_area.append(f"[{timestamp}] [日志编码错误]")
+            # 多条日志合并为一次追加，只触发一次重排和重绘
+            self.log_area.appendPlainText("\n".join(lines))
             # 自动滚动到底部
             scrollbar = self.log_area.verticalScrollBar()
             scrollbar.setValue(scrollbar.maximum())
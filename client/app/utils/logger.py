@@ -1,8 +1,13 @@
 """
 日志工具模块
+调用方只把日志放入内存队列，由后台线程批量写文件（按大小和日期轮转）
 """
 import os
 import sys
+import time
+import atexit
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
@@ -10,39 +15,43 @@ from pathlib import Path
 LOG_DIR = Path(__file__).parent.parent.parent / "logs"
 LOG_FILE = LOG_DIR / "client.log"
 
+# 单个日志文件上限（字节）、保留的轮转文件数
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+# 后台线程写入间隔（秒）
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.2"))
+# 队列积压超过上限时丢弃DEBUG日志，超过上限的2倍时丢弃所有日志
+LOG_QUEUE_LIMIT = int(os.getenv("LOG_QUEUE_LIMIT", "10000"))
+
 # 确保日志目录存在
 LOG_DIR.mkdir(exist_ok=True)
 
 class FileLogger:
-    """文件日志记录器"""
+    """文件日志记录器（异步批量写入）"""
     
     def __init__(self, log_file=None):
-        self.log_file = log_file or LOG_FILE
+        self.log_file = Path(log_file or LOG_FILE)
         self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # deque的append/popleft是原子操作，调用方不需要加锁
+        self.queue = deque()
+        self.dropped = 0
+        
+        self.file = None
+        self.file_size = 0
+        self.file_date = None
+        
+        self.running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop, name="file-logger", daemon=True)
+        self.writer_thread.start()
     
     def log(self, message, level="INFO"):
-        """记录日志"""
-        try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_message = f"[{timestamp}] [{level}] {message}\n"
-            
-            # 写入文件
-            with open(self.log_file, 'a', encoding='utf-8', errors='replace') as f:
-                f.write(log_message)
-                f.flush()
-            
-            # 同时输出到控制台（如果可用）
-            try:
-                print(log_message.strip())
-            except:
-                pass
-        except Exception as e:
-            # 如果日志写入失败，尝试输出到控制台
-            try:
-                print(f"[日志写入失败] {e}")
-                print(f"[原始消息] {message}")
-            except:
-                pass
+        """记录日志（只入队，不做格式化和磁盘I/O）"""
+        backlog = len(self.queue)
+        if backlog >= LOG_QUEUE_LIMIT and (level == "DEBUG" or backlog >= LOG_QUEUE_LIMIT * 2):
+            self.dropped += 1
+            return
+        self.queue.append((time.time(), level, message))
     
     def debug(self, message):
         """记录调试信息"""
@@ -64,9 +73,99 @@ class FileLogger:
         """记录异常"""
         import traceback
         self.error(f"{message}\n{traceback.format_exc()}")
+    
+    def close(self):
+        """停止后台线程并写完队列中的日志（程序退出时调用）"""
+        if not self.running:
+            return
+        self.running = False
+        self.writer_thread.join(timeout=5)
+        self._drain()
+        if self.file:
+            self.file.close()
+            self.file = None
+    
+    def _writer_loop(self):
+        """后台写入循环"""
+        while self.running:
+            time.sleep(LOG_FLUSH_INTERVAL)
+            self._drain()
+    
+    def _drain(self):
+        """取出队列中的全部日志，一次写入文件并同步输出到控制台"""
+        if not self.queue and not self.dropped:
+            return
+        lines = []
+        while self.queue:
+            created, level, message = self.queue.popleft()
+            timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"[{timestamp}] [{level}] {message}\n")
+        if self.dropped:
+            lines.append(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [WARN] 日志队列积压，已丢弃{self.dropped}条日志\n")
+            self.dropped = 0
+        
+        chunk = "".join(lines)
+        chunk_size = len(chunk.encode("utf-8", errors="replace"))
+        try:
+            self._rotate_if_needed(chunk_size)
+            self.file.write(chunk)
+            self.file.flush()
+            self.file_size += chunk_size
+        except Exception as e:
+            # 如果日志写入失败，尝试输出到控制台
+            try:
+                print(f"[日志写入失败] {e}")
+            except:
+                pass
+        
+        # 同时输出到控制台（如果可用）
+        try:
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+        except:
+            pass
+    
+    def _rotate_if_needed(self, incoming):
+        """打开日志文件；跨天或超过大小上限时轮转"""
+        today = datetime.now().date()
+        if self.file is None:
+            self.file = open(self.log_file, 'a', encoding='utf-8', errors='replace')
+            self.file_size = self.log_file.stat().st_size
+            self.file_date = datetime.fromtimestamp(self.log_file.stat().st_mtime).date() if self.file_size else today
+        
+        if self.file_date == today and self.file_size + incoming <= LOG_MAX_BYTES:
+            return
+        if self.file_size == 0:
+            self.file_date = today
+            return
+        
+        # 当前文件改名为 client-YYYYmmdd-HHMMSS.log，只保留最近的LOG_BACKUP_COUNT个
+        rotated = self.log_file.with_name(f"{self.log_file.stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}{self.log_file.suffix}")
+        self.file.close()
+        try:
+            os.replace(self.log_file, rotated)
+        except OSError as e:
+            # 改名失败（Windows下文件被占用、权限不足等）时继续写当前文件，下次写入再尝试轮转
+            try:
+                print(f"[日志轮转失败] {e}")
+            except:
+                pass
+        else:
+            self.file_size = 0
+            self.file_date = today
+            backups = sorted(self.log_file.parent.glob(f"{self.log_file.stem}-*{self.log_file.suffix}"))
+            for old in backups[:-LOG_BACKUP_COUNT]:
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+        finally:
+            # 无论轮转是否成功都重新打开，避免句柄保持关闭导致之后的日志全部写入失败
+            self.file = open(self.log_file, 'a', encoding='utf-8', errors='replace')
 
-# 全局日志实例
+# 全局日志实例（退出时写完队列中的日志）
 _logger = FileLogger()
+atexit.register(_logger.close)
 
 def log(message, level="INFO"):
     """记录日志（便捷函数）"""
@@ -95,4 +194,3 @@ def exception(message):
 def get_log_file():
     """获取日志文件路径"""
     return str(LOG_FILE)
-
@@ -0,0 +1,30 @@
+"""
+启动耗时统计
+记录从进程启动到登录窗口首次绘制的各阶段耗时，启动完成后写入日志
+"""
+import time
+
+# 以本模块导入时间作为起点（main.py第一行导入）
+_started = time.perf_counter()
+_last = _started
+_phases = []
+
+
+def mark(name):
+    """记录一个阶段结束（耗时从上一个阶段结束时算起）"""
+    global _last
+    now = time.perf_counter()
+    _phases.append((name, (now - _last) * 1000))
+    _last = now
+
+
+def elapsed_ms():
+    """从启动到现在的耗时（毫秒）"""
+    return (time.perf_counter() - _started) * 1000
+
+
+def report():
+    """输出各阶段耗时和总耗时"""
+    from .logger import info
+    detail = ", ".join(f"{name}={ms:.0f}ms" for name, ms in _phases)
+    info(f"启动耗时: 总计{(_last - _started) * 1000:.0f}ms（{detail}）")
@@ -3,6 +3,7 @@ Token管理工具
 """
 import json
 import os
+import threading
 from typing import Optional, Dict
 from datetime import datetime
 from ..config import settings
@@ -11,9 +12,52 @@ from ..config import settings
 class TokenManager:
     """Token管理器"""
     
+    # 登录池多个线程可能同时首次使用密钥，只能生成一次
+    _key_lock = threading.Lock()
+    
     def __init__(self):
         self.token_file = settings.token_file
         self.binance_token_file = settings.binance_token_file
+        self.binance_key_file = settings.binance_key_file
+        self.binance_state_file = settings.binance_state_file
+    
+    def _get_binance_cipher(self):
+        """获取币安Token加密器（密钥首次使用时生成，单独保存且仅当前用户可读）"""
+        from cryptography.fernet import Fernet
+        with self._key_lock:
+            if os.path.exists(self.binance_key_file):
+                with open(self.binance_key_file, "rb") as f:
+                    key = f.read()
+            else:
+                key = Fernet.generate_key()
+                fd = os.open(self.binance_key_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(key)
+        return Fernet(key)
+    
+    def _binance_token_path(self, user_id: Optional[int] = None) -> str:
+        """币安Token缓存路径（按用户区分，不同账号不会读到彼此的币安会话）"""
+        return self._per_user_path(self.binance_token_file, user_id)
+    
+    def _binance_state_path(self, user_id: Optional[int] = None) -> str:
+        """登录池浏览器会话路径（按用户区分）"""
+        return self._per_user_path(self.binance_state_file, user_id)
+    
+    @staticmethod
+    def _per_user_path(path: str, user_id: Optional[int] = None) -> str:
+        """在文件名后追加用户ID"""
+        if user_id is None:
+            return path
+        root, ext = os.path.splitext(path)
+        return f"{root}_{user_id}{ext}"
+    
+    def _write_encrypted(self, path: str, data: Dict):
+        """加密后写入文件（仅当前用户可读，明文不落盘）"""
+        os.makedirs(os.path.dirname(path) if os.path.dirname(path) else ".", exist_ok=True)
+        encrypted = self._get_binance_cipher().encrypt(json.dumps(data).encode("utf-8"))
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(encrypted)
     
     def save_token(self, token: str, user_id: int, username: str, expire_at: str):
         """保存登录Token"""
@@ -58,58 +102,97 @@ class TokenManager:
         if os.path.exists(self.token_file):
             os.remove(self.token_file)
     
-    def save_binance_token(self, csrftoken: str, p20t: str, expirationTimestamp: int):
-        """保存币安Token"""
+    def save_binance_token(self, csrftoken: str, p20t: str, expirationTimestamp: int, user_id: Optional[int] = None):
+        """保存币安Token（加密后写入磁盘，重启后无需重新扫码；过期时间未知时不缓存）"""
         data = {
             "csrftoken": csrftoken,
             "p20t": p20t,
             "expirationTimestamp": expirationTimestamp
         }
+        token_file = self._binance_token_path(user_id)
+        if not expirationTimestamp or expirationTimestamp <= 0:
+            # 过期时间未知时不缓存，否则失效的p20t会在每次启动时被恢复
+            print("[WARN] 币安Token过期时间未知，不缓存到磁盘")
+            self.clear_binance_token(user_id)
+            return
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(self.binance_token_file) if os.path.dirname(self.binance_token_file) else ".", exist_ok=True)
-            with open(self.binance_token_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            try:
-                print(f"[OK] Token已保存到: {self.binance_token_file}")
-            except UnicodeEncodeError:
-                print(f"[OK] Token已保存到: {self.binance_token_file}")
+            self._write_encrypted(token_file, data)
+            print(f"[OK] Token已加密保存到: {token_file}")
         except Exception as e:
-            try:
-                print(f"[ERROR] Token保存失败: {e}")
-            except UnicodeEncodeError:
-                print(f"[ERROR] Token保存失败: {e}")
+            print(f"[ERROR] Token保存失败: {e}")
             import traceback
             traceback.print_exc()
             raise
     
-    def load_binance_token(self) -> Optional[Dict]:
-        """加载币安Token"""
-        if not os.path.exists(self.binance_token_file):
+    def load_binance_token(self, user_id: Optional[int] = None) -> Optional[Dict]:
+        """加载币安Token（已过期或无法解密时删除缓存并返回None）"""
+        token_file = self._binance_token_path(user_id)
+        if not os.path.exists(token_file):
             return None
         
         try:
-            with open(self.binance_token_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # 检查是否过期
-                expirationTimestamp = data.get("expirationTimestamp", -1)
-                if expirationTimestamp > 0:  # 只有当expirationTimestamp > 0时才检查过期
-                    expire_time = datetime.fromtimestamp(expirationTimestamp)
-                    if datetime.now() > expire_time:
-                        print(f"Token已过期: {expire_time}")
-                        return None
-                # expirationTimestamp为-1或0时，认为不过期
-                return data
+            from cryptography.fernet import InvalidToken
+            with open(token_file, "rb") as f:
+                encrypted = f.read()
+            try:
+                data = json.loads(self._get_binance_cipher().decrypt(encrypted))
+            except InvalidToken:
+                # 密钥已更换或文件损坏
+                print("币安Token缓存无法解密，已删除")
+                self.clear_binance_token(user_id)
+                return None
+            # 检查是否过期（过期时间未知的缓存无法判断有效性，按已过期处理）
+            expirationTimestamp = data.get("expirationTimestamp", -1)
+            if not expirationTimestamp or expirationTimestamp <= 0:
+                print("币安Token缓存缺少过期时间，已删除")
+                self.clear_binance_token(user_id)
+                return None
+            expire_time = datetime.fromtimestamp(expirationTimestamp)
+            if datetime.now() > expire_time:
+                print(f"Token已过期: {expire_time}")
+                self.clear_binance_token(user_id)
+                return None
+            return data
         except Exception as e:
             print(f"加载币安Token失败: {e}")
             import traceback
             traceback.print_exc()
             return None
     
-    def clear_binance_token(self):
+    def clear_binance_token(self, user_id: Optional[int] = None):
         """清除币安Token"""
-        if os.path.exists(self.binance_token_file):
-            os.remove(self.binance_token_file)
+        token_file = self._binance_token_path(user_id)
+        if os.path.exists(token_file):
+            os.remove(token_file)
+    
+    def save_binance_state(self, state: Dict, user_id: Optional[int] = None):
+        """保存登录池的浏览器会话（cookie和localStorage），与币安Token使用同一密钥加密"""
+        self._write_encrypted(self._binance_state_path(user_id), state)
+    
+    def load_binance_state(self, user_id: Optional[int] = None) -> Optional[Dict]:
+        """加载浏览器会话（不存在或无法解密时返回None）"""
+        state_file = self._binance_state_path(user_id)
+        if not os.path.exists(state_file):
+            return None
+        try:
+            from cryptography.fernet import InvalidToken
+            with open(state_file, "rb") as f:
+                encrypted = f.read()
+            try:
+                return json.loads(self._get_binance_cipher().decrypt(encrypted))
+            except InvalidToken:
+                print("浏览器会话无法解密，已删除")
+                self.clear_binance_state(user_id)
+                return None
+        except Exception as e:
+            print(f"加载浏览器会话失败: {e}")
+            return None
+    
+    def clear_binance_state(self, user_id: Optional[int] = None):
+        """清除浏览器会话"""
+        state_file = self._binance_state_path(user_id)
+        if os.path.exists(state_file):
+            os.remove(state_file)
     
     def is_session_expired(self) -> bool:
         """检查会话是否过期（24小时）"""
@@ -2,19 +2,20 @@
 管理员API - 订单列表等
 """
 from fastapi import APIRouter, Depends, Query, Header, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-from ..database import get_db
+from ..database import get_async_db
 from ..services.order_service import OrderService
+from ..services.rollup_service import RollupService
 from ..utils.decorators import verify_admin_token, verify_web3_admin
 
 router = APIRouter(prefix="/api/admin", tags=["管理员"])
 
 
-def get_admin_auth(
+async def get_admin_auth(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取管理员认证（必须通过Web3登录验证）"""
     # 必须提供Authorization header
@@ -22,7 +23,7 @@ def get_admin_auth(
         raise HTTPException(status_code=401, detail="请先登录")
     
     # 验证Web3管理员Token（必须登录）
-    return verify_web3_admin(authorization, db)
+    return await verify_web3_admin(authorization, db)
 
 
 class OrderListResponse(BaseModel):
@@ -32,28 +33,26 @@ class OrderListResponse(BaseModel):
 
 
 @router.get("/orders", response_model=OrderListResponse)
-def list_orders(
-    page: int = Query(1, ge=1),
+async def list_orders(
+    cursor: Optional[int] = Query(None, description="上一页返回的next_cursor，首页不传"),
     page_size: int = Query(100, ge=1, le=100),  # 默认100条，最多100条
     admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """订单列表（管理员）"""
-    # 限制最多返回100条
-    limit = min(page_size, 100)
-    skip = (page - 1) * limit
-    orders = OrderService.list_orders(db, skip=skip, limit=limit)
-    total = OrderService.count_orders(db)
+    """订单列表（管理员，按ID倒序的键集分页）"""
+    orders = await OrderService.list_orders(db, cursor=cursor, limit=page_size)
+    total = await OrderService.count_orders(db)
     
-    # 为每个订单添加是否有效的判断
-    from datetime import datetime
+    # 为每个订单添加是否有效的判断（与订单创建时间同样使用交易所时钟）
+    from ..services.exchange_clock import exchange_clock
+    now = exchange_clock.now_datetime()
     order_list = []
     for order in orders:
         order_dict = order.to_dict()
         # 判断订单是否过期（基于创建时间和有效时间）
         created_at = order.created_at
         if created_at:
-            elapsed = (datetime.now() - created_at).total_seconds()
+            elapsed = (now - created_at).total_seconds()
             order_dict["is_valid"] = elapsed < order.valid_duration
         else:
             order_dict["is_valid"] = False
@@ -62,7 +61,100 @@ def list_orders(
     return OrderListResponse(
         data={
             "total": total,
-            "list": order_list
+            "list": order_list,
+            "next_cursor": orders[-1].id if len(orders) == page_size else None
         }
     )
 
+
+@router.get("/assignments", response_model=OrderListResponse)
+async def list_assignments(
+    cursor: Optional[int] = Query(None, description="上一页返回的next_cursor，首页不传"),
+    page_size: int = Query(100, ge=1, le=100),
+    order_id: Optional[int] = Query(None),
+    user_id: Optional[int] = Query(None),
+    admin_auth: str = Depends(get_admin_auth),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """分配记录列表（管理员，按ID倒序的键集分页）"""
+    assignments = await OrderService.list_assignments(
+        db, cursor=cursor, limit=page_size, order_id=order_id, user_id=user_id
+    )
+    # 计数器只有全表总数，带过滤条件时不返回总数
+    filtered = order_id is not None or user_id is not None
+    total = None if filtered else await OrderService.count_assignments(db)
+    
+    return OrderListResponse(
+        data={
+            "total": total,
+            "list": [assignment.to_dict() for assignment in assignments],
+            "next_cursor": assignments[-1].id if len(assignments) == page_size else None
+        }
+    )
+
+
+class OrderStatsResponse(BaseModel):
+    code: int = 200
+    message: str = "success"
+    data: dict
+
+
+@router.get("/orders/stats", response_model=OrderStatsResponse)
+async def order_stats(
+    days: int = Query(30, ge=1, le=366),
+    admin_auth: str = Depends(get_admin_auth),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """订单日汇总（来自汇总表，不扫描明细）"""
+    stats = await OrderService.list_daily_stats(db, days=days)
+    return OrderStatsResponse(
+        data={
+            "list": [row.to_dict() for row in stats]
+        }
+    )
+
+
+@router.get("/orders/results", response_model=OrderStatsResponse)
+async def order_results(
+    dimension: str = Query("minute", pattern="^(minute|user|order)$"),
+    limit: int = Query(60, ge=1, le=1440),
+    admin_auth: str = Depends(get_admin_auth),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """下单成功率和耗时（按分钟/用户/订单汇总，来自增量汇总表）"""
+    if dimension == "minute":
+        rows = await RollupService.list_minutes(db, minutes=limit)
+    elif dimension == "user":
+        rows = await RollupService.list_users(db, limit=limit)
+    else:
+        rows = await RollupService.list_orders(db, limit=limit)
+    return OrderStatsResponse(
+        data={
+            "dimension": dimension,
+            "list": [row.to_dict() for row in rows]
+        }
+    )
+
+
+class MetricsResponse(BaseModel):
+    code: int = 200
+    message: str = "success"
+    data: dict
+
+
+@router.get("/metrics/write-behind", response_model=MetricsResponse)
+async def write_behind_metrics(
+    admin_auth: str = Depends(get_admin_auth)
+):
+    """写后缓冲指标（刷新延迟、积压量）"""
+    from ..services.write_behind import get_write_buffer
+    return MetricsResponse(data=await get_write_buffer().get_metrics())
+
+
+@router.get("/presence", response_model=MetricsResponse)
+async def presence_count(
+    admin_auth: str = Depends(get_admin_auth)
+):
+    """当前在线客户端数量"""
+    from ..services.presence import presence_service
+    return MetricsResponse(data={"online": await presence_service.count_online()})
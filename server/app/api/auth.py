@@ -2,13 +2,14 @@
 认证相关API
 """
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-from ..database import get_db
+from ..database import get_async_db
 from ..services.user_service import UserService
+from ..services.presence import presence_service
 from ..utils.jwt import create_token, verify_token
-from ..redis_client import get_redis
+from ..redis_client import get_async_redis
 from ..config import settings
 from datetime import datetime, timedelta
 
@@ -33,10 +34,10 @@ class VerifyResponse(BaseModel):
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """用户登录"""
     # 验证用户
-    user = UserService.verify_user(db, request.username, request.password)
+    user = await UserService.verify_user(db, request.username, request.password)
     if not user:
         raise HTTPException(status_code=401, detail="用户名或密码错误，或账号已过期")
     
@@ -44,24 +45,24 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
     token = create_token(user.id, user.username)
     
     # 保存Token到Redis（单点登录：使旧token失效）
-    redis_client = get_redis()
+    redis_client = get_async_redis()
     
     # 查找并删除该用户的旧token
     old_token_key = f"user:token:{user.id}"
-    old_token = redis_client.get(old_token_key)
+    old_token = await redis_client.get(old_token_key)
     if old_token:
         # 删除旧的session
-        redis_client.delete(f"session:token:{old_token}")
+        await redis_client.delete(f"session:token:{old_token}")
     
     # 保存新的token
     session_key = f"session:token:{token}"
-    redis_client.setex(
+    await redis_client.setex(
         session_key,
         settings.jwt_expire_hours * 3600,
         str(user.id)
     )
     # 保存用户ID到token的映射（用于单点登录）
-    redis_client.setex(
+    await redis_client.setex(
         old_token_key,
         settings.jwt_expire_hours * 3600,
         token
@@ -81,9 +82,9 @@ def login(request: LoginRequest, db: Session = Depends(get_db)):
 
 
 @router.get("/verify", response_model=VerifyResponse)
-def verify(
+async def verify(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """验证Token"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -99,16 +100,16 @@ def verify(
     user_id = payload.get("user_id")
     
     # 检查Token是否仍然有效（单点登录检查）
-    redis_client = get_redis()
+    redis_client = get_async_redis()
     session_key = f"session:token:{token}"
-    if not redis_client.exists(session_key):
+    if not await redis_client.exists(session_key):
         raise HTTPException(status_code=401, detail="Token已失效（已在其他地方登录）")
     
     # 检查用户是否有效
-    if not UserService.check_user_valid(db, user_id):
+    if not await UserService.check_user_valid(db, user_id):
         raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    user = UserService.get_user_by_id(db, user_id)
+    user = await UserService.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="用户不存在")
     
@@ -126,9 +127,9 @@ class HeartbeatResponse(BaseModel):
 
 
 @router.post("/heartbeat", response_model=HeartbeatResponse)
-def heartbeat(
+async def heartbeat(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """心跳接口（用于判断用户是否在线）"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -144,18 +145,17 @@ def heartbeat(
     user_id = payload.get("user_id")
     
     # 检查Token是否仍然有效（单点登录检查）
-    redis_client = get_redis()
+    redis_client = get_async_redis()
     session_key = f"session:token:{token}"
-    if not redis_client.exists(session_key):
+    if not await redis_client.exists(session_key):
         raise HTTPException(status_code=401, detail="Token已失效（已在其他地方登录）")
     
     # 检查用户是否有效
-    if not UserService.check_user_valid(db, user_id):
+    if not await UserService.check_user_valid(db, user_id):
         raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    # 更新心跳时间（30秒过期，如果30秒内没有心跳则认为离线）
-    heartbeat_key = f"user:heartbeat:{user_id}"
-    redis_client.setex(heartbeat_key, 30, str(datetime.now().timestamp()))
+    # 更新在线时间（30秒内没有心跳则认为离线）
+    await presence_service.touch(user_id)
     
     return HeartbeatResponse()
 
@@ -1,29 +1,24 @@
 """
 斐波拉契扩展位API
 """
-from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-from ..database import get_db
+import json
+import time
 from ..services.fib_service import FibService
-from ..services.price_monitor import PriceMonitor
+from ..services.price_monitor import SNAPSHOT_KEY, SNAPSHOT_CHANNEL
+from ..redis_client import get_async_redis
+from ..database import AsyncSessionLocal
+from ..utils.decorators import verify_web3_admin
 from ..api.admin import get_admin_auth as admin_auth_dep
 
 router = APIRouter(prefix="/api/fib", tags=["斐波拉契"])
 
-# 全局价格监控实例
-_price_monitor: Optional[PriceMonitor] = None
-
-
-def get_price_monitor(db: Session = None) -> PriceMonitor:
-    """获取价格监控实例（单例）"""
-    global _price_monitor
-    if _price_monitor is None:
-        _price_monitor = PriceMonitor()
-        # 启动监控（内部会创建独立的数据库会话）
-        _price_monitor.start_monitoring()
-    return _price_monitor
+# 快照过期说明监控进程未运行
+MONITOR_DOWN = {'error': '行情监控进程未运行'}
 
 
 class SyncFibLevelsRequest(BaseModel):
@@ -46,11 +41,10 @@ class CurrentFibLevelsResponse(BaseModel):
 
 
 @router.post("/sync-levels", response_model=SyncFibLevelsResponse)
-def sync_fib_levels(
+async def sync_fib_levels(
     request: SyncFibLevelsRequest,
     admin_token: Optional[str] = Header(None),
-    authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    authorization: Optional[str] = Header(None)
 ):
     """
     同步斐波拉契扩展位到服务器
@@ -59,13 +53,15 @@ def sync_fib_levels(
     # 验证管理员权限（可选，如果需要的话）
     # admin_auth_dep(admin_token, authorization, db)
     
-    fib_service = FibService()
+    # FibService初始化交易所并使用同步Redis，放到线程池执行
+    def cache_levels() -> bool:
+        return FibService().cache_fib_levels(
+            up_data=request.up_data,
+            down_data=request.down_data
+        )
     
     # 缓存点位
-    success = fib_service.cache_fib_levels(
-        up_data=request.up_data,
-        down_data=request.down_data
-    )
+    success = await run_in_threadpool(cache_levels)
     
     if success:
         return SyncFibLevelsResponse(message="点位已缓存")
@@ -74,37 +70,69 @@ def sync_fib_levels(
 
 
 @router.get("/current-levels", response_model=CurrentFibLevelsResponse)
-def get_current_fib_levels(
-    admin_auth: str = Depends(admin_auth_dep),
-    db: Session = Depends(get_db)
+async def get_current_fib_levels(
+    admin_auth: str = Depends(admin_auth_dep)
 ):
     """
     获取当前缓存的斐波拉契扩展位
-    包含当前价格和RSI
+    包含当前价格和RSI（读取行情监控进程发布的快照，不请求交易所）
     """
-    fib_service = FibService()
-    price_monitor = get_price_monitor(db)
-    
-    # 获取缓存的点位
-    cached_levels = fib_service.get_cached_fib_levels()
-    
-    # 获取当前价格和RSI
-    current_price = price_monitor.get_ethusdt_price()
-    current_rsi = price_monitor.calculate_rsi()
-    
-    # 获取错误信息（如果有）
-    error_info = None
-    if hasattr(price_monitor, 'last_error') and price_monitor.last_error:
-        error_info = price_monitor.last_error
+    snapshot = await get_async_redis().get(SNAPSHOT_KEY)
+    snapshot = json.loads(snapshot) if snapshot else MONITOR_DOWN
     
     data = {
-        'up_data': cached_levels.get('up') if cached_levels else None,
-        'down_data': cached_levels.get('down') if cached_levels else None,
-        'cached_at': cached_levels.get('cached_at') if cached_levels else None,
-        'current_price': current_price,
-        'current_rsi': current_rsi,
-        'error': error_info  # 添加错误信息
+        'up_data': snapshot.get('up_data'),
+        'down_data': snapshot.get('down_data'),
+        'cached_at': snapshot.get('cached_at'),
+        'current_price': snapshot.get('current_price'),
+        'current_rsi': snapshot.get('current_rsi'),
+        'volume_triggered': snapshot.get('volume_triggered'),
+        'error': snapshot.get('error')
     }
     
     return CurrentFibLevelsResponse(data=data)
 
+
+@router.get("/stream")
+async def stream_fib_levels(
+    request: Request,
+    token: str = Query(..., description="管理员Token（EventSource无法设置请求头）")
+):
+    """
+    行情快照推送（SSE）
+    连接后先发送完整快照（event: snapshot），之后只推送变化的字段
+    """
+    # 只在建立连接时使用数据库会话，不在整个推送期间占用连接
+    async with AsyncSessionLocal() as db:
+        await verify_web3_admin(f"Bearer {token}", db)
+    
+    async def event_stream():
+        redis_client = get_async_redis()
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(SNAPSHOT_CHANNEL)
+        try:
+            snapshot = await redis_client.get(SNAPSHOT_KEY)
+            yield f"event: snapshot\ndata: {snapshot or json.dumps(MONITOR_DOWN)}\n\n"
+            last_sent = time.monotonic()
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    yield f"data: {message['data']}\n\n"
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent > 15:
+                    if not await redis_client.exists(SNAPSHOT_KEY):
+                        # 长时间没有变化且快照已过期：监控进程停止
+                        yield f"data: {json.dumps(MONITOR_DOWN)}\n\n"
+                    else:
+                        # 心跳注释，防止代理断开空闲连接
+                        yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            await pubsub.unsubscribe(SNAPSHOT_CHANNEL)
+            await pubsub.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
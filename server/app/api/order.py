@@ -2,13 +2,17 @@
 订单相关API
 """
 from fastapi import APIRouter, Depends, HTTPException, Header
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional
-from ..database import get_db
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import Optional, List
+import asyncio
+from ..config import settings
+from ..database import SessionLocal, get_async_db
 from ..services.order_service import OrderService
 from ..services.user_service import UserService
-from ..utils.decorators import get_current_user_id
+from ..utils.decorators import get_current_user_id, get_token_user_id
+from ..utils.jwt import verify_token
 from ..api.admin import get_admin_auth
 
 router = APIRouter(prefix="/api/orders", tags=["订单"])
@@ -19,6 +23,7 @@ class CreateOrderRequest(BaseModel):
     symbol_name: str
     direction: str
     valid_duration: int
+    idempotency_key: Optional[str] = None  # 重试时传入相同的键，不会重复创建
 
 
 class CreateOrderResponse(BaseModel):
@@ -33,6 +38,17 @@ class PullOrderResponse(BaseModel):
     data: Optional[dict] = None
 
 
+class PullOrdersResponse(BaseModel):
+    code: int = 200
+    message: str = "success"
+    data: dict
+
+
+class PullMultiRequest(BaseModel):
+    # 同一进程托管的各账号Token（超过上限时客户端分批请求）
+    tokens: List[str] = Field(..., min_length=1, max_length=settings.pull_multi_max_tokens)
+
+
 class MarkAssignedRequest(BaseModel):
     order_id: int
 
@@ -45,6 +61,10 @@ class MarkAssignedResponse(BaseModel):
 class RecordResultRequest(BaseModel):
     order_id: int
     result: dict
+    # 取值范围与 order_assignments 列定义一致，超出范围的结果在入队前拒绝（否则整批落库失败）
+    latency_ms: Optional[int] = Field(None, ge=0, le=3_600_000)  # 客户端测得的下单耗时
+    amount: Optional[float] = Field(None, ge=0, le=1_000_000)
+    payout_ratio: Optional[float] = Field(None, ge=0, le=99.99)
 
 
 class RecordResultResponse(BaseModel):
@@ -52,107 +72,227 @@ class RecordResultResponse(BaseModel):
     message: str = "success"
 
 
+class RecordResultsRequest(BaseModel):
+    results: List[RecordResultRequest] = Field(..., min_length=1, max_length=200)
+
+
+class RecordResultsResponse(BaseModel):
+    code: int = 200
+    message: str = "success"
+    data: dict
+
+
+def _create_order_sync(request: CreateOrderRequest) -> Optional[int]:
+    """同步创建订单（与价格监控线程共用同一实现，在线程池中执行）"""
+    db = SessionLocal()
+    try:
+        order = OrderService.create_order(
+            db=db,
+            time_increments=request.time_increments,
+            symbol_name=request.symbol_name.upper(),
+            direction=request.direction,
+            valid_duration=request.valid_duration,
+            idempotency_key=request.idempotency_key
+        )
+        if order is None:
+            if request.idempotency_key is None:
+                # 没有幂等键时返回None只可能是写库违反约束，不是重复提交
+                raise HTTPException(status_code=500, detail="订单创建失败：数据库约束冲突")
+            # 幂等键已使用，返回已创建的订单
+            return OrderService.get_order_id_by_key(db, request.idempotency_key)
+        return order.id
+    finally:
+        db.close()
+
+
 @router.post("/create", response_model=CreateOrderResponse)
-def create_order(
+async def create_order(
     request: CreateOrderRequest,
-    admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    admin_auth: str = Depends(get_admin_auth)
 ):
     """创建订单（管理员）"""
     # 只允许ETHUSDT
     if request.symbol_name.upper() != "ETHUSDT":
         raise HTTPException(status_code=400, detail="只支持ETHUSDT交易对")
     
-    order = OrderService.create_order(
-        db=db,
-        time_increments=request.time_increments,
-        symbol_name=request.symbol_name.upper(),
-        direction=request.direction,
-        valid_duration=request.valid_duration
-    )
+    order_id = await run_in_threadpool(_create_order_sync, request)
+    if order_id is None:
+        raise HTTPException(status_code=409, detail="相同幂等键的订单正在创建中")
     
     return CreateOrderResponse(
         data={
-            "order_id": order.id
+            "order_id": order_id
         }
     )
 
 
 @router.get("/pull", response_model=PullOrderResponse)
-def pull_order(
+async def pull_order(
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """拉取订单（客户端）"""
-    # 获取用户ID
-    user_id = get_current_user_id(authorization)
+    # 获取用户ID（单点登录检查合并到拉单脚本中）
+    token, user_id = get_token_user_id(authorization)
     
-    # 检查用户是否有效
-    if not UserService.check_user_valid(db, user_id):
+    # 检查用户是否有效（进程内缓存）
+    if not await UserService.check_user_valid(db, user_id):
         raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    # 更新心跳（拉取订单时也更新心跳，表示用户活跃）
-    from ..redis_client import get_redis
-    from datetime import datetime
-    redis_client = get_redis()
-    heartbeat_key = f"user:heartbeat:{user_id}"
-    redis_client.setex(heartbeat_key, 30, str(datetime.now().timestamp()))
+    # 拉取订单，同时更新心跳和接单标记（一次Redis往返）
+    session_valid, order = await OrderService.pull_order(db, user_id, token)
+    if not session_valid:
+        raise HTTPException(status_code=401, detail="Token已失效（已在其他地方登录）")
     
-    # 标记用户正在接单（设置Redis key，24小时过期）
-    from ..config import settings
-    ordering_key = f"user:ordering:{user_id}"
-    redis_client.setex(ordering_key, settings.jwt_expire_hours * 3600, "1")
+    return PullOrderResponse(
+        data=order
+    )
+
+
+@router.get("/pull-batch", response_model=PullOrdersResponse)
+async def pull_orders(
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """批量拉取订单（客户端），一次返回所有可执行的订单"""
+    token, user_id = get_token_user_id(authorization)
     
-    # 拉取订单
-    order = OrderService.pull_order(db, user_id)
+    # 检查用户是否有效（进程内缓存）
+    if not await UserService.check_user_valid(db, user_id):
+        raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    if order:
-        return PullOrderResponse(
-            data=order.to_dict()
-        )
-    else:
-        return PullOrderResponse(
-            data=None
-        )
+    # 拉取订单，同时更新心跳和接单标记（一次Redis往返）
+    session_valid, orders = await OrderService.pull_orders(db, user_id, token)
+    if not session_valid:
+        raise HTTPException(status_code=401, detail="Token已失效（已在其他地方登录）")
+    
+    return PullOrdersResponse(
+        data={
+            "orders": orders
+        }
+    )
+
+
+@router.post("/pull-multi", response_model=PullOrdersResponse)
+async def pull_orders_multi(
+    request: PullMultiRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    多账号批量拉取订单（多账号运行时），一次请求拉取所有托管账号的收件箱
+    每个Token单独校验，结果按请求顺序返回，一个账号失效不影响其他账号
+    """
+    accounts: List[Optional[dict]] = [None] * len(request.tokens)
+    pending = []
+    
+    # 有效性检查共用同一个数据库会话，逐个执行（通常命中进程内缓存）
+    for index, token in enumerate(request.tokens):
+        payload = verify_token(token)
+        if not payload:
+            accounts[index] = {"valid": False, "error": "Token无效或已过期", "orders": []}
+            continue
+        user_id = int(payload.get("user_id"))
+        if not await UserService.check_user_valid(db, user_id):
+            accounts[index] = {"user_id": user_id, "valid": False, "expired": True, "error": "账号已过期或已禁用", "orders": []}
+            continue
+        pending.append((index, user_id, token))
+    
+    # 拉单只访问Redis，各账号并发执行
+    results = await asyncio.gather(
+        *(OrderService.pull_orders(db, user_id, token) for _, user_id, token in pending)
+    )
+    for (index, user_id, _), (session_valid, orders) in zip(pending, results):
+        if session_valid:
+            accounts[index] = {"user_id": user_id, "valid": True, "orders": orders}
+        else:
+            accounts[index] = {"user_id": user_id, "valid": False, "error": "Token已失效（已在其他地方登录）", "orders": []}
+    
+    return PullOrdersResponse(
+        data={
+            "accounts": accounts
+        }
+    )
 
 
 @router.post("/mark-assigned", response_model=MarkAssignedResponse)
-def mark_assigned(
+async def mark_assigned(
     request: MarkAssignedRequest,
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """标记订单已拉取"""
-    user_id = get_current_user_id(authorization)
+    user_id = await get_current_user_id(authorization)
     
     # 检查用户是否有效
-    if not UserService.check_user_valid(db, user_id):
+    if not await UserService.check_user_valid(db, user_id):
         raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    OrderService.mark_order_assigned(db, request.order_id, user_id)
+    await OrderService.mark_order_assigned(db, request.order_id, user_id)
     
     return MarkAssignedResponse()
 
 
 @router.post("/record-result", response_model=RecordResultResponse)
-def record_result(
+async def record_result(
     request: RecordResultRequest,
     authorization: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """记录订单执行结果"""
-    user_id = get_current_user_id(authorization)
+    user_id = await get_current_user_id(authorization)
     
     # 检查用户是否有效
-    if not UserService.check_user_valid(db, user_id):
+    if not await UserService.check_user_valid(db, user_id):
         raise HTTPException(status_code=401, detail="账号已过期或已禁用")
     
-    OrderService.record_order_result(
+    stored = await OrderService.record_order_result(
         db,
         request.order_id,
         user_id,
-        request.result
+        request.result,
+        latency_ms=request.latency_ms,
+        amount=request.amount,
+        payout_ratio=request.payout_ratio
     )
+    if not stored:
+        # 缓冲和直接落库都失败，返回5xx让客户端保留结果稍后重试
+        raise HTTPException(status_code=503, detail="订单结果暂时无法保存，请稍后重试")
     
     return RecordResultResponse()
 
+
+@router.post("/record-results", response_model=RecordResultsResponse)
+async def record_results(
+    request: RecordResultsRequest,
+    authorization: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    批量记录订单执行结果（客户端结果上报器使用）
+    结果按(订单, 用户)幂等落库，客户端超时重试时重复提交不会重复计数
+    """
+    user_id = await get_current_user_id(authorization)
+    
+    # 检查用户是否有效
+    if not await UserService.check_user_valid(db, user_id):
+        raise HTTPException(status_code=401, detail="账号已过期或已禁用")
+    
+    for item in request.results:
+        stored = await OrderService.record_order_result(
+            db,
+            item.order_id,
+            user_id,
+            item.result,
+            latency_ms=item.latency_ms,
+            amount=item.amount,
+            payout_ratio=item.payout_ratio
+        )
+        if not stored:
+            # 整批按失败处理：已保存的结果在客户端重试时按(订单, 用户)幂等覆盖
+            raise HTTPException(status_code=503, detail="订单结果暂时无法保存，请稍后重试")
+    
+    return RecordResultsResponse(
+        data={
+            "accepted": len(request.results)
+        }
+    )
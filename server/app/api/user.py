@@ -2,11 +2,11 @@
 用户管理API（管理员）
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
-from ..database import get_db
+from ..database import get_async_db
 from ..services.user_service import UserService
 from ..utils.decorators import verify_admin_token
 from ..api.admin import get_admin_auth
@@ -42,10 +42,10 @@ class UserListResponse(BaseModel):
 
 
 @router.post("/create", response_model=CreateUserResponse)
-def create_user(
+async def create_user(
     request: CreateUserRequest,
     admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建用户"""
     expire_at = None
@@ -56,7 +56,7 @@ def create_user(
             raise HTTPException(status_code=400, detail="日期格式错误")
     
     try:
-        user = UserService.create_user(
+        user = await UserService.create_user(
             db=db,
             username=request.username,
             password=request.password,
@@ -72,11 +72,11 @@ def create_user(
 
 
 @router.put("/{user_id}/expire", response_model=UpdateExpireResponse)
-def update_user_expire(
+async def update_user_expire(
     user_id: int,
     request: UpdateExpireRequest,
     admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新用户有效期"""
     expire_at = None
@@ -86,7 +86,21 @@ def update_user_expire(
         except:
             raise HTTPException(status_code=400, detail="日期格式错误")
     
-    user = UserService.update_user_expire(db, user_id, expire_at)
+    user = await UserService.update_user_expire(db, user_id, expire_at)
+    if not user:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    
+    return UpdateExpireResponse()
+
+
+@router.put("/{user_id}/disable", response_model=UpdateExpireResponse)
+async def disable_user(
+    user_id: int,
+    admin_auth: str = Depends(get_admin_auth),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """禁用用户"""
+    user = await UserService.disable_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
     
@@ -94,21 +108,21 @@ def update_user_expire(
 
 
 @router.get("", response_model=UserListResponse)
-def list_users(
-    page: int = Query(1, ge=1),
+async def list_users(
+    cursor: Optional[int] = Query(None, description="上一页返回的next_cursor，首页不传"),
     page_size: int = Query(20, ge=1, le=100),
     admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """用户列表"""
-    skip = (page - 1) * page_size
-    users = UserService.list_users(db, skip=skip, limit=page_size)
-    total = UserService.count_users(db)
+    """用户列表（按ID正序的键集分页）"""
+    users = await UserService.list_users(db, cursor=cursor, limit=page_size)
+    total = await UserService.count_users(db)
     
     return UserListResponse(
         data={
             "total": total,
-            "list": [user.to_dict() for user in users]
+            "list": [user.to_dict() for user in users],
+            "next_cursor": users[-1].id if len(users) == page_size else None
         }
     )
 
@@ -120,12 +134,12 @@ class UserStatusResponse(BaseModel):
 
 
 @router.get("/status", response_model=UserStatusResponse)
-def get_user_status(
+async def get_user_status(
     admin_auth: str = Depends(get_admin_auth),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """获取用户状态列表（在线/离线、接单/未接单）"""
-    status_data = UserService.get_user_status_list(db)
+    status_data = await UserService.get_user_status_list(db)
     
     return UserStatusResponse(
         data=status_data
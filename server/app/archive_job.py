@@ -0,0 +1,28 @@
+"""
+分区归档任务入口
+每天运行一次：python -m app.archive_job（pm2 cron 见 ecosystem.config.js）
+"""
+import time
+from .database import SessionLocal
+from .services.archive_service import ArchiveService
+
+
+def main():
+    started = time.time()
+    db = SessionLocal()
+    try:
+        result = ArchiveService.run(db)
+        print(f"✓ 新建订单分区: {result['created_partitions'] or '无'}")
+        print(f"✓ 拆分分配记录分区: {result['split_partitions'] or '无'}")
+        print(f"✓ 归档分区: {result['archived_partitions'] or '无'}")
+        print(f"✓ 清理订单幂等键: {result['purged_idempotency_keys']} 条")
+        print(f"✓ 分区维护完成，耗时 {time.time() - started:.1f}秒")
+    except Exception as e:
+        print(f"[ERROR] 分区维护失败: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,12 +15,15 @@ class Settings(BaseSettings):
     mysql_user: str = os.getenv("MYSQL_USER", "root")
     mysql_password: str = os.getenv("MYSQL_PASSWORD", "")
     mysql_database: str = os.getenv("MYSQL_DATABASE", "bnsj")
+    mysql_pool_size: int = int(os.getenv("MYSQL_POOL_SIZE", "20"))
+    mysql_max_overflow: int = int(os.getenv("MYSQL_MAX_OVERFLOW", "20"))
     
     # Redis配置
     redis_host: str = os.getenv("REDIS_HOST", "localhost")
     redis_port: int = int(os.getenv("REDIS_PORT", "6379"))
     redis_password: Optional[str] = os.getenv("REDIS_PASSWORD", "")
     redis_db: int = int(os.getenv("REDIS_DB", "0"))
+    redis_max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "200"))
     
     # JWT配置
     jwt_secret: str = os.getenv("JWT_SECRET", "change-me-to-a-secure-random-string")
@@ -34,6 +37,35 @@ class Settings(BaseSettings):
     port: int = int(os.getenv("PORT", "8000"))
     debug: bool = os.getenv("DEBUG", "False").lower() == "true"
     
+    # 用户有效性缓存（进程内，Redis pub/sub跨进程失效）
+    user_cache_ttl: int = int(os.getenv("USER_CACHE_TTL", "60"))
+    
+    # 用户状态快照刷新间隔（秒）
+    user_status_refresh_seconds: int = int(os.getenv("USER_STATUS_REFRESH_SECONDS", "5"))
+    
+    # 在线状态清理间隔（秒）
+    presence_prune_seconds: int = int(os.getenv("PRESENCE_PRUNE_SECONDS", "5"))
+    
+    # 批量拉单单次请求的Token上限（客户端 PULL_MULTI_MAX_TOKENS 需不大于该值）
+    pull_multi_max_tokens: int = int(os.getenv("PULL_MULTI_MAX_TOKENS", "500"))
+    
+    # 分区归档配置
+    archive_retention_months: int = int(os.getenv("ARCHIVE_RETENTION_MONTHS", "3"))  # 热分区保留月数
+    rollup_lookback_days: int = int(os.getenv("ROLLUP_LOOKBACK_DAYS", "2"))  # 每次重算的日汇总天数
+    
+    # 写后缓冲配置（分配记录/执行结果批量落库）
+    write_behind_flush_ms: int = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+    write_behind_batch_size: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+    write_behind_reclaim_idle_ms: int = int(os.getenv("WRITE_BEHIND_RECLAIM_IDLE_MS", "30000"))
+    # 同一条消息投递超过该次数仍无法落库（数据库正常时）转入死信Stream，不再阻塞后续写入
+    write_behind_max_deliveries: int = int(os.getenv("WRITE_BEHIND_MAX_DELIVERIES", "3"))
+    
+    # 行情监控进程选主租约（秒），主进程退出后备用进程最多在一个租约周期内接管
+    monitor_lease_ttl: int = int(os.getenv("MONITOR_LEASE_TTL", "10"))
+    
+    # 交易所时钟偏移采样间隔（秒）
+    clock_sync_interval: int = int(os.getenv("CLOCK_SYNC_INTERVAL", "30"))
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
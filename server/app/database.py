@@ -2,6 +2,7 @@
 数据库连接管理
 """
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
@@ -16,9 +17,24 @@ engine = create_engine(
     echo=settings.debug
 )
 
-# 创建会话工厂
+# 创建会话工厂（同步，供后台线程使用：价格监控、写后缓冲）
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 创建异步数据库引擎（供API路由使用）
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{settings.mysql_user}:{settings.mysql_password}@{settings.mysql_host}:{settings.mysql_port}/{settings.mysql_database}?charset=utf8mb4"
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    pool_size=settings.mysql_pool_size,
+    max_overflow=settings.mysql_max_overflow,
+    echo=settings.debug
+)
+
+# 创建异步会话工厂（提交后不过期对象，响应序列化时无需再次查询）
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -31,3 +47,9 @@ def get_db():
     finally:
         db.close()
 
+
+
+async def get_async_db():
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -37,22 +37,57 @@ app.include_router(admin.router)
 app.include_router(web3_auth.router)
 app.include_router(fib.router)
 
+
+@app.on_event("startup")
+def start_background_services():
+    """启动后台服务"""
+    from .services.write_behind import get_write_buffer
+    from .services.user_cache import user_validity_cache
+    from .services.user_status import user_status_snapshot
+    from .services.presence import presence_service
+    from .services.exchange_clock import exchange_clock
+    exchange_clock.start()
+    get_write_buffer().start()
+    user_validity_cache.start()
+    presence_service.start()
+    user_status_snapshot.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    """停止后台服务并释放连接池"""
+    from .services.write_behind import get_write_buffer
+    from .services.user_cache import user_validity_cache
+    from .services.user_status import user_status_snapshot
+    from .services.presence import presence_service
+    from .services.exchange_clock import exchange_clock
+    from .database import async_engine
+    from .redis_client import get_async_redis
+    user_status_snapshot.stop()
+    presence_service.stop()
+    user_validity_cache.stop()
+    get_write_buffer().stop()
+    exchange_clock.stop()
+    await async_engine.dispose()
+    await get_async_redis().close()
+
+
 # 静态文件和模板
 templates = Jinja2Templates(directory="app/templates")
 
 
 @app.get("/")
-def root():
+async def root():
     """根路径 - 重定向到登录页面"""
     from fastapi.responses import RedirectResponse
     return RedirectResponse(url="/login")
 
 
 @app.get("/health")
-def health():
+async def health():
     """健康检查"""
-    from .redis_client import check_redis_connection
-    redis_ok = check_redis_connection()
+    from .redis_client import check_async_redis_connection
+    redis_ok = await check_async_redis_connection()
     
     return {
         "status": "ok",
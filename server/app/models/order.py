@@ -1,7 +1,7 @@
 """
 订单模型
 """
-from sqlalchemy import Column, BigInteger, String, Integer, DateTime, ForeignKey, Text, func
+from sqlalchemy import Column, BigInteger, String, Integer, DateTime, Text, Boolean, Numeric, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -17,7 +17,7 @@ class Order(Base):
     valid_duration = Column(Integer, nullable=False, comment="有效时间（秒）")
     status = Column(Integer, default=1, index=True, comment="状态：1-待分配，2-已分配，3-已过期")
     assignment_count = Column(Integer, default=0, comment="分配次数")
-    created_at = Column(DateTime, default=func.now(), index=True, comment="创建时间")
+    created_at = Column(DateTime, default=func.now(), nullable=False, index=True, comment="创建时间（按月分区键）")
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
     
     # 关系（延迟导入避免循环依赖）
@@ -38,20 +38,38 @@ class Order(Base):
         }
 
 
+class OrderIdempotencyKey(Base):
+    """订单幂等键表（订单表按月分区，唯一键必须包含分区键，所以幂等键单独建表）"""
+    __tablename__ = "order_idempotency_keys"
+    
+    idempotency_key = Column(String(128), primary_key=True, comment="幂等键，如 ETHUSDT:SHORT:{触发K线}:fib_1618:TEN_MINUTE")
+    order_id = Column(BigInteger, nullable=False, comment="订单ID")
+    created_at = Column(DateTime, default=func.now(), nullable=False, index=True, comment="创建时间")
+
+
 class OrderAssignment(Base):
     """订单分配记录表"""
     __tablename__ = "order_assignments"
+    __table_args__ = (
+        UniqueConstraint("order_id", "user_id", name="uk_order_user"),  # 写后缓冲依赖此唯一键做 ON DUPLICATE KEY UPDATE
+    )
     
     id = Column(BigInteger, primary_key=True, autoincrement=True, comment="记录ID")
-    order_id = Column(BigInteger, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, comment="订单ID")
-    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, comment="用户ID")
+    # 分区表不支持外键，关联关系只在ORM层声明（见 migrations/partition_orders.sql）
+    order_id = Column(BigInteger, nullable=False, comment="订单ID（按订单ID范围分区）")
+    user_id = Column(BigInteger, nullable=False, index=True, comment="用户ID")
     assigned_at = Column(DateTime, default=func.now(), index=True, comment="分配时间")
     executed_at = Column(DateTime, nullable=True, comment="执行时间")
     execution_result = Column(Text, nullable=True, comment="执行结果（JSON）")
+    success = Column(Boolean, nullable=True, comment="是否下单成功")
+    result_code = Column(String(32), nullable=True, comment="币安返回码")
+    latency_ms = Column(Integer, nullable=True, comment="下单耗时（毫秒）")
+    order_amount = Column(Numeric(12, 2), nullable=True, comment="下单金额")
+    payout_ratio = Column(Numeric(4, 2), nullable=True, comment="赔率")
     
     # 关系（延迟导入避免循环依赖）
-    order = relationship("Order")
-    user = relationship("User")
+    order = relationship("Order", primaryjoin="foreign(OrderAssignment.order_id) == Order.id")
+    user = relationship("User", primaryjoin="foreign(OrderAssignment.user_id) == User.id")
     
     def to_dict(self):
         """转换为字典"""
@@ -62,5 +80,10 @@ class OrderAssignment(Base):
             "assigned_at": self.assigned_at.isoformat() if self.assigned_at else None,
             "executed_at": self.executed_at.isoformat() if self.executed_at else None,
             "execution_result": self.execution_result,
+            "success": self.success,
+            "result_code": self.result_code,
+            "latency_ms": self.latency_ms,
+            "order_amount": float(self.order_amount) if self.order_amount is not None else None,
+            "payout_ratio": float(self.payout_ratio) if self.payout_ratio is not None else None,
         }
 
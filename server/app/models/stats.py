@@ -0,0 +1,107 @@
+"""
+统计汇总模型
+"""
+from sqlalchemy import Column, Date, String, Integer, BigInteger, DateTime, func
+from ..database import Base
+
+
+class OrderStatsDaily(Base):
+    """订单日汇总表（由归档任务增量维护，后台看板只读此表）"""
+    __tablename__ = "order_stats_daily"
+    
+    stat_date = Column(Date, primary_key=True, comment="统计日期")
+    time_increments = Column(String(50), primary_key=True, comment="时间增量")
+    direction = Column(String(10), primary_key=True, comment="方向")
+    order_count = Column(Integer, default=0, nullable=False, comment="订单数")
+    assignment_count = Column(Integer, default=0, nullable=False, comment="分配次数")
+    executed_count = Column(Integer, default=0, nullable=False, comment="已回报执行结果数")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "stat_date": self.stat_date.isoformat() if self.stat_date else None,
+            "time_increments": self.time_increments,
+            "direction": self.direction,
+            "order_count": self.order_count,
+            "assignment_count": self.assignment_count,
+            "executed_count": self.executed_count,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class TableCounter(Base):
+    """表行数计数器（与插入在同一事务中维护，列表接口读取总数时不再COUNT(*)）"""
+    __tablename__ = "table_counters"
+    
+    name = Column(String(50), primary_key=True, comment="计数器名称（表名）")
+    value = Column(BigInteger, default=0, nullable=False, comment="当前行数")
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class OrderResultMinute(Base):
+    """执行结果分钟汇总表（结果落库时增量累加）"""
+    __tablename__ = "order_result_minute"
+    
+    bucket = Column(DateTime, primary_key=True, comment="分钟（执行时间截断到分钟）")
+    result_count = Column(Integer, default=0, nullable=False, comment="结果数")
+    success_count = Column(Integer, default=0, nullable=False, comment="成功数")
+    latency_count = Column(Integer, default=0, nullable=False, comment="带耗时的结果数")
+    latency_sum_ms = Column(BigInteger, default=0, nullable=False, comment="耗时总和（毫秒）")
+    latency_max_ms = Column(Integer, default=0, nullable=False, comment="最大耗时（毫秒）")
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "bucket": self.bucket.isoformat() if self.bucket else None,
+            **_rollup_dict(self),
+        }
+
+
+class OrderResultUser(Base):
+    """执行结果按用户汇总表"""
+    __tablename__ = "order_result_user"
+    
+    user_id = Column(BigInteger, primary_key=True, comment="用户ID")
+    result_count = Column(Integer, default=0, nullable=False, comment="结果数")
+    success_count = Column(Integer, default=0, nullable=False, comment="成功数")
+    latency_count = Column(Integer, default=0, nullable=False, comment="带耗时的结果数")
+    latency_sum_ms = Column(BigInteger, default=0, nullable=False, comment="耗时总和（毫秒）")
+    latency_max_ms = Column(Integer, default=0, nullable=False, comment="最大耗时（毫秒）")
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "user_id": self.user_id,
+            **_rollup_dict(self),
+        }
+
+
+class OrderResultOrder(Base):
+    """执行结果按订单汇总表"""
+    __tablename__ = "order_result_order"
+    
+    order_id = Column(BigInteger, primary_key=True, comment="订单ID")
+    result_count = Column(Integer, default=0, nullable=False, comment="结果数")
+    success_count = Column(Integer, default=0, nullable=False, comment="成功数")
+    latency_count = Column(Integer, default=0, nullable=False, comment="带耗时的结果数")
+    latency_sum_ms = Column(BigInteger, default=0, nullable=False, comment="耗时总和（毫秒）")
+    latency_max_ms = Column(Integer, default=0, nullable=False, comment="最大耗时（毫秒）")
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            "order_id": self.order_id,
+            **_rollup_dict(self),
+        }
+
+
+def _rollup_dict(row) -> dict:
+    """汇总行的通用字段（含成功率和平均耗时）"""
+    return {
+        "result_count": row.result_count,
+        "success_count": row.success_count,
+        "success_rate": round(row.success_count / row.result_count, 4) if row.result_count else None,
+        "avg_latency_ms": round(row.latency_sum_ms / row.latency_count, 1) if row.latency_count else None,
+        "max_latency_ms": row.latency_max_ms if row.latency_count else None,
+    }
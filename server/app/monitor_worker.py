@@ -0,0 +1,49 @@
+"""
+行情监控进程入口
+python -m app.monitor_worker（pm2 见 ecosystem.config.js，可部署多份互为备用）
+通过Redis租约选主，集群中只有一个进程运行价格监控；API进程只读取Redis中发布的状态
+"""
+import signal
+import time
+from .config import settings
+from .services.leader_lease import LeaderLease
+from .services.price_monitor import PriceMonitor
+
+LEASE_NAME = "price-monitor"
+
+
+def main():
+    lease = LeaderLease(LEASE_NAME, settings.monitor_lease_ttl)
+    monitor = PriceMonitor()
+    # 续约间隔为租约的三分之一，偶发一次续约失败不会丢失主身份
+    renew_interval = max(settings.monitor_lease_ttl / 3, 1)
+    stopping = False
+    
+    def handle_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    print(f"✓ 行情监控进程已启动: {lease.owner}（租约: {settings.monitor_lease_ttl}秒）")
+    try:
+        while not stopping:
+            if lease.acquire_or_renew():
+                if not monitor.is_running:
+                    print(f"✓ 成为主进程，启动价格监控: {lease.owner}")
+                    monitor.start_monitoring()
+            elif monitor.is_running:
+                # 失去租约（续约超时或Redis故障），立即停止；订单幂等键兜底新旧主短暂重叠
+                print(f"[WARN] 失去主身份，停止价格监控: {lease.owner}")
+                monitor.stop_monitoring()
+            time.sleep(renew_interval)
+    finally:
+        if monitor.is_running:
+            monitor.stop_monitoring()
+        lease.release()
+        print("✓ 行情监控进程已退出")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@
 Redis客户端
 """
 import redis
+import redis.asyncio as aioredis
 from typing import Optional
 from .config import settings
 
-# 创建Redis连接
+# 创建Redis连接（同步，供后台线程使用）
 redis_client = redis.Redis(
     host=settings.redis_host,
     port=settings.redis_port,
@@ -16,12 +17,32 @@ redis_client = redis.Redis(
     socket_timeout=5
 )
 
+# 创建异步Redis连接（供API路由使用，连接池满时等待而不是报错）
+async_redis_client = aioredis.Redis(
+    connection_pool=aioredis.BlockingConnectionPool(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password if settings.redis_password else None,
+        db=settings.redis_db,
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        max_connections=settings.redis_max_connections,
+        timeout=5
+    )
+)
+
 
 def get_redis() -> redis.Redis:
     """获取Redis客户端"""
     return redis_client
 
 
+def get_async_redis() -> aioredis.Redis:
+    """获取异步Redis客户端"""
+    return async_redis_client
+
+
 def check_redis_connection() -> bool:
     """检查Redis连接"""
     try:
@@ -30,3 +51,11 @@ def check_redis_connection() -> bool:
     except Exception:
         return False
 
+
+async def check_async_redis_connection() -> bool:
+    """检查异步Redis连接"""
+    try:
+        await async_redis_client.ping()
+        return True
+    except Exception:
+        return False
@@ -1,7 +1,8 @@
 """
 管理员服务
 """
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import Optional, List
 from ..models.admin import Admin
 
@@ -10,43 +11,44 @@ class AdminService:
     """管理员服务类"""
     
     @staticmethod
-    def is_admin(db: Session, address: str) -> bool:
+    async def is_admin(db: AsyncSession, address: str) -> bool:
         """检查地址是否为管理员"""
-        admin = db.query(Admin).filter(Admin.address == address.lower()).first()
+        admin = await AdminService.get_admin_by_address(db, address)
         return admin is not None
     
     @staticmethod
-    def add_admin(db: Session, address: str) -> Admin:
+    async def add_admin(db: AsyncSession, address: str) -> Admin:
         """添加管理员"""
         address = address.lower()
         # 检查是否已存在
-        existing = db.query(Admin).filter(Admin.address == address).first()
+        existing = await AdminService.get_admin_by_address(db, address)
         if existing:
             return existing
         
         admin = Admin(address=address)
         db.add(admin)
-        db.commit()
-        db.refresh(admin)
+        await db.commit()
+        await db.refresh(admin)
         return admin
     
     @staticmethod
-    def remove_admin(db: Session, address: str) -> bool:
+    async def remove_admin(db: AsyncSession, address: str) -> bool:
         """移除管理员"""
-        admin = db.query(Admin).filter(Admin.address == address.lower()).first()
+        admin = await AdminService.get_admin_by_address(db, address)
         if admin:
-            db.delete(admin)
-            db.commit()
+            await db.delete(admin)
+            await db.commit()
             return True
         return False
     
     @staticmethod
-    def list_admins(db: Session) -> List[Admin]:
+    async def list_admins(db: AsyncSession) -> List[Admin]:
         """获取所有管理员"""
-        return db.query(Admin).all()
+        result = await db.execute(select(Admin))
+        return list(result.scalars().all())
     
     @staticmethod
-    def get_admin_by_address(db: Session, address: str) -> Optional[Admin]:
+    async def get_admin_by_address(db: AsyncSession, address: str) -> Optional[Admin]:
         """根据地址获取管理员"""
-        return db.query(Admin).filter(Admin.address == address.lower()).first()
-
+        result = await db.execute(select(Admin).where(Admin.address == address.lower()))
+        return result.scalars().first()
@@ -0,0 +1,218 @@
+"""
+分区归档服务
+维护 orders / order_assignments 的月度分区：预建未来月份、拆分已结束月份、
+刷新日汇总表、把超过保留期的分区搬到压缩归档表后删除
+"""
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..config import settings
+from .counter_service import CounterService
+from . import counter_service as counters
+
+# TO_DAYS(date) = date.toordinal() + 365
+TO_DAYS_OFFSET = 365
+
+# 已扣减计数器的分区标记（table_counters中的一行），分区删除后清理
+ARCHIVE_MARKER_PREFIX = "archived:"
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"p{month.strftime('%Y%m')}"
+
+
+class ArchiveService:
+    """分区归档服务类"""
+
+    @staticmethod
+    def list_partitions(db: Session, table: str) -> List[Tuple[str, str]]:
+        """按顺序列出表分区 (名称, 上界描述)"""
+        rows = db.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": table}).all()
+        return [(row[0], row[1]) for row in rows]
+
+    @staticmethod
+    def _partitioned(db: Session, table: str) -> bool:
+        """表是否已分区（未执行 partition_orders.sql 的安装跳过分区维护）"""
+        if ArchiveService.list_partitions(db, table):
+            return True
+        print(f"[WARN] `{table}` 表未分区，跳过分区维护（见 migrations/partition_orders.sql）")
+        return False
+
+    @staticmethod
+    def _orders_partition_bounds(db: Session) -> List[Tuple[str, date]]:
+        """订单表分区及其上界日期（不含pmax）"""
+        bounds = []
+        for name, description in ArchiveService.list_partitions(db, "orders"):
+            if description == "MAXVALUE":
+                continue
+            bounds.append((name, date.fromordinal(int(description) - TO_DAYS_OFFSET)))
+        return bounds
+
+    @staticmethod
+    def ensure_future_partitions(db: Session, today: date, months_ahead: int = 2) -> List[str]:
+        """预建未来月份的订单分区（pmax为空时REORGANIZE只改元数据）"""
+        if not ArchiveService._partitioned(db, "orders"):
+            return []
+        existing = ArchiveService._orders_partition_bounds(db)
+        last_bound = existing[-1][1] if existing else _month_start(today)
+        target = _add_months(_month_start(today), months_ahead + 1)
+
+        created = []
+        while last_bound < target:
+            next_bound = _add_months(last_bound, 1)
+            name = _partition_name(last_bound)
+            db.execute(text(
+                f"ALTER TABLE `orders` REORGANIZE PARTITION `pmax` INTO ("
+                f"PARTITION `{name}` VALUES LESS THAN (TO_DAYS('{next_bound.isoformat()}')), "
+                f"PARTITION `pmax` VALUES LESS THAN MAXVALUE)"
+            ))
+            created.append(name)
+            last_bound = next_bound
+        return created
+
+    @staticmethod
+    def split_assignment_partitions(db: Session, today: date) -> List[str]:
+        """
+        按订单表已结束的月份拆分分配记录表
+        分界为下个月第一个订单ID（没有则取当前最大订单ID+1），分区名与订单表一致
+        """
+        if not ArchiveService._partitioned(db, "orders") or not ArchiveService._partitioned(db, "order_assignments"):
+            return []
+        assignment_partitions = {name for name, _ in ArchiveService.list_partitions(db, "order_assignments")}
+        created = []
+        for name, upper_bound in ArchiveService._orders_partition_bounds(db):
+            if upper_bound > today or name in assignment_partitions:
+                continue
+            boundary = db.execute(text(
+                "SELECT MIN(id) FROM orders WHERE created_at >= :upper_bound"
+            ), {"upper_bound": upper_bound}).scalar()
+            if boundary is None:
+                boundary = (db.execute(text("SELECT MAX(id) FROM orders")).scalar() or 0) + 1
+            db.execute(text(
+                f"ALTER TABLE `order_assignments` REORGANIZE PARTITION `pmax` INTO ("
+                f"PARTITION `{name}` VALUES LESS THAN ({int(boundary)}), "
+                f"PARTITION `pmax` VALUES LESS THAN MAXVALUE)"
+            ))
+            created.append(name)
+        return created
+
+    @staticmethod
+    def refresh_daily_stats(db: Session, start: date, end: date):
+        """重算 [start, end) 区间的日汇总（只扫描对应的热分区）"""
+        params = {"start": start, "end": end}
+        db.execute(text(
+            "INSERT INTO order_stats_daily "
+            "(stat_date, time_increments, direction, order_count, assignment_count, executed_count) "
+            "SELECT DATE(o.created_at), o.time_increments, o.direction, "
+            "       COUNT(*), COALESCE(SUM(o.assignment_count), 0), 0 "
+            "FROM orders o "
+            "WHERE o.created_at >= :start AND o.created_at < :end "
+            "GROUP BY DATE(o.created_at), o.time_increments, o.direction "
+            "ON DUPLICATE KEY UPDATE order_count = VALUES(order_count), "
+            "                        assignment_count = VALUES(assignment_count)"
+        ), params)
+        db.execute(text(
+            "UPDATE order_stats_daily s "
+            "JOIN ("
+            "    SELECT DATE(o.created_at) AS stat_date, o.time_increments, o.direction, COUNT(*) AS executed "
+            "    FROM orders o JOIN order_assignments oa ON oa.order_id = o.id "
+            "    WHERE o.created_at >= :start AND o.created_at < :end AND oa.executed_at IS NOT NULL "
+            "    GROUP BY DATE(o.created_at), o.time_increments, o.direction"
+            ") e ON e.stat_date = s.stat_date AND e.time_increments = s.time_increments AND e.direction = s.direction "
+            "SET s.executed_count = e.executed"
+        ), params)
+        db.commit()
+
+    @staticmethod
+    def archive_old_partitions(db: Session, today: date, retention_months: int) -> List[str]:
+        """把超过保留期的月分区复制到归档表后删除（两张表分区名一致）"""
+        if not ArchiveService._partitioned(db, "orders") or not ArchiveService._partitioned(db, "order_assignments"):
+            return []
+        cutoff = _add_months(_month_start(today), -retention_months)
+        assignment_partitions = {name for name, _ in ArchiveService.list_partitions(db, "order_assignments")}
+
+        previous_bound = None
+        archived = []
+        for name, upper_bound in ArchiveService._orders_partition_bounds(db):
+            lower_bound = previous_bound
+            previous_bound = upper_bound
+            if upper_bound > cutoff:
+                break
+            if name not in assignment_partitions:
+                # 分配记录还未拆分，等下次运行
+                break
+
+            # 删除前确保汇总表已覆盖该分区的所有日期
+            if lower_bound is None:
+                lower_bound = db.execute(text(
+                    f"SELECT DATE(MIN(created_at)) FROM orders PARTITION (`{name}`)"
+                )).scalar() or upper_bound
+            ArchiveService.refresh_daily_stats(db, lower_bound, upper_bound)
+
+            # INSERT IGNORE 保证任务中断后重跑幂等
+            db.execute(text(f"INSERT IGNORE INTO orders_archive SELECT * FROM orders PARTITION (`{name}`)"))
+            db.execute(text(
+                f"INSERT IGNORE INTO order_assignments_archive SELECT * FROM order_assignments PARTITION (`{name}`)"
+            ))
+            # 计数器只统计在线表，与删除分区前的复制一起提交；DROP PARTITION 单独自动提交，
+            # 同一事务写入归档标记，任务在提交后、删除分区前中断时重跑不会再次扣减
+            marker = f"{ARCHIVE_MARKER_PREFIX}{name}"
+            already_counted = db.execute(text(
+                "SELECT value FROM table_counters WHERE name = :name FOR UPDATE"
+            ), {"name": marker}).scalar()
+            if not already_counted:
+                for table in (counters.ORDERS, counters.ORDER_ASSIGNMENTS):
+                    archived_rows = db.execute(text(f"SELECT COUNT(*) FROM `{table}` PARTITION (`{name}`)")).scalar()
+                    CounterService.increment(db, table, -archived_rows)
+                CounterService.increment(db, marker, 1)
+            db.commit()
+            db.execute(text(f"ALTER TABLE `order_assignments` DROP PARTITION `{name}`"))
+            db.execute(text(f"ALTER TABLE `orders` DROP PARTITION `{name}`"))
+            db.execute(text("DELETE FROM table_counters WHERE name = :name"), {"name": marker})
+            db.commit()
+            archived.append(name)
+        return archived
+
+    @staticmethod
+    def purge_idempotency_keys(db: Session, today: date, retention_months: int) -> int:
+        """删除超过保留期的订单幂等键（对应订单已归档）"""
+        cutoff = _add_months(_month_start(today), -retention_months)
+        result = db.execute(text(
+            "DELETE FROM order_idempotency_keys WHERE created_at < :cutoff"
+        ), {"cutoff": cutoff})
+        db.commit()
+        return result.rowcount
+
+    @staticmethod
+    def run(db: Session, today: date = None) -> dict:
+        """执行一次完整的分区维护"""
+        today = today or datetime.now().date()
+        created = ArchiveService.ensure_future_partitions(db, today)
+        split = ArchiveService.split_assignment_partitions(db, today)
+        ArchiveService.refresh_daily_stats(
+            db,
+            today - timedelta(days=settings.rollup_lookback_days),
+            today + timedelta(days=1)
+        )
+        archived = ArchiveService.archive_old_partitions(db, today, settings.archive_retention_months)
+        purged_keys = ArchiveService.purge_idempotency_keys(db, today, settings.archive_retention_months)
+        return {
+            "created_partitions": created,
+            "split_partitions": split,
+            "archived_partitions": archived,
+            "purged_idempotency_keys": purged_keys,
+        }
@@ -0,0 +1,39 @@
+"""
+计数器服务
+orders / users / order_assignments 的总行数在插入时同事务累加，列表接口直接读取
+"""
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models.stats import TableCounter
+
+ORDERS = "orders"
+USERS = "users"
+ORDER_ASSIGNMENTS = "order_assignments"
+
+_INCREMENT_SQL = text(
+    "INSERT INTO table_counters (name, value) VALUES (:name, :delta) "
+    "ON DUPLICATE KEY UPDATE value = value + VALUES(value)"
+)
+
+
+class CounterService:
+    """计数器服务类（只执行语句，由调用方在同一事务中提交）"""
+    
+    @staticmethod
+    def increment(db: Session, name: str, delta: int = 1):
+        """累加计数（同步会话）"""
+        if delta:
+            db.execute(_INCREMENT_SQL, {"name": name, "delta": delta})
+    
+    @staticmethod
+    async def increment_async(db: AsyncSession, name: str, delta: int = 1):
+        """累加计数（异步会话）"""
+        if delta:
+            await db.execute(_INCREMENT_SQL, {"name": name, "delta": delta})
+    
+    @staticmethod
+    async def get(db: AsyncSession, name: str) -> int:
+        """读取计数"""
+        result = await db.execute(select(TableCounter.value).where(TableCounter.name == name))
+        return result.scalar() or 0
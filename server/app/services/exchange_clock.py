@@ -0,0 +1,120 @@
+"""
+交易所时钟
+主监控进程定期采样币安服务器时间，按往返时延(RTT)补偿后平滑得到本机与交易所的时钟偏移，
+写入Redis供其他进程读取；K线收盘计时、订单创建/过期时间都使用校正后的时钟
+"""
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Tuple
+from ..config import settings
+from ..redis_client import get_redis
+
+OFFSET_KEY = "clock:exchange_offset"
+OFFSET_TTL = 600
+
+# 新样本的平滑权重
+SMOOTHING = 0.2
+
+
+class ExchangeClock:
+    """交易所时钟类"""
+    
+    def __init__(self, interval: int = None):
+        self.interval = interval if interval is not None else settings.clock_sync_interval
+        self.offset = 0.0  # 交易所时间 - 本机时间（秒）
+        self.synced = False
+        self.best_rtt = None
+        self.last_sample = 0.0
+        self.is_running = False
+        self.follower_thread = None
+    
+    def now(self) -> float:
+        """校正后的当前时间戳（秒）"""
+        return time.time() + self.offset
+    
+    def now_ms(self) -> int:
+        """校正后的当前时间戳（毫秒，与K线时间戳同单位）"""
+        return int(self.now() * 1000)
+    
+    def now_datetime(self) -> datetime:
+        """校正后的当前本地时间"""
+        return datetime.fromtimestamp(self.now())
+    
+    # ---------- 采样（主监控进程） ----------
+    
+    @staticmethod
+    def sample(exchange) -> Tuple[float, float]:
+        """采样一次，返回 (偏移, RTT)；假设请求和响应各占一半RTT，误差不超过RTT/2"""
+        started = time.time()
+        server_ms = exchange.fetch_time()
+        finished = time.time()
+        rtt = finished - started
+        return server_ms / 1000 - (started + rtt / 2), rtt
+    
+    def maybe_sync(self, exchange):
+        """距上次采样超过间隔时采样并发布（在监控循环中调用）"""
+        if time.monotonic() - self.last_sample < self.interval:
+            return
+        self.last_sample = time.monotonic()
+        
+        try:
+            offset, rtt = self.sample(exchange)
+        except Exception as e:
+            print(f"[WARN] 采样交易所时间失败: {e}")
+            return
+        
+        # RTT明显大于历史最小值的样本误差大，丢弃；同时放宽基准，避免网络变差后一直丢弃
+        if self.best_rtt is None or rtt < self.best_rtt:
+            self.best_rtt = rtt
+        elif rtt > self.best_rtt * 2 + 0.05:
+            self.best_rtt *= 1.2
+            return
+        
+        if self.synced:
+            self.offset += SMOOTHING * (offset - self.offset)
+        else:
+            self.offset = offset
+            self.synced = True
+            print(f"✓ 交易所时钟已同步: 偏移 {self.offset * 1000:.0f}ms（RTT {rtt * 1000:.0f}ms）")
+        
+        try:
+            get_redis().setex(OFFSET_KEY, OFFSET_TTL, json.dumps({
+                "offset": self.offset,
+                "rtt": rtt,
+                "updated_at": datetime.now().isoformat(),
+            }))
+        except Exception as e:
+            print(f"[WARN] 发布时钟偏移失败: {e}")
+    
+    # ---------- 跟随（API进程，从Redis读取偏移） ----------
+    
+    def start(self):
+        """启动后台线程定期读取主监控进程发布的偏移"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.follower_thread = threading.Thread(target=self._follow_loop, daemon=True)
+        self.follower_thread.start()
+    
+    def stop(self):
+        """停止后台线程"""
+        self.is_running = False
+        if self.follower_thread:
+            self.follower_thread.join(timeout=5)
+    
+    def _follow_loop(self):
+        while self.is_running:
+            try:
+                cached = get_redis().get(OFFSET_KEY)
+                if cached:
+                    self.offset = json.loads(cached)["offset"]
+                    self.synced = True
+            except Exception as e:
+                print(f"读取时钟偏移失败: {e}")
+            time.sleep(self.interval)
+
+
+# 全局时钟实例
+exchange_clock = ExchangeClock()
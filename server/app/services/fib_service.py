@@ -10,6 +10,8 @@ from typing import Optional, Dict
 import json
 from ..redis_client import get_redis
 
+FIB_CACHE_KEY = 'fib:ethusdt:30min'
+
 
 class FibService:
     """斐波拉契服务类"""
@@ -237,21 +239,28 @@ class FibService:
             print(f"单向扩展计算失败({trend}): {e}")
             return None
     
-    def cache_fib_levels(self, up_data: Optional[Dict], down_data: Optional[Dict]) -> bool:
+    def cache_fib_levels(
+        self,
+        up_data: Optional[Dict],
+        down_data: Optional[Dict],
+        trigger_candle: Optional[int] = None
+    ) -> bool:
         """
         缓存斐波拉契扩展位到Redis
         up_data: 上升方向的扩展位数据
         down_data: 下降方向的扩展位数据
+        trigger_candle: 触发量能的K线时间戳（用于生成订单幂等键）
         """
         try:
             cache_data = {
                 'up': up_data,
                 'down': down_data,
+                'trigger_candle': trigger_candle,
                 'cached_at': datetime.now().isoformat()
             }
             
             # 缓存到Redis，24小时过期
-            key = 'fib:ethusdt:30min'
+            key = FIB_CACHE_KEY
             self.redis_client.setex(key, 86400, json.dumps(cache_data, default=str))
             
             return True
@@ -262,7 +271,7 @@ class FibService:
     def get_cached_fib_levels(self) -> Optional[Dict]:
         """获取缓存的斐波拉契扩展位"""
         try:
-            key = 'fib:ethusdt:30min'
+            key = FIB_CACHE_KEY
             cached = self.redis_client.get(key)
             if cached:
                 return json.loads(cached)
@@ -274,7 +283,7 @@ class FibService:
     def clear_fib_cache(self) -> bool:
         """清空斐波拉契缓存"""
         try:
-            key = 'fib:ethusdt:30min'
+            key = FIB_CACHE_KEY
             self.redis_client.delete(key)
             return True
         except Exception as e:
@@ -0,0 +1,63 @@
+"""
+Redis租约选主
+SET NX PX 抢占租约，持有者定期续约；续约和释放都校验持有者，避免误删其他进程的租约
+"""
+import os
+import socket
+import uuid
+from ..redis_client import get_redis
+
+# 只有持有者才能续约
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 只有持有者才能释放
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderLease:
+    """租约选主类"""
+    
+    def __init__(self, name: str, ttl: int):
+        self.key = f"leader:{name}"
+        self.ttl_ms = ttl * 1000
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.redis_client = get_redis()
+        self._renew = self.redis_client.register_script(RENEW_SCRIPT)
+        self._release = self.redis_client.register_script(RELEASE_SCRIPT)
+        self.is_leader = False
+    
+    def acquire_or_renew(self) -> bool:
+        """已是主则续约，否则尝试抢占；返回当前是否为主"""
+        try:
+            if self.is_leader and self._renew(keys=[self.key], args=[self.owner, self.ttl_ms]):
+                return True
+            self.is_leader = bool(self.redis_client.set(self.key, self.owner, nx=True, px=self.ttl_ms))
+        except Exception as e:
+            # Redis不可用时无法确认租约，按失去主身份处理
+            print(f"[WARN] 租约续约失败: {e}")
+            self.is_leader = False
+        return self.is_leader
+    
+    def release(self):
+        """主动释放租约（正常退出时让备用进程立即接管）"""
+        if not self.is_leader:
+            return
+        try:
+            self._release(keys=[self.key], args=[self.owner])
+        except Exception as e:
+            print(f"[WARN] 释放租约失败: {e}")
+        self.is_leader = False
+    
+    def current_owner(self):
+        """当前租约持有者"""
+        return self.redis_client.get(self.key)
@@ -2,13 +2,62 @@
 订单服务
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, text, select
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
-from typing import Optional, List
-from ..models.order import Order, OrderAssignment
+from typing import Optional, List, Tuple
+from ..models.order import Order, OrderAssignment, OrderIdempotencyKey
 from ..models.user import User
-from ..redis_client import get_redis
+from ..models.stats import OrderStatsDaily
+from ..redis_client import get_redis, get_async_redis
+from ..config import settings
+from .write_behind import get_write_buffer
+from .counter_service import CounterService
+from .exchange_clock import exchange_clock
+from .presence import PresenceService, ONLINE_ZSET, ORDERING_ZSET, EVENTS_CHANNEL, HEARTBEAT_TIMEOUT
+from . import counter_service as counters
 import json
+import math
+
+# 拉单脚本：会话不存在返回-1；否则记录在线/接单时间（之前不在线时发布上线事件），
+# 并取出收件箱（ARGV[3]=1全部取出，否则弹出一个）
+PULL_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local previous = redis.call('ZSCORE', KEYS[2], ARGV[4])
+redis.call('ZADD', KEYS[2], ARGV[1], ARGV[4])
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[4])
+if (not previous) or tonumber(previous) < tonumber(ARGV[1]) - tonumber(ARGV[2]) then
+    redis.call('PUBLISH', KEYS[5], cjson.encode({event='online', user_id=tonumber(ARGV[4]), ts=tonumber(ARGV[1])}))
+end
+if ARGV[3] == '1' then
+    local ids = redis.call('LRANGE', KEYS[4], 0, -1)
+    if #ids > 0 then
+        redis.call('DEL', KEYS[4])
+    end
+    return ids
+end
+local id = redis.call('LPOP', KEYS[4])
+if id then
+    return {id}
+end
+return {}
+"""
+
+_pull_script = None
+
+# 幂等键在Redis中的保留时间（数据库唯一键长期兜底）
+IDEMPOTENCY_TTL = 86400
+
+
+def _get_pull_script():
+    """获取已注册的拉单脚本（EVALSHA，脚本缓存丢失时自动回退EVAL）"""
+    global _pull_script
+    if _pull_script is None:
+        _pull_script = get_async_redis().register_script(PULL_SCRIPT)
+    return _pull_script
 
 
 class OrderService:
@@ -20,10 +69,31 @@ class OrderService:
         time_increments: str,
         symbol_name: str,
         direction: str,
-        valid_duration: int
-    ) -> Order:
-        """创建订单"""
+        valid_duration: int,
+        idempotency_key: Optional[str] = None
+    ) -> Optional[Order]:
+        """
+        创建订单，并投递到所有可接单用户的收件箱（同步，价格监控线程直接调用）
+        传入幂等键时先在Redis中 SET NX 抢占，再与订单同事务写入幂等键表（唯一键兜底），
+        同一幂等键已创建过订单时返回None
+        """
+        redis_client = get_redis()
+        if idempotency_key:
+            lock_key = f"order:idem:{idempotency_key}"
+            if not redis_client.set(lock_key, "1", nx=True, ex=IDEMPOTENCY_TTL):
+                return None
+        
+        # 订单创建时间和过期判断都使用校正后的交易所时钟
+        now = exchange_clock.now_datetime()
+        
+        # 顺带把没有任何用户接收的过期订单标记为已过期
+        db.query(Order).filter(
+            Order.status == 1,
+            func.timestampdiff(text("SECOND"), Order.created_at, now) >= Order.valid_duration
+        ).update({Order.status: 3}, synchronize_session=False)
+        
         order = Order(
+            created_at=now,
             time_increments=time_increments,
             symbol_name=symbol_name,
             direction=direction,
@@ -31,11 +101,25 @@ class OrderService:
             status=1  # 待分配
         )
         db.add(order)
-        db.commit()
+        try:
+            if idempotency_key:
+                db.flush()
+                db.add(OrderIdempotencyKey(idempotency_key=idempotency_key, order_id=order.id))
+            CounterService.increment(db, counters.ORDERS)
+            db.commit()
+        except IntegrityError:
+            # Redis键丢失（过期或重启）时由数据库唯一键拦截重复订单
+            db.rollback()
+            return None
+        except Exception:
+            db.rollback()
+            if idempotency_key:
+                # 创建失败时释放幂等键，允许重试
+                redis_client.delete(lock_key)
+            raise
         db.refresh(order)
         
         # 缓存订单信息到Redis
-        redis_client = get_redis()
         order_key = f"order:cache:{order.id}"
         redis_client.setex(
             order_key,
@@ -43,127 +127,242 @@ class OrderService:
             json.dumps(order.to_dict(), default=str)
         )
         
+        # 投递到用户收件箱（扇出成本在创建时支付一次）
+        delivered = OrderService._deliver_to_inboxes(db, order)
+        print(f"订单{order.id}已投递到 {delivered} 个用户收件箱")
+        
         return order
     
     @staticmethod
-    def pull_order(db: Session, user_id: int) -> Optional[Order]:
-        """拉取订单（带去重逻辑）"""
+    def _deliver_to_inboxes(db: Session, order: Order) -> int:
+        """计算可接单用户（在线、接单中、有效），把订单ID推入各自的收件箱"""
         redis_client = get_redis()
+        now = exchange_clock.now_datetime()
         
-        # 1. 查询待分配的订单
-        pending_orders = db.query(Order).filter(Order.status == 1).order_by(Order.created_at).all()
+        # 在线且接单中：从在线状态有序集合取出
+        accepting_ids = PresenceService.get_accepting_ids()
+        if not accepting_ids:
+            return 0
         
-        if not pending_orders:
-            return None
+        # 有效用户：状态正常且未到期
+        eligible = [
+            user_id for (user_id,) in db.query(User.id).filter(
+                User.id.in_(accepting_ids),
+                User.status == 1,
+                or_(User.expire_at.is_(None), User.expire_at > now)
+            ).all()
+        ]
+        if not eligible:
+            return 0
         
-        # 2. 过滤已过期的订单
-        current_time = datetime.now()
+        # 收件箱TTL为订单剩余有效期（与拉单时的有效期判断使用同一时钟），过期后自动清理
+        remaining = order.valid_duration
+        if order.created_at:
+            remaining -= (now - order.created_at).total_seconds()
+        ttl = max(1, math.ceil(remaining))
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in eligible:
+            inbox_key = f"order:inbox:{user_id}"
+            pipe.rpush(inbox_key, order.id)
+            pipe.expire(inbox_key, ttl)
+        pipe.execute()
+        
+        return len(eligible)
+    
+    @staticmethod
+    async def _load_valid_orders(order_ids: List[str], current_time: datetime) -> List[dict]:
+        """从订单缓存加载订单，过滤已过期的"""
+        if not order_ids:
+            return []
+        
+        redis_client = get_async_redis()
         valid_orders = []
-        for order in pending_orders:
-            elapsed = (current_time - order.created_at).total_seconds()
-            if elapsed < order.valid_duration:
+        for cached in await redis_client.mget([f"order:cache:{order_id}" for order_id in order_ids]):
+            if not cached:
+                continue
+            order = json.loads(cached)
+            created_at = datetime.fromisoformat(order["created_at"])
+            if (current_time - created_at).total_seconds() < order["valid_duration"]:
                 valid_orders.append(order)
-            else:
-                # 标记为已过期
-                order.status = 3
-                db.commit()
-        
-        if not valid_orders:
+        return valid_orders
+    
+    @staticmethod
+    async def _record_assignments(orders: List[dict], user_id: int, current_time: datetime):
+        """分配记录交给写后缓冲批量落库（分配次数和状态在落库时更新）"""
+        write_buffer = get_write_buffer()
+        for order in orders:
+            await write_buffer.enqueue_assignment(order["id"], user_id, current_time)
+    
+    @staticmethod
+    async def _pull_inbox(user_id: int, token: str, pop_all: bool) -> Optional[List[str]]:
+        """
+        一次Redis往返完成拉单的所有读写：单点登录检查、在线/接单时间、取出收件箱
+        返回None表示会话已失效
+        """
+        result = await _get_pull_script()(
+            keys=[
+                f"session:token:{token}",
+                ONLINE_ZSET,
+                ORDERING_ZSET,
+                f"order:inbox:{user_id}",
+                EVENTS_CHANNEL,
+            ],
+            args=[
+                exchange_clock.now(),  # 与心跳、在线清理使用同一时钟
+                HEARTBEAT_TIMEOUT,
+                1 if pop_all else 0,
+                user_id,
+            ]
+        )
+        if result == -1:
             return None
+        return result
+    
+    @staticmethod
+    async def pull_order(db: AsyncSession, user_id: int, token: str) -> Tuple[bool, Optional[dict]]:
+        """
+        拉取订单：从用户收件箱弹出下一个有效订单
+        返回 (会话是否有效, 订单)
+        """
+        current_time = exchange_clock.now_datetime()
+        order_ids = await OrderService._pull_inbox(user_id, token, pop_all=False)
+        if order_ids is None:
+            return False, None
+        
+        redis_client = get_async_redis()
+        inbox_key = f"order:inbox:{user_id}"
+        while order_ids:
+            orders = await OrderService._load_valid_orders(order_ids, current_time)
+            if orders:
+                await OrderService._record_assignments(orders, user_id, current_time)
+                return True, orders[0]
+            # 弹出的订单已过期，继续取下一个
+            order_id = await redis_client.lpop(inbox_key)
+            order_ids = [order_id] if order_id is not None else []
+        return True, None
+    
+    @staticmethod
+    async def pull_orders(db: AsyncSession, user_id: int, token: str) -> Tuple[bool, List[dict]]:
+        """
+        批量拉取订单：一次取走用户收件箱中的所有有效订单
+        返回 (会话是否有效, 订单列表)
+        """
+        current_time = exchange_clock.now_datetime()
+        order_ids = await OrderService._pull_inbox(user_id, token, pop_all=True)
+        if order_ids is None:
+            return False, []
         
-        # 3. 检查用户是否已拉取（Redis去重）
-        for order in valid_orders:
-            key = f"order:assigned:{order.id}:{user_id}"
-            if not redis_client.exists(key):
-                # 4. 标记为已拉取（该用户已拉取此订单）
-                redis_client.setex(key, order.valid_duration + 3600, "1")
-                
-                # 5. 记录到数据库
-                assignment = OrderAssignment(
-                    order_id=order.id,
-                    user_id=user_id,
-                    assigned_at=current_time
-                )
-                db.add(assignment)
-                
-                # 6. 增加分配次数（每个用户拉取一次，分配次数+1）
-                order.assignment_count = (order.assignment_count or 0) + 1
-                # 如果有分配记录，状态改为已分配
-                if order.assignment_count > 0:
-                    order.status = 2
-                db.commit()
-                
-                return order
-        
-        return None
-    
-    @staticmethod
-    def mark_order_assigned(db: Session, order_id: int, user_id: int) -> bool:
+        orders = await OrderService._load_valid_orders(order_ids, current_time)
+        await OrderService._record_assignments(orders, user_id, current_time)
+        return True, orders
+    
+    @staticmethod
+    async def mark_order_assigned(db: AsyncSession, order_id: int, user_id: int) -> bool:
         """标记订单已分配（用于客户端确认）"""
-        redis_client = get_redis()
+        redis_client = get_async_redis()
         key = f"order:assigned:{order_id}:{user_id}"
         
-        # 检查是否已存在分配记录
-        assignment = db.query(OrderAssignment).filter(
-            and_(
-                OrderAssignment.order_id == order_id,
-                OrderAssignment.user_id == user_id
-            )
-        ).first()
-        
-        if not assignment:
-            # 创建分配记录
-            assignment = OrderAssignment(
-                order_id=order_id,
-                user_id=user_id,
-                assigned_at=datetime.now()
-            )
-            db.add(assignment)
-            db.commit()
+        # 分配记录幂等写入（已存在时 ON DUPLICATE KEY 保留原记录）
+        await get_write_buffer().enqueue_assignment(order_id, user_id, exchange_clock.now_datetime())
         
         # 确保Redis中有记录
-        if not redis_client.exists(key):
-            order = db.query(Order).filter(Order.id == order_id).first()
+        if not await redis_client.exists(key):
+            order = await OrderService.get_order_by_id(db, order_id)
             if order:
-                redis_client.setex(key, order.valid_duration + 3600, "1")
+                await redis_client.setex(key, order.valid_duration + 3600, "1")
         
         return True
     
     @staticmethod
-    def record_order_result(
-        db: Session,
+    def parse_execution_result(
+        result: dict,
+        latency_ms: Optional[int] = None,
+        amount: Optional[float] = None,
+        payout_ratio: Optional[float] = None
+    ) -> dict:
+        """从币安返回结果中提取结构化字段（成功标志与客户端判断一致）"""
+        code = result.get("code")
+        return {
+            "success": bool(result.get("success") or code == 200),
+            "result_code": str(code)[:32] if code is not None else None,
+            "latency_ms": int(latency_ms) if latency_ms is not None else None,
+            "order_amount": amount,
+            "payout_ratio": payout_ratio,
+        }
+    
+    @staticmethod
+    async def record_order_result(
+        db: AsyncSession,
         order_id: int,
         user_id: int,
-        result: dict
+        result: dict,
+        latency_ms: Optional[int] = None,
+        amount: Optional[float] = None,
+        payout_ratio: Optional[float] = None
     ) -> bool:
-        """记录订单执行结果"""
-        assignment = db.query(OrderAssignment).filter(
-            and_(
-                OrderAssignment.order_id == order_id,
-                OrderAssignment.user_id == user_id
-            )
+        """记录订单执行结果（写后缓冲批量落库）"""
+        outcome = OrderService.parse_execution_result(result, latency_ms, amount, payout_ratio)
+        return await get_write_buffer().enqueue_result(order_id, user_id, result, outcome, exchange_clock.now_datetime())
+    
+    @staticmethod
+    def get_order_id_by_key(db: Session, idempotency_key: str) -> Optional[int]:
+        """根据幂等键查询已创建的订单ID"""
+        row = db.query(OrderIdempotencyKey.order_id).filter(
+            OrderIdempotencyKey.idempotency_key == idempotency_key
         ).first()
-        
-        if assignment:
-            assignment.executed_at = datetime.now()
-            assignment.execution_result = json.dumps(result, ensure_ascii=False)
-            db.commit()
-            return True
-        
-        return False
+        return row[0] if row else None
     
     @staticmethod
-    def get_order_by_id(db: Session, order_id: int) -> Optional[Order]:
+    async def get_order_by_id(db: AsyncSession, order_id: int) -> Optional[Order]:
         """根据ID获取订单"""
-        return db.query(Order).filter(Order.id == order_id).first()
+        result = await db.execute(select(Order).where(Order.id == order_id))
+        return result.scalars().first()
     
     @staticmethod
-    def list_orders(db: Session, skip: int = 0, limit: int = 100) -> List[Order]:
-        """获取订单列表"""
-        return db.query(Order).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    async def list_orders(db: AsyncSession, cursor: Optional[int] = None, limit: int = 100) -> List[Order]:
+        """获取订单列表（按ID倒序的键集分页，cursor为上一页最后一条的ID）"""
+        stmt = select(Order)
+        if cursor is not None:
+            stmt = stmt.where(Order.id < cursor)
+        result = await db.execute(stmt.order_by(Order.id.desc()).limit(limit))
+        return list(result.scalars().all())
     
     @staticmethod
-    def count_orders(db: Session) -> int:
-        """获取订单总数"""
-        return db.query(Order).count()
-
+    async def count_orders(db: AsyncSession) -> int:
+        """获取订单总数（读取计数器）"""
+        return await CounterService.get(db, counters.ORDERS)
+    
+    @staticmethod
+    async def list_assignments(
+        db: AsyncSession,
+        cursor: Optional[int] = None,
+        limit: int = 100,
+        order_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> List[OrderAssignment]:
+        """获取分配记录列表（按ID倒序的键集分页，可按订单/用户过滤）"""
+        stmt = select(OrderAssignment)
+        if order_id is not None:
+            stmt = stmt.where(OrderAssignment.order_id == order_id)
+        if user_id is not None:
+            stmt = stmt.where(OrderAssignment.user_id == user_id)
+        if cursor is not None:
+            stmt = stmt.where(OrderAssignment.id < cursor)
+        result = await db.execute(stmt.order_by(OrderAssignment.id.desc()).limit(limit))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def count_assignments(db: AsyncSession) -> int:
+        """获取分配记录总数（读取计数器）"""
+        return await CounterService.get(db, counters.ORDER_ASSIGNMENTS)
+    
+    @staticmethod
+    async def list_daily_stats(db: AsyncSession, days: int = 30) -> List[OrderStatsDaily]:
+        """获取最近N天的订单日汇总（只读汇总表）"""
+        start = datetime.now().date() - timedelta(days=days - 1)
+        result = await db.execute(
+            select(OrderStatsDaily)
+            .where(OrderStatsDaily.stat_date >= start)
+            .order_by(OrderStatsDaily.stat_date.desc())
+        )
+        return list(result.scalars().all())
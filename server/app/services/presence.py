@@ -0,0 +1,126 @@
+"""
+在线状态服务
+心跳和拉单时 ZADD presence:online <ts> <uid>，后台线程定期 ZREMRANGEBYSCORE 清理超时成员，
+在线人数直接 ZCARD；用户上线/离线时向 presence:events 发布事件
+"""
+import time
+import threading
+from typing import List, Set, Tuple
+from ..config import settings
+from ..redis_client import get_redis, get_async_redis
+from .exchange_clock import exchange_clock
+
+ONLINE_ZSET = "presence:online"
+ORDERING_ZSET = "presence:ordering"
+EVENTS_CHANNEL = "presence:events"
+
+# 心跳30秒内视为在线
+HEARTBEAT_TIMEOUT = 30
+
+# 心跳脚本：写入最后活跃时间，之前不在线（不存在或已超时）时发布上线事件
+TOUCH_SCRIPT = """
+local previous = redis.call('ZSCORE', KEYS[1], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+if (not previous) or tonumber(previous) < tonumber(ARGV[1]) - tonumber(ARGV[3]) then
+    redis.call('PUBLISH', KEYS[2], cjson.encode({event='online', user_id=tonumber(ARGV[2]), ts=tonumber(ARGV[1])}))
+end
+return 1
+"""
+
+# 清理脚本：原子地取出并删除超时成员（多个worker同时清理时离线事件只发布一次）
+PRUNE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+    for _, user_id in ipairs(expired) do
+        redis.call('PUBLISH', KEYS[3], cjson.encode({event='offline', user_id=tonumber(user_id), ts=tonumber(ARGV[3])}))
+    end
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[2])
+return expired
+"""
+
+
+class PresenceService:
+    """在线状态服务类"""
+    
+    def __init__(self, interval: int = None):
+        self.interval = interval if interval is not None else settings.presence_prune_seconds
+        self.is_running = False
+        self.prune_thread = None
+        self._touch_script = None
+        self._prune_script = None
+    
+    @staticmethod
+    def _ordering_window() -> int:
+        """接单标记与会话同寿命"""
+        return settings.jwt_expire_hours * 3600
+    
+    async def touch(self, user_id: int):
+        """记录心跳"""
+        if self._touch_script is None:
+            self._touch_script = get_async_redis().register_script(TOUCH_SCRIPT)
+        await self._touch_script(
+            keys=[ONLINE_ZSET, EVENTS_CHANNEL],
+            args=[exchange_clock.now(), user_id, HEARTBEAT_TIMEOUT]
+        )
+    
+    async def count_online(self) -> int:
+        """在线人数（已清理的有序集合，O(1)）"""
+        return await get_async_redis().zcard(ONLINE_ZSET)
+    
+    @staticmethod
+    def get_active_ids() -> Tuple[Set[int], Set[int]]:
+        """返回 (在线用户ID, 接单中用户ID)，各一次ZRANGEBYSCORE（同步，后台线程使用）"""
+        now = exchange_clock.now()
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrangebyscore(ONLINE_ZSET, now - HEARTBEAT_TIMEOUT, "+inf")
+        pipe.zrangebyscore(ORDERING_ZSET, now - PresenceService._ordering_window(), "+inf")
+        online, ordering = pipe.execute()
+        return {int(user_id) for user_id in online}, {int(user_id) for user_id in ordering}
+    
+    @staticmethod
+    def get_accepting_ids() -> Set[int]:
+        """在线且接单中的用户ID"""
+        online, ordering = PresenceService.get_active_ids()
+        return online & ordering
+    
+    def prune(self) -> List[int]:
+        """清理超时成员，返回本次判定离线的用户ID"""
+        if self._prune_script is None:
+            self._prune_script = get_redis().register_script(PRUNE_SCRIPT)
+        now = exchange_clock.now()
+        expired = self._prune_script(
+            keys=[ONLINE_ZSET, ORDERING_ZSET, EVENTS_CHANNEL],
+            args=[now - HEARTBEAT_TIMEOUT, now - self._ordering_window(), now]
+        )
+        return [int(user_id) for user_id in expired]
+    
+    def start(self):
+        """启动后台清理线程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.prune_thread = threading.Thread(target=self._prune_loop, daemon=True)
+        self.prune_thread.start()
+        print(f"✓ 在线状态服务已启动（清理间隔: {self.interval}秒）")
+    
+    def stop(self):
+        """停止后台清理线程"""
+        self.is_running = False
+        if self.prune_thread:
+            self.prune_thread.join(timeout=5)
+    
+    def _prune_loop(self):
+        while self.is_running:
+            try:
+                expired = self.prune()
+                if expired:
+                    print(f"用户离线: {expired}")
+            except Exception as e:
+                print(f"清理在线状态失败: {e}")
+            time.sleep(self.interval)
+
+
+# 全局在线状态实例
+presence_service = PresenceService()
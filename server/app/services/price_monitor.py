@@ -6,18 +6,31 @@
 import ccxt
 import pandas as pd
 import numpy as np
+import json
 import time
 import threading
+from datetime import datetime
 from typing import Optional
 from ..services.fib_service import FibService
 from ..services.order_service import OrderService
 from ..database import SessionLocal
+from ..redis_client import get_redis
+from .exchange_clock import exchange_clock
 from sqlalchemy.orm import Session
 
+# 监控进程每次循环发布的行情快照（API进程只读），监控停止后自动过期
+SNAPSHOT_KEY = "monitor:snapshot"
+SNAPSHOT_TTL = 10
+# 快照变化的字段推送到此频道（SSE转发给后台看板）
+SNAPSHOT_CHANNEL = "monitor:snapshot:diff"
+
 
 class PriceMonitor:
     """价格监控服务类"""
     
+    # 订单幂等键中的策略标识
+    STRATEGY = "fib_1618"
+    
     def __init__(self):
         # 初始化币安合约交易所
         exchange_config = {
@@ -43,6 +56,7 @@ class PriceMonitor:
         self.price_tolerance = 0.01  # 价格容差（避免频繁触发）
         self.lock = threading.Lock()  # 防止重复生成订单
         self.last_error = None  # 记录最后一次错误
+        self.last_snapshot = {}  # 上次发布的行情快照（用于计算变化字段）
         
         # 量能触发相关（与2.py保持一致）
         self.volume_threshold = 45000  # 量能阈值：45k
@@ -214,38 +228,43 @@ class PriceMonitor:
         """
         等待触发量能的K线完成
         trigger_candle_timestamp: 触发时的K线时间戳
+        按校正后的交易所时钟计算收盘时间，收盘前不请求交易所，收盘后再用REST确认新K线已开始
+        监控停止（失去主身份）时立即返回False
         """
         try:
             print(f"⏳ 等待K线完成 (时间戳: {trigger_candle_timestamp})...")
             
+            close_ms = trigger_candle_timestamp + 60 * 1000  # 1分钟K线
             wait_start = time.time()
             max_wait = 70  # 最多等待70秒
             
             while time.time() - wait_start < max_wait:
-                # 获取最新的K线数据
-                current_data = self.get_realtime_volume()
+                if not self.is_running:
+                    print(f"\n⚠️ 监控已停止，放弃等待K线完成")
+                    return False
                 
-                if current_data:
-                    current_timestamp = current_data['timestamp']
-                    
-                    # 如果当前K线的时间戳已经不同于触发时的时间戳
-                    # 说明新的K线已经开始，触发的K线已经完成
-                    if current_timestamp > trigger_candle_timestamp:
-                        print(f"\n✅ K线已完成！新K线时间戳: {current_timestamp}")
-                        # 额外等待2秒确保数据同步
-                        time.sleep(2)
-                        return True
-                    
-                    # 计算还需等待的时间
-                    from datetime import datetime
-                    current_time = datetime.now()
-                    seconds_in_minute = current_time.second
-                    remaining = 60 - seconds_in_minute
-                    
+                remaining_ms = close_ms - exchange_clock.now_ms()
+                if remaining_ms > 0:
                     # 显示倒计时
-                    print(f"\r⏰ 等待K线完成: 约{remaining}秒", end="", flush=True)
+                    print(f"\r⏰ 等待K线完成: 约{remaining_ms / 1000:.0f}秒", end="", flush=True)
+                    
+                    # 等待期间继续发布快照（价格沿用上次的值），看板不会误判监控停止
+                    self._publish_snapshot(
+                        self.last_snapshot.get('current_price'),
+                        self.last_snapshot.get('current_rsi')
+                    )
+                    time.sleep(min(1.0, remaining_ms / 1000))
+                    continue
                 
-                time.sleep(1)
+                # 已到收盘时间，确认交易所已开始新K线
+                current_data = self.get_realtime_volume()
+                if current_data and current_data['timestamp'] > trigger_candle_timestamp:
+                    print(f"\n✅ K线已完成！新K线时间戳: {current_data['timestamp']}")
+                    # 额外等待2秒确保数据同步
+                    time.sleep(2)
+                    return True
+                
+                time.sleep(0.5)
             
             print(f"\n⚠️ 等待超时，继续执行...")
             return True
@@ -363,7 +382,7 @@ class PriceMonitor:
                     self.check_short_price_condition(current_price)):
                     print(f"触发空单条件: 价格={current_price:.2f}, 上升点位={up_level:.2f}, RSI={rsi_value:.2f}")
                     # 创建10分钟和30分钟空单
-                    self._create_orders(db, 'SHORT', current_price, rsi_value)
+                    self._create_orders(db, 'SHORT', current_price, rsi_value, cached_levels)
                     # 清空缓存
                     self.fib_service.clear_fib_cache()
                     return True
@@ -377,7 +396,7 @@ class PriceMonitor:
                     self.check_long_price_condition(current_price)):
                     print(f"触发多单条件: 价格={current_price:.2f}, 下降点位={down_level:.2f}, RSI={rsi_value:.2f}")
                     # 创建10分钟和30分钟多单
-                    self._create_orders(db, 'LONG', current_price, rsi_value)
+                    self._create_orders(db, 'LONG', current_price, rsi_value, cached_levels)
                     # 清空缓存
                     self.fib_service.clear_fib_cache()
                     return True
@@ -388,34 +407,34 @@ class PriceMonitor:
             print(f"检查订单条件失败: {e}")
             return False
     
-    def _create_orders(self, db: Session, direction: str, price: float, rsi: float):
-        """创建订单（10分钟和30分钟）"""
+    def _create_orders(self, db: Session, direction: str, price: float, rsi: float, cached_levels: dict):
+        """
+        创建订单（10分钟和30分钟）
+        只有持有选主租约的进程运行价格监控；订单仍以 (交易对, 方向, 触发K线, 策略, 时间周期) 为幂等键，
+        租约切换期间新旧主进程对同一次触发重复创建时只有一个能成功
+        """
         try:
-            # 使用锁防止重复生成
+            # 使用锁防止本进程内重复生成
             if not self.lock.acquire(blocking=False):
                 print("订单生成中，跳过本次检查")
                 return
             
             try:
-                # 创建10分钟订单
-                order_10min = OrderService.create_order(
-                    db=db,
-                    time_increments='TEN_MINUTE',
-                    symbol_name='ETHUSDT',
-                    direction=direction,
-                    valid_duration=5  # 订单有效期：5秒
-                )
-                print(f"✓ 创建10分钟订单: ID={order_10min.id}, 方向={direction}, 价格={price:.2f}, RSI={rsi:.2f}, 有效期=5秒")
-                
-                # 创建30分钟订单
-                order_30min = OrderService.create_order(
-                    db=db,
-                    time_increments='THIRTY_MINUTE',
-                    symbol_name='ETHUSDT',
-                    direction=direction,
-                    valid_duration=5  # 订单有效期：5秒
-                )
-                print(f"✓ 创建30分钟订单: ID={order_30min.id}, 方向={direction}, 价格={price:.2f}, RSI={rsi:.2f}, 有效期=5秒")
+                # 触发K线缺失时（旧缓存）退化为缓存时间
+                trigger = cached_levels.get('trigger_candle') or cached_levels.get('cached_at')
+                for time_increments, label in (('TEN_MINUTE', '10分钟'), ('THIRTY_MINUTE', '30分钟')):
+                    order = OrderService.create_order(
+                        db=db,
+                        time_increments=time_increments,
+                        symbol_name='ETHUSDT',
+                        direction=direction,
+                        valid_duration=5,  # 订单有效期：5秒
+                        idempotency_key=f"ETHUSDT:{direction}:{trigger}:{self.STRATEGY}:{time_increments}"
+                    )
+                    if order is None:
+                        print(f"{label}订单已由其他进程创建，跳过: 方向={direction}, 触发K线={trigger}")
+                        continue
+                    print(f"✓ 创建{label}订单: ID={order.id}, 方向={direction}, 价格={price:.2f}, RSI={rsi:.2f}, 有效期=5秒")
                 
             finally:
                 self.lock.release()
@@ -425,6 +444,38 @@ class PriceMonitor:
             if self.lock.locked():
                 self.lock.release()
     
+    def _publish_snapshot(self, price: Optional[float], rsi: Optional[float]):
+        """
+        发布行情快照（价格、RSI、斐波拉契点位、触发状态、最后错误）到Redis，
+        与上次发布相比有变化的字段推送到频道
+        """
+        try:
+            cached_levels = self.fib_service.get_cached_fib_levels() or {}
+            snapshot = {
+                'current_price': price,
+                'current_rsi': rsi,
+                'up_data': cached_levels.get('up'),
+                'down_data': cached_levels.get('down'),
+                'cached_at': cached_levels.get('cached_at'),
+                'volume_triggered': self.volume_triggered,
+                'trigger_candle_timestamp': self.trigger_candle_timestamp,
+                'error': self.last_error,
+            }
+            diff = {
+                field: value for field, value in snapshot.items()
+                if field not in self.last_snapshot or self.last_snapshot[field] != value
+            }
+            self.last_snapshot = snapshot
+            
+            updated_at = datetime.now().isoformat()
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.setex(SNAPSHOT_KEY, SNAPSHOT_TTL, json.dumps({**snapshot, 'updated_at': updated_at}))
+            if diff:
+                pipe.publish(SNAPSHOT_CHANNEL, json.dumps({**diff, 'updated_at': updated_at}))
+            pipe.execute()
+        except Exception as e:
+            print(f"发布行情快照失败: {e}")
+    
     def start_monitoring(self, db: Session = None):
         """
         启动价格监控（每秒检查一次）
@@ -433,15 +484,23 @@ class PriceMonitor:
         if self.is_running:
             print("价格监控已在运行")
             return
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            # 上一次停止时线程还在执行本轮循环，不能启动第二个监控循环
+            print("[WARN] 上一个价格监控线程尚未退出，暂不启动")
+            return
         
         self.is_running = True
         
         def monitor_loop():
             while self.is_running:
                 try:
+                    # 定期校准交易所时钟偏移
+                    exchange_clock.maybe_sync(self.exchange)
+                    
                     # 每次循环都获取最新价格并计算RSI（确保价格和RSI总是最新的）
                     current_price = self.get_ethusdt_price()
                     current_rsi = self.calculate_rsi(include_latest=True)
+                    self._publish_snapshot(current_price, current_rsi)
                     
                     # 获取实时量能
                     volume_data = self.get_realtime_volume()
@@ -465,6 +524,9 @@ class PriceMonitor:
                             
                             # 等待当前K线完成
                             wait_success = self.wait_for_candle_completion(current_timestamp)
+                            if not self.is_running:
+                                self.volume_triggered = False
+                                break
                             
                             if wait_success:
                                 print(f"✅ K线已完成，开始获取完整数据...")
@@ -493,7 +555,11 @@ class PriceMonitor:
                                         print(f"{up_status}/{down_status} 30min 斐波那契计算完成（上升/下降）")
                                         
                                         # 缓存斐波拉契点位
-                                        success = self.fib_service.cache_fib_levels(up_data=up_data, down_data=down_data)
+                                        success = self.fib_service.cache_fib_levels(
+                                            up_data=up_data,
+                                            down_data=down_data,
+                                            trigger_candle=current_timestamp
+                                        )
                                         if success:
                                             up_str = f"${up_data['fib_1618']:.2f}" if up_data else "N/A"
                                             down_str = f"${down_data['fib_1618']:.2f}" if down_data else "N/A"
@@ -513,6 +579,10 @@ class PriceMonitor:
                                 print(f"❌ 等待K线完成失败")
                                 self.volume_triggered = False
                     
+                    # 停止后不再创建订单（失去主身份后新主进程接管）
+                    if not self.is_running:
+                        break
+                    
                     # 每次创建新的数据库会话
                     db = SessionLocal()
                     try:
@@ -534,5 +604,9 @@ class PriceMonitor:
         self.is_running = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+            if self.monitor_thread.is_alive():
+                # 线程正在等待交易所响应，本轮结束后自行退出，退出前不会再创建订单
+                print("[WARN] 价格监控线程仍在退出中")
+                return
         print("✓ 价格监控已停止")
 
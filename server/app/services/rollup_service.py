@@ -0,0 +1,88 @@
+"""
+执行结果汇总服务
+结果落库时按分钟、用户、订单增量累加成功数和耗时，报表只读汇总表
+"""
+from datetime import timedelta
+from typing import Dict, List
+from sqlalchemy import select, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models.stats import OrderResultMinute, OrderResultUser, OrderResultOrder
+from .exchange_clock import exchange_clock
+
+
+def _accumulate(buckets: Dict, key, result: Dict):
+    bucket = buckets.setdefault(key, {
+        "result_count": 0,
+        "success_count": 0,
+        "latency_count": 0,
+        "latency_sum_ms": 0,
+        "latency_max_ms": 0,
+    })
+    bucket["result_count"] += 1
+    if result["success"]:
+        bucket["success_count"] += 1
+    if result["latency_ms"] is not None:
+        bucket["latency_count"] += 1
+        bucket["latency_sum_ms"] += result["latency_ms"]
+        bucket["latency_max_ms"] = max(bucket["latency_max_ms"], result["latency_ms"])
+
+
+def _upsert(db: Session, model, key_column: str, buckets: Dict):
+    """多行 INSERT ... ON DUPLICATE KEY UPDATE 累加"""
+    if not buckets:
+        return
+    table = model.__table__
+    stmt = mysql_insert(table).values([{key_column: key, **values} for key, values in buckets.items()])
+    stmt = stmt.on_duplicate_key_update(
+        result_count=table.c.result_count + stmt.inserted.result_count,
+        success_count=table.c.success_count + stmt.inserted.success_count,
+        latency_count=table.c.latency_count + stmt.inserted.latency_count,
+        latency_sum_ms=table.c.latency_sum_ms + stmt.inserted.latency_sum_ms,
+        latency_max_ms=func.greatest(table.c.latency_max_ms, stmt.inserted.latency_max_ms),
+    )
+    db.execute(stmt)
+
+
+class RollupService:
+    """执行结果汇总服务类（只执行语句，由调用方在同一事务中提交）"""
+    
+    @staticmethod
+    def apply(db: Session, results: List[Dict]):
+        """累加一批首次落库的执行结果（调用方保证同一结果只传入一次）"""
+        minutes, users, orders = {}, {}, {}
+        for result in results:
+            _accumulate(minutes, result["executed_at"].replace(second=0, microsecond=0), result)
+            _accumulate(users, result["user_id"], result)
+            _accumulate(orders, result["order_id"], result)
+        _upsert(db, OrderResultMinute, "bucket", minutes)
+        _upsert(db, OrderResultUser, "user_id", users)
+        _upsert(db, OrderResultOrder, "order_id", orders)
+    
+    @staticmethod
+    async def list_minutes(db: AsyncSession, minutes: int = 60) -> List[OrderResultMinute]:
+        """最近N分钟的分钟汇总"""
+        start = exchange_clock.now_datetime().replace(second=0, microsecond=0) - timedelta(minutes=minutes - 1)
+        result = await db.execute(
+            select(OrderResultMinute)
+            .where(OrderResultMinute.bucket >= start)
+            .order_by(OrderResultMinute.bucket.desc())
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def list_users(db: AsyncSession, limit: int = 100) -> List[OrderResultUser]:
+        """按结果数倒序的用户汇总"""
+        result = await db.execute(
+            select(OrderResultUser).order_by(OrderResultUser.result_count.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def list_orders(db: AsyncSession, limit: int = 100) -> List[OrderResultOrder]:
+        """最近订单的汇总"""
+        result = await db.execute(
+            select(OrderResultOrder).order_by(OrderResultOrder.order_id.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
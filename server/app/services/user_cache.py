@@ -0,0 +1,96 @@
+"""
+用户有效性缓存
+进程内缓存每个用户的 (status, expire_at)，过期时间在本地判断，避免每次拉单都查询users表
+用户状态变更时通过Redis pub/sub通知所有worker失效，TTL兜底防止丢失通知
+"""
+import time
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Tuple
+from ..config import settings
+from ..redis_client import get_redis, get_async_redis
+
+INVALIDATE_CHANNEL = "user:invalidate"
+
+# 缓存未命中时的占位（用户不存在）
+_MISSING = (None, None)
+
+
+class UserValidityCache:
+    """用户有效性缓存类"""
+    
+    def __init__(self, ttl: int = None):
+        self.ttl = ttl if ttl is not None else settings.user_cache_ttl
+        self.entries: Dict[int, Tuple[Tuple[Optional[int], Optional[datetime]], float]] = {}
+        self.lock = threading.Lock()
+        self.is_running = False
+        self.listener_thread = None
+    
+    def get(self, user_id: int) -> Optional[Tuple[Optional[int], Optional[datetime]]]:
+        """获取缓存的 (status, expire_at)，未命中或超过TTL返回None"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        value, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl:
+            return None
+        return value
+    
+    def set(self, user_id: int, status: Optional[int], expire_at: Optional[datetime]):
+        """写入缓存（status为None表示用户不存在）"""
+        with self.lock:
+            self.entries[user_id] = ((status, expire_at), time.monotonic())
+    
+    def discard(self, user_id: int):
+        """删除本进程的缓存"""
+        with self.lock:
+            self.entries.pop(user_id, None)
+    
+    async def invalidate(self, user_id: int):
+        """删除本进程缓存并通知其他worker"""
+        self.discard(user_id)
+        try:
+            await get_async_redis().publish(INVALIDATE_CHANNEL, str(user_id))
+        except Exception as e:
+            # 通知失败时其他worker依赖TTL过期
+            print(f"[WARN] 发布用户缓存失效通知失败: {e}")
+    
+    def start(self):
+        """启动失效通知监听线程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.listener_thread = threading.Thread(target=self._listen_loop, daemon=True)
+        self.listener_thread.start()
+        print(f"✓ 用户有效性缓存已启动（TTL: {self.ttl}秒）")
+    
+    def stop(self):
+        """停止监听线程"""
+        self.is_running = False
+        if self.listener_thread:
+            self.listener_thread.join(timeout=5)
+    
+    def _listen_loop(self):
+        while self.is_running:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # 重新订阅期间可能漏掉通知，清空本地缓存
+                with self.lock:
+                    self.entries.clear()
+                while self.is_running:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.discard(int(message["data"]))
+            except Exception as e:
+                print(f"用户缓存失效监听错误: {e}")
+                time.sleep(1)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+# 全局缓存实例
+user_validity_cache = UserValidityCache()
@@ -0,0 +1,91 @@
+"""
+用户状态快照
+在线/接单用户从在线状态服务的有序集合各用一次 ZRANGEBYSCORE 取出，
+后台线程定期生成状态列表快照写入Redis，后台管理接口直接读取
+"""
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List
+from ..config import settings
+from ..database import SessionLocal
+from ..models.user import User
+from ..redis_client import get_redis, get_async_redis
+from .presence import presence_service
+
+SNAPSHOT_KEY = "user:status:snapshot"
+
+
+def build_status_snapshot(users: List[Dict], online_ids: set, ordering_ids: set) -> Dict:
+    """按在线/接单分组（只有在线用户才能显示为接单中）"""
+    snapshot = {
+        "online_users": [],
+        "offline_users": [],
+        "ordering_users": [],
+        "not_ordering_users": [],
+    }
+    for user_dict in users:
+        is_online = user_dict["id"] in online_ids
+        is_ordering = is_online and user_dict["id"] in ordering_ids
+        user_dict["is_online"] = is_online
+        user_dict["is_ordering"] = is_ordering
+        snapshot["online_users" if is_online else "offline_users"].append(user_dict)
+        snapshot["ordering_users" if is_ordering else "not_ordering_users"].append(user_dict)
+    return snapshot
+
+
+class UserStatusSnapshot:
+    """用户状态快照类"""
+    
+    def __init__(self, interval: int = None):
+        self.interval = interval if interval is not None else settings.user_status_refresh_seconds
+        self.is_running = False
+        self.refresh_thread = None
+    
+    def start(self):
+        """启动后台刷新线程"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.refresh_thread.start()
+        print(f"✓ 用户状态快照已启动（刷新间隔: {self.interval}秒）")
+    
+    def stop(self):
+        """停止后台刷新线程"""
+        self.is_running = False
+        if self.refresh_thread:
+            self.refresh_thread.join(timeout=5)
+    
+    def _refresh_loop(self):
+        while self.is_running:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"刷新用户状态快照失败: {e}")
+            time.sleep(self.interval)
+    
+    def refresh(self) -> Dict:
+        """重新生成快照并写入Redis（快照过期时间为3个刷新间隔，刷新线程停止后自然失效）"""
+        db = SessionLocal()
+        try:
+            users = [user.to_dict() for user in db.query(User).order_by(User.id).all()]
+        finally:
+            db.close()
+        
+        online_ids, ordering_ids = presence_service.get_active_ids()
+        snapshot = build_status_snapshot(users, online_ids, ordering_ids)
+        snapshot["updated_at"] = datetime.now().isoformat()
+        get_redis().setex(SNAPSHOT_KEY, self.interval * 3, json.dumps(snapshot, default=str))
+        return snapshot
+    
+    @staticmethod
+    async def get() -> Optional[Dict]:
+        """读取最近一次快照"""
+        cached = await get_async_redis().get(SNAPSHOT_KEY)
+        return json.loads(cached) if cached else None
+
+
+# 全局快照实例
+user_status_snapshot = UserStatusSnapshot()
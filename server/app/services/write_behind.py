@@ -0,0 +1,421 @@
+"""
+写后缓冲服务
+订单分配记录和执行结果先追加到Redis Stream，由后台线程每N毫秒合并成
+一条多行 INSERT ... ON DUPLICATE KEY UPDATE 写入MySQL
+写库成功后才XACK，进程崩溃时未确认的消息会被其他消费者认领重放（至少一次）
+批量写库失败时按(order_id, user_id)逐行重试，反复失败的消息转入死信Stream，不会卡住整个缓冲
+"""
+import os
+import json
+import asyncio
+import time
+import socket
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+from sqlalchemy import select, func, case, tuple_, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models.order import Order, OrderAssignment
+from ..redis_client import get_redis, get_async_redis
+from .counter_service import CounterService
+from . import counter_service as counters
+from .rollup_service import RollupService
+
+STREAM_KEY = "stream:order:writes"
+DEAD_LETTER_KEY = "stream:order:writes:dead"
+GROUP_NAME = "order-writer"
+METRICS_KEY = "metrics:write_behind"
+
+# 执行结果的结构化字段（与 OrderAssignment 列同名）
+OUTCOME_FIELDS = ("success", "result_code", "latency_ms", "order_amount", "payout_ratio")
+
+
+class WriteBehindBuffer:
+    """写后缓冲类"""
+
+    def __init__(self):
+        self.redis_client = get_redis()
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.flush_interval = settings.write_behind_flush_ms / 1000
+        self.batch_size = settings.write_behind_batch_size
+        self.reclaim_idle_ms = settings.write_behind_reclaim_idle_ms
+        self.max_deliveries = settings.write_behind_max_deliveries
+        self.is_running = False
+        self.writer_thread = None
+        self.last_reclaim = 0.0
+
+    # ---------- 生产者 ----------
+
+    async def enqueue_assignment(self, order_id: int, user_id: int, assigned_at: datetime) -> bool:
+        """追加分配记录"""
+        return await self._enqueue({
+            "type": "assignment",
+            "order_id": str(order_id),
+            "user_id": str(user_id),
+            "assigned_at": assigned_at.isoformat(),
+        })
+
+    async def enqueue_result(
+        self,
+        order_id: int,
+        user_id: int,
+        result: dict,
+        outcome: dict,
+        executed_at: datetime
+    ) -> bool:
+        """追加执行结果（outcome为解析后的结构化字段）"""
+        return await self._enqueue({
+            "type": "result",
+            "order_id": str(order_id),
+            "user_id": str(user_id),
+            "executed_at": executed_at.isoformat(),
+            "result": json.dumps(result, ensure_ascii=False),
+            "outcome": json.dumps(outcome),
+        })
+
+    async def _enqueue(self, fields: Dict[str, str]) -> bool:
+        """写入Stream，Redis不可用时直接落库"""
+        fields["enqueued_at"] = str(time.time())
+        try:
+            await get_async_redis().xadd(STREAM_KEY, fields)
+            return True
+        except Exception as e:
+            print(f"[WARN] 写入写后缓冲失败，直接落库: {e}")
+            return await asyncio.to_thread(self._write_direct, fields)
+
+    def _write_direct(self, fields: Dict[str, str]) -> bool:
+        """绕过缓冲同步落库（在线程池中执行）"""
+        db = SessionLocal()
+        try:
+            self.write_rows(db, self._merge([("direct", fields)]))
+            return True
+        except Exception as e:
+            print(f"[ERROR] 直接落库失败: {e}")
+            return False
+        finally:
+            db.close()
+
+    # ---------- 消费者（后台线程，使用同步客户端） ----------
+
+    def start(self):
+        """启动后台写入线程"""
+        if self.is_running:
+            return
+
+        self._ensure_group()
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer_thread.start()
+        print(f"✓ 写后缓冲已启动（刷新间隔: {settings.write_behind_flush_ms}ms，批量上限: {self.batch_size}）")
+
+    def stop(self):
+        """停止后台写入线程（退出前刷完已读取的批次）"""
+        self.is_running = False
+        if self.writer_thread:
+            self.writer_thread.join(timeout=5)
+        print("✓ 写后缓冲已停止")
+
+    def _ensure_group(self):
+        """创建消费组（已存在则忽略）"""
+        try:
+            self.redis_client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                print(f"[WARN] 创建写后缓冲消费组失败: {e}")
+
+    def _writer_loop(self):
+        while self.is_running:
+            try:
+                entries = self._reclaim_pending() + self._read_batch()
+                if entries:
+                    self._flush(entries)
+            except Exception as e:
+                # 未ACK的消息保留在PEL中，空闲超时后重新认领
+                print(f"写后缓冲刷新失败: {e}")
+                time.sleep(1)
+
+    def _read_batch(self) -> List[Tuple[str, Dict[str, str]]]:
+        """读取一批消息：收到第一条后最多再等待一个刷新间隔凑批"""
+        entries = []
+        deadline = None
+        while self.is_running and len(entries) < self.batch_size:
+            if deadline is None:
+                block_ms = settings.write_behind_flush_ms
+            else:
+                block_ms = int((deadline - time.time()) * 1000)
+                if block_ms <= 0:
+                    break
+            resp = self.redis_client.xreadgroup(
+                GROUP_NAME,
+                self.consumer,
+                {STREAM_KEY: ">"},
+                count=self.batch_size - len(entries),
+                block=block_ms
+            )
+            if not resp:
+                break
+            entries.extend(resp[0][1])
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+        return entries
+
+    def _reclaim_pending(self) -> List[Tuple[str, Dict[str, str]]]:
+        """认领空闲过久的未确认消息（崩溃的消费者或写库失败的批次）"""
+        now = time.time()
+        if now - self.last_reclaim < self.reclaim_idle_ms / 1000:
+            return []
+        self.last_reclaim = now
+
+        resp = self.redis_client.xautoclaim(
+            STREAM_KEY,
+            GROUP_NAME,
+            self.consumer,
+            min_idle_time=self.reclaim_idle_ms,
+            start_id="0-0",
+            count=self.batch_size
+        )
+        entries = [entry for entry in resp[1] if entry[1]]
+        if entries:
+            print(f"[WARN] 写后缓冲认领 {len(entries)} 条未确认消息")
+        return entries
+
+    def _flush(self, entries: List[Tuple[str, Dict[str, str]]]):
+        """合并写库，成功后ACK并删除消息（整批失败时逐行重试）"""
+        started = time.time()
+        try:
+            rows = self._merge(entries)
+            self._write(rows)
+            done = entries
+        except Exception as e:
+            print(f"[WARN] 写后缓冲批量落库失败，逐行重试: {e}")
+            done = self._flush_one_by_one(entries)
+            rows = []
+        if not done:
+            return
+
+        ids = [entry_id for entry_id, _ in done]
+        pipe = self.redis_client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP_NAME, *ids)
+        pipe.xdel(STREAM_KEY, *ids)
+        pipe.execute()
+
+        # 刷新延迟：批次中最早一条消息从入队到落库的时间
+        oldest = min(float(fields.get("enqueued_at", started)) for _, fields in done)
+        finished = time.time()
+        self._record_metrics(
+            lag_ms=(finished - oldest) * 1000,
+            write_ms=(finished - started) * 1000,
+            batch_size=len(done),
+            row_count=len(rows) or len(done)
+        )
+
+    def _write(self, rows: List[Dict]):
+        """在独立会话中写入一批合并后的记录"""
+        db = SessionLocal()
+        try:
+            self.write_rows(db, rows)
+        finally:
+            db.close()
+
+    def _flush_one_by_one(self, entries: List[Tuple[str, Dict[str, str]]]) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        按(order_id, user_id)逐组写库，返回可以ACK的消息（写入成功或已转入死信）
+        所有组都失败且数据库不可用时抛出异常，消息留在PEL中等待重试，不计入死信
+        """
+        groups: Dict[object, List[Tuple[str, Dict[str, str]]]] = {}
+        for entry_id, fields in entries:
+            try:
+                key = (int(fields["order_id"]), int(fields["user_id"]))
+            except Exception:
+                key = entry_id  # 字段损坏的消息单独成组
+            groups.setdefault(key, []).append((entry_id, fields))
+
+        done = []
+        failed: List[Tuple[Tuple[str, Dict[str, str]], str]] = []
+        for group in groups.values():
+            try:
+                self._write(self._merge(group))
+                done.extend(group)
+            except Exception as e:
+                failed.extend((entry, str(e)) for entry in group)
+
+        if failed and not done and not self._database_available():
+            raise RuntimeError("数据库不可用，等待重试")
+        return done + self._dead_letter(failed)
+
+    def _database_available(self) -> bool:
+        """数据库是否可用（区分数据错误和数据库故障）"""
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+        finally:
+            db.close()
+
+    def _dead_letter(self, failed: List[Tuple[Tuple[str, Dict[str, str]], str]]) -> List[Tuple[str, Dict[str, str]]]:
+        """投递次数达到上限的失败消息转入死信Stream，返回已转移的消息（其余留在PEL中等待认领重试）"""
+        moved = []
+        for (entry_id, fields), error in failed:
+            pending = self.redis_client.xpending_range(STREAM_KEY, GROUP_NAME, min=entry_id, max=entry_id, count=1)
+            deliveries = pending[0]["times_delivered"] if pending else 0
+            if deliveries < self.max_deliveries:
+                continue
+            self.redis_client.xadd(DEAD_LETTER_KEY, {
+                **fields,
+                "source_id": entry_id,
+                "error": error[:500],
+                "dead_at": str(time.time()),
+            })
+            moved.append((entry_id, fields))
+            print(f"[ERROR] 写后缓冲消息{entry_id}投递{deliveries}次仍无法落库，已转入死信: {error}")
+        if moved:
+            try:
+                self.redis_client.hincrby(METRICS_KEY, "dead_lettered", len(moved))
+            except Exception:
+                pass
+        return moved
+
+    @staticmethod
+    def _merge(entries: List[Tuple[str, Dict[str, str]]]) -> List[Dict]:
+        """按(order_id, user_id)合并同一批次中的分配记录和执行结果"""
+        merged: Dict[Tuple[int, int], Dict] = {}
+        for _, fields in entries:
+            key = (int(fields["order_id"]), int(fields["user_id"]))
+            row = merged.setdefault(key, {
+                "order_id": key[0],
+                "user_id": key[1],
+                "assigned_at": None,
+                "executed_at": None,
+                "execution_result": None,
+                **{field: None for field in OUTCOME_FIELDS},
+            })
+            if fields.get("type") == "assignment":
+                assigned_at = datetime.fromisoformat(fields["assigned_at"])
+                if row["assigned_at"] is None or assigned_at < row["assigned_at"]:
+                    row["assigned_at"] = assigned_at
+            else:
+                row["executed_at"] = datetime.fromisoformat(fields["executed_at"])
+                row["execution_result"] = fields["result"]
+                row.update(json.loads(fields.get("outcome", "{}")))
+        return list(merged.values())
+
+    @staticmethod
+    def write_rows(db: Session, rows: List[Dict]):
+        """
+        多行 INSERT ... ON DUPLICATE KEY UPDATE，并刷新订单分配次数、分配记录计数和执行结果汇总
+        只有执行结果、没有对应分配记录的行直接丢弃（用户没有拉取过该订单，不能凭结果创建分配记录）
+        每个(订单, 用户)只保留首次回报的执行结果，后续结果不覆盖，汇总表与明细保持一致
+        """
+        if not rows:
+            return
+
+        # 已落库的记录：用于统计新增分配记录数和首次回报的执行结果（重放的消息不会重复计数）
+        # 加锁读取（与下面的upsert同一事务）：已存在的行被锁住，另一个消费者同时处理同一(订单, 用户)时
+        # 会等本事务提交后读到最新状态；两边都读到"不存在"时唯一索引上的插入会死锁，其中一个事务回滚后逐行重试
+        keys = sorted({(row["order_id"], row["user_id"]) for row in rows})
+        existing = dict(
+            ((order_id, user_id), executed_at)
+            for order_id, user_id, executed_at in db.execute(
+                select(OrderAssignment.order_id, OrderAssignment.user_id, OrderAssignment.executed_at).where(
+                    tuple_(OrderAssignment.order_id, OrderAssignment.user_id).in_(keys)
+                ).with_for_update()
+            ).all()
+        )
+
+        orphans = [
+            row for row in rows
+            if row["assigned_at"] is None and (row["order_id"], row["user_id"]) not in existing
+        ]
+        if orphans:
+            print(f"[WARN] 丢弃 {len(orphans)} 条没有分配记录的执行结果: "
+                  f"{[(row['order_id'], row['user_id']) for row in orphans[:10]]}")
+            orphan_keys = {(row["order_id"], row["user_id"]) for row in orphans}
+            rows = [row for row in rows if (row["order_id"], row["user_id"]) not in orphan_keys]
+            if not rows:
+                db.commit()
+                return
+        # 只有执行结果的行以执行时间占位分配时间（记录已存在，LEAST保留原分配时间）
+        rows = [dict(row, assigned_at=row["assigned_at"] or row["executed_at"]) for row in rows]
+
+        new_keys = {(row["order_id"], row["user_id"]) for row in rows} - set(existing)
+        CounterService.increment(db, counters.ORDER_ASSIGNMENTS, len(new_keys))
+        RollupService.apply(db, [
+            row for row in rows
+            if row["executed_at"] is not None and existing.get((row["order_id"], row["user_id"])) is None
+        ])
+
+        # 执行结果只在尚未记录时写入（与上面的汇总条件一致）；
+        # MySQL按顺序求值赋值，executed_at 必须最后更新，前面的列判断的才是原值
+        stmt = mysql_insert(OrderAssignment.__table__).values(rows)
+        first_result = OrderAssignment.executed_at.is_(None)
+        stmt = stmt.on_duplicate_key_update([
+            ("assigned_at", func.least(OrderAssignment.assigned_at, stmt.inserted.assigned_at)),
+            *[
+                (field, case((first_result, stmt.inserted[field]), else_=OrderAssignment.__table__.c[field]))
+                for field in ("execution_result",) + OUTCOME_FIELDS
+            ],
+            ("executed_at", func.coalesce(OrderAssignment.executed_at, stmt.inserted.executed_at)),
+        ])
+        db.execute(stmt)
+
+        # 分配次数按实际记录数重算，重放同一条消息不会重复计数
+        order_ids = {row["order_id"] for row in rows}
+        assignment_count = (
+            select(func.count(OrderAssignment.id))
+            .where(OrderAssignment.order_id == Order.id)
+            .scalar_subquery()
+        )
+        db.query(Order).filter(Order.id.in_(order_ids)).update(
+            {Order.assignment_count: assignment_count, Order.status: 2},
+            synchronize_session=False
+        )
+        db.commit()
+
+    def _record_metrics(self, lag_ms: float, write_ms: float, batch_size: int, row_count: int):
+        """记录刷新指标到Redis（所有进程共享）"""
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.hset(METRICS_KEY, mapping={
+                "last_flush_lag_ms": f"{lag_ms:.1f}",
+                "last_flush_write_ms": f"{write_ms:.1f}",
+                "last_batch_size": batch_size,
+                "last_row_count": row_count,
+                "last_flush_at": datetime.now().isoformat(),
+                "last_consumer": self.consumer,
+            })
+            pipe.hincrby(METRICS_KEY, "flushed_messages", batch_size)
+            pipe.execute()
+        except Exception as e:
+            print(f"记录写后缓冲指标失败: {e}")
+
+    async def get_metrics(self) -> Dict:
+        """获取刷新指标（含当前积压量）"""
+        redis_client = get_async_redis()
+        metrics = dict(await redis_client.hgetall(METRICS_KEY))
+        try:
+            pending = await redis_client.xpending(STREAM_KEY, GROUP_NAME)
+            metrics["pending"] = pending.get("pending", 0)
+            metrics["stream_length"] = await redis_client.xlen(STREAM_KEY)
+            metrics["dead_letter_length"] = await redis_client.xlen(DEAD_LETTER_KEY)
+        except Exception:
+            metrics["pending"] = None
+            metrics["stream_length"] = None
+            metrics["dead_letter_length"] = None
+        return metrics
+
+
+# 全局写后缓冲实例
+_write_buffer: Optional[WriteBehindBuffer] = None
+
+
+def get_write_buffer() -> WriteBehindBuffer:
+    """获取写后缓冲实例（单例）"""
+    global _write_buffer
+    if _write_buffer is None:
+        _write_buffer = WriteBehindBuffer()
+    return _write_buffer
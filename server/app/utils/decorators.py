@@ -3,10 +3,10 @@
 """
 from functools import wraps
 from fastapi import HTTPException, Header, Depends
-from typing import Optional
-from sqlalchemy.orm import Session
+from typing import Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
-from ..database import get_db
+from ..database import get_async_db
 from ..services.user_service import UserService
 from ..services.admin_service import AdminService
 from ..utils.jwt import verify_token
@@ -19,7 +19,7 @@ def verify_admin_token(admin_token: Optional[str] = Header(None, alias="admin-to
     return admin_token
 
 
-def verify_web3_admin(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def verify_web3_admin(authorization: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
     """验证Web3管理员Token"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="未授权")
@@ -34,32 +34,36 @@ def verify_web3_admin(authorization: Optional[str] = Header(None), db: Session =
     address = payload.get("username", "").lower()  # 在JWT中，address存储在username字段
     
     # 验证是否为管理员
-    if not AdminService.is_admin(db, address):
+    if not await AdminService.is_admin(db, address):
         raise HTTPException(status_code=403, detail="该地址不是管理员")
     
     return address
 
 
-def get_current_user_id(authorization: Optional[str] = Header(None)):
-    """从JWT Token中获取当前用户ID（单点登录检查）"""
+def get_token_user_id(authorization: Optional[str] = Header(None)) -> Tuple[str, int]:
+    """校验JWT签名并返回 (token, 用户ID)，不访问Redis（单点登录检查由调用方完成）"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="未授权")
     
     token = authorization.split(" ")[1]
     
     # 验证JWT Token
-    from ..utils.jwt import verify_token
     payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Token无效或已过期")
     
-    user_id = payload.get("user_id")
+    return token, int(payload.get("user_id"))
+
+
+async def get_current_user_id(authorization: Optional[str] = Header(None)):
+    """从JWT Token中获取当前用户ID（单点登录检查）"""
+    token, user_id = get_token_user_id(authorization)
     
     # 检查Token是否仍然有效（单点登录检查）
-    from ..redis_client import get_redis
-    redis_client = get_redis()
+    from ..redis_client import get_async_redis
+    redis_client = get_async_redis()
     session_key = f"session:token:{token}"
-    if not redis_client.exists(session_key):
+    if not await redis_client.exists(session_key):
         raise HTTPException(status_code=401, detail="Token已失效（已在其他地方登录）")
     
     return int(user_id)
@@ -34,6 +34,59 @@ module.exports = {
     max_memory_restart: '500M',
     min_uptime: '10s',
     max_restarts: 10
+  }, {
+    name: 'bnsj-monitor',
+    script: '/opt/bnsj/bn_auto/server/venv/bin/python',
+    args: '-m app.monitor_worker',
+    cwd: '/opt/bnsj/bn_auto/server',
+    interpreter: 'none',
+    instances: 1,  // 可在其他机器再部署一份作为备用，Redis租约保证只有一个在运行
+    exec_mode: 'fork',
+    env: {
+      MYSQL_DATABASE: 'bnsj',
+      MYSQL_PASSWORD: 'bnsj123456',
+      MYSQL_HOST: 'localhost',
+      MYSQL_PORT: '3306',
+      MYSQL_USER: 'bnsj',
+      REDIS_HOST: 'localhost',
+      REDIS_PORT: '6379',
+      REDIS_PASSWORD: '',
+      REDIS_DB: '0',
+      MONITOR_LEASE_TTL: '10'
+    },
+    error_file: '/opt/bnsj/logs/pm2-monitor-error.log',
+    out_file: '/opt/bnsj/logs/pm2-monitor-out.log',
+    time: true,
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true,
+    autorestart: true,
+    watch: false,
+    kill_timeout: 8000,  // 留出释放租约的时间
+    max_memory_restart: '500M'
+  }, {
+    name: 'bnsj-archive',
+    script: '/opt/bnsj/bn_auto/server/venv/bin/python',
+    args: '-m app.archive_job',
+    cwd: '/opt/bnsj/bn_auto/server',
+    interpreter: 'none',
+    instances: 1,
+    exec_mode: 'fork',
+    cron_restart: '10 0 * * *',  // 每天 00:10 执行分区维护
+    autorestart: false,
+    env: {
+      MYSQL_DATABASE: 'bnsj',
+      MYSQL_PASSWORD: 'bnsj123456',
+      MYSQL_HOST: 'localhost',
+      MYSQL_PORT: '3306',
+      MYSQL_USER: 'bnsj',
+      ARCHIVE_RETENTION_MONTHS: '3'
+    },
+    error_file: '/opt/bnsj/logs/pm2-archive-error.log',
+    out_file: '/opt/bnsj/logs/pm2-archive-out.log',
+    time: true,
+    log_date_format: 'YYYY-MM-DD HH:mm:ss Z',
+    merge_logs: true,
+    watch: false
   }]
 };
 
@@ -0,0 +1,86 @@
+-- 执行结果结构化字段和增量汇总表
+-- 下单成功率、耗时等报表只读汇总表，不再解析 execution_result JSON
+USE `bnsj`;
+
+-- 1. 分配记录表增加结构化字段（归档表列顺序必须与在线表一致）
+ALTER TABLE `order_assignments`
+    ADD COLUMN `success` TINYINT(1) NULL COMMENT '是否下单成功',
+    ADD COLUMN `result_code` VARCHAR(32) NULL COMMENT '币安返回码',
+    ADD COLUMN `latency_ms` INT NULL COMMENT '下单耗时（毫秒）',
+    ADD COLUMN `order_amount` DECIMAL(12, 2) NULL COMMENT '下单金额',
+    ADD COLUMN `payout_ratio` DECIMAL(4, 2) NULL COMMENT '赔率';
+
+-- 归档表只在执行过 partition_orders.sql 后存在（之后再分区时归档表按在线表复制，自带这些列）
+SET @archive_sql = IF(
+    EXISTS(
+        SELECT 1 FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'order_assignments_archive'
+    ),
+    'ALTER TABLE `order_assignments_archive`
+        ADD COLUMN `success` TINYINT(1) NULL COMMENT ''是否下单成功'',
+        ADD COLUMN `result_code` VARCHAR(32) NULL COMMENT ''币安返回码'',
+        ADD COLUMN `latency_ms` INT NULL COMMENT ''下单耗时（毫秒）'',
+        ADD COLUMN `order_amount` DECIMAL(12, 2) NULL COMMENT ''下单金额'',
+        ADD COLUMN `payout_ratio` DECIMAL(4, 2) NULL COMMENT ''赔率''',
+    'DO 0'
+);
+PREPARE archive_stmt FROM @archive_sql;
+EXECUTE archive_stmt;
+DEALLOCATE PREPARE archive_stmt;
+
+-- 2. 回填在线表中已有的执行结果（耗时、金额、赔率历史上未记录）
+UPDATE `order_assignments`
+SET `success` = IFNULL(
+        JSON_EXTRACT(`execution_result`, '$.success') = CAST('true' AS JSON)
+        OR JSON_EXTRACT(`execution_result`, '$.code') = 200,
+        0
+    ),
+    `result_code` = LEFT(JSON_UNQUOTE(JSON_EXTRACT(`execution_result`, '$.code')), 32)
+WHERE `execution_result` IS NOT NULL AND JSON_VALID(`execution_result`);
+
+-- 3. 汇总表
+CREATE TABLE IF NOT EXISTS `order_result_minute` (
+    `bucket` DATETIME NOT NULL PRIMARY KEY COMMENT '分钟（执行时间截断到分钟）',
+    `result_count` INT NOT NULL DEFAULT 0 COMMENT '结果数',
+    `success_count` INT NOT NULL DEFAULT 0 COMMENT '成功数',
+    `latency_count` INT NOT NULL DEFAULT 0 COMMENT '带耗时的结果数',
+    `latency_sum_ms` BIGINT NOT NULL DEFAULT 0 COMMENT '耗时总和（毫秒）',
+    `latency_max_ms` INT NOT NULL DEFAULT 0 COMMENT '最大耗时（毫秒）'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='执行结果分钟汇总表';
+
+CREATE TABLE IF NOT EXISTS `order_result_user` (
+    `user_id` BIGINT NOT NULL PRIMARY KEY COMMENT '用户ID',
+    `result_count` INT NOT NULL DEFAULT 0 COMMENT '结果数',
+    `success_count` INT NOT NULL DEFAULT 0 COMMENT '成功数',
+    `latency_count` INT NOT NULL DEFAULT 0 COMMENT '带耗时的结果数',
+    `latency_sum_ms` BIGINT NOT NULL DEFAULT 0 COMMENT '耗时总和（毫秒）',
+    `latency_max_ms` INT NOT NULL DEFAULT 0 COMMENT '最大耗时（毫秒）'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='执行结果按用户汇总表';
+
+CREATE TABLE IF NOT EXISTS `order_result_order` (
+    `order_id` BIGINT NOT NULL PRIMARY KEY COMMENT '订单ID',
+    `result_count` INT NOT NULL DEFAULT 0 COMMENT '结果数',
+    `success_count` INT NOT NULL DEFAULT 0 COMMENT '成功数',
+    `latency_count` INT NOT NULL DEFAULT 0 COMMENT '带耗时的结果数',
+    `latency_sum_ms` BIGINT NOT NULL DEFAULT 0 COMMENT '耗时总和（毫秒）',
+    `latency_max_ms` INT NOT NULL DEFAULT 0 COMMENT '最大耗时（毫秒）'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='执行结果按订单汇总表';
+
+-- 4. 用在线表已有结果初始化汇总（只需执行一次，之后由写后缓冲增量累加）
+INSERT INTO `order_result_minute` (`bucket`, `result_count`, `success_count`)
+SELECT DATE_FORMAT(`executed_at`, '%Y-%m-%d %H:%i:00'), COUNT(*), COALESCE(SUM(`success` = 1), 0)
+FROM `order_assignments` WHERE `executed_at` IS NOT NULL
+GROUP BY DATE_FORMAT(`executed_at`, '%Y-%m-%d %H:%i:00')
+ON DUPLICATE KEY UPDATE `result_count` = VALUES(`result_count`), `success_count` = VALUES(`success_count`);
+
+INSERT INTO `order_result_user` (`user_id`, `result_count`, `success_count`)
+SELECT `user_id`, COUNT(*), COALESCE(SUM(`success` = 1), 0)
+FROM `order_assignments` WHERE `executed_at` IS NOT NULL
+GROUP BY `user_id`
+ON DUPLICATE KEY UPDATE `result_count` = VALUES(`result_count`), `success_count` = VALUES(`success_count`);
+
+INSERT INTO `order_result_order` (`order_id`, `result_count`, `success_count`)
+SELECT `order_id`, COUNT(*), COALESCE(SUM(`success` = 1), 0)
+FROM `order_assignments` WHERE `executed_at` IS NOT NULL
+GROUP BY `order_id`
+ON DUPLICATE KEY UPDATE `result_count` = VALUES(`result_count`), `success_count` = VALUES(`success_count`);
@@ -0,0 +1,11 @@
+-- 订单幂等键表
+-- 多个worker各自运行价格监控时，同一次触发只允许创建一组订单
+-- orders 按月分区，唯一键必须包含分区键 created_at，因此幂等键单独建表，与订单同事务写入
+USE `bnsj`;
+
+CREATE TABLE IF NOT EXISTS `order_idempotency_keys` (
+    `idempotency_key` VARCHAR(128) NOT NULL PRIMARY KEY COMMENT '幂等键，如 ETHUSDT:SHORT:{触发K线}:fib_1618:TEN_MINUTE',
+    `order_id` BIGINT NOT NULL COMMENT '订单ID',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    INDEX `idx_created_at` (`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单幂等键表';
@@ -0,0 +1,14 @@
+-- 订单分配记录表增加 (order_id, user_id) 唯一键
+-- 写后缓冲使用 INSERT ... ON DUPLICATE KEY UPDATE 批量合并分配记录和执行结果，依赖该唯一键
+-- 通过 create_tables.sql 建表的库已包含该唯一键，无需执行
+USE `bnsj`;
+
+-- 清理重复的分配记录（保留最早一条）
+DELETE oa1 FROM `order_assignments` oa1
+JOIN `order_assignments` oa2
+  ON oa1.`order_id` = oa2.`order_id`
+ AND oa1.`user_id` = oa2.`user_id`
+ AND oa1.`id` > oa2.`id`;
+
+ALTER TABLE `order_assignments`
+ADD UNIQUE KEY `uk_order_user` (`order_id`, `user_id`);
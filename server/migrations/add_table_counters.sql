@@ -0,0 +1,16 @@
+-- 表行数计数器
+-- 订单、用户、分配记录插入时在同一事务中累加，后台列表读取总数不再 COUNT(*)
+USE `bnsj`;
+
+CREATE TABLE IF NOT EXISTS `table_counters` (
+    `name` VARCHAR(50) PRIMARY KEY COMMENT '计数器名称（表名）',
+    `value` BIGINT NOT NULL DEFAULT 0 COMMENT '当前行数',
+    `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='表行数计数器';
+
+-- 初始化为当前行数（只需执行一次）
+INSERT INTO `table_counters` (`name`, `value`)
+SELECT 'orders', COUNT(*) FROM `orders`
+UNION ALL SELECT 'users', COUNT(*) FROM `users`
+UNION ALL SELECT 'order_assignments', COUNT(*) FROM `order_assignments`
+ON DUPLICATE KEY UPDATE `value` = VALUES(`value`);
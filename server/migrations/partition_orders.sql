@@ -0,0 +1,55 @@
+-- 订单表 / 订单分配记录表按月分区，并创建归档表和日汇总表
+-- 分区的滚动维护（新增月份、拆分、归档旧分区、刷新汇总）由 python -m app.archive_job 完成
+-- 执行前请先执行 add_order_user_unique.sql
+USE `bnsj`;
+
+-- 1. 分区表不支持外键（约束名为MySQL默认生成的名称）
+ALTER TABLE `order_assignments`
+    DROP FOREIGN KEY `order_assignments_ibfk_1`,
+    DROP FOREIGN KEY `order_assignments_ibfk_2`;
+
+-- 2. 订单表：按 created_at 月度 RANGE 分区，分区键必须包含在主键中
+ALTER TABLE `orders`
+    MODIFY `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间（按月分区键）',
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (`id`, `created_at`);
+
+ALTER TABLE `orders` PARTITION BY RANGE (TO_DAYS(`created_at`)) (
+    PARTITION `p_hist` VALUES LESS THAN (TO_DAYS('2026-10-01')),
+    PARTITION `p202610` VALUES LESS THAN (TO_DAYS('2026-11-01')),
+    PARTITION `p202611` VALUES LESS THAN (TO_DAYS('2026-12-01')),
+    PARTITION `pmax` VALUES LESS THAN MAXVALUE
+);
+
+-- 3. 订单分配记录表：按 order_id 范围分区
+-- 写后缓冲依赖 uk_order_user(order_id, user_id) 做 ON DUPLICATE KEY UPDATE，唯一键必须包含分区键，
+-- 因此不能按 assigned_at 分区。订单ID随时间递增，归档任务在每月结束后按该月第一个订单ID拆出月分区，
+-- 分区名与订单表一致
+ALTER TABLE `order_assignments`
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (`id`, `order_id`);
+
+ALTER TABLE `order_assignments` PARTITION BY RANGE (`order_id`) (
+    PARTITION `pmax` VALUES LESS THAN MAXVALUE
+);
+
+-- 4. 归档表（压缩行格式，不分区）
+CREATE TABLE IF NOT EXISTS `orders_archive` LIKE `orders`;
+ALTER TABLE `orders_archive` REMOVE PARTITIONING;
+ALTER TABLE `orders_archive` ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8 COMMENT='订单归档表';
+
+CREATE TABLE IF NOT EXISTS `order_assignments_archive` LIKE `order_assignments`;
+ALTER TABLE `order_assignments_archive` REMOVE PARTITIONING;
+ALTER TABLE `order_assignments_archive` ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8 COMMENT='订单分配记录归档表';
+
+-- 5. 订单日汇总表
+CREATE TABLE IF NOT EXISTS `order_stats_daily` (
+    `stat_date` DATE NOT NULL COMMENT '统计日期',
+    `time_increments` VARCHAR(50) NOT NULL COMMENT '时间增量',
+    `direction` VARCHAR(10) NOT NULL COMMENT '方向',
+    `order_count` INT NOT NULL DEFAULT 0 COMMENT '订单数',
+    `assignment_count` INT NOT NULL DEFAULT 0 COMMENT '分配次数',
+    `executed_count` INT NOT NULL DEFAULT 0 COMMENT '已回报执行结果数',
+    `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (`stat_date`, `time_increments`, `direction`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='订单日汇总表';